@@ -0,0 +1,343 @@
+'''
+Business: Сворачивание журналов session_stats_deltas и session_pair_deltas в счётчики, прореживание
+          истории интереса (минутные корзины старше горизонта переносятся в часовые) и очистка
+          старых записей plan_ops (по расписанию)
+Args: event с httpMethod, body (batchSize, maxBatches — необязательные)
+      env STATS_MINUTE_HORIZON_HOURS: сколько часов хранить минутные корзины (по умолчанию 48)
+      env PLAN_OPS_RETENTION_DAYS: сколько дней хранить применённые операции планов (по умолчанию 30)
+Returns: HTTP response с числом свёрнутых изменений счётчиков и пар, перенесённых корзин и удалённых операций
+'''
+
+import json
+import os
+from typing import Dict, Any, Tuple
+import psycopg2
+import db
+import tracing
+
+DEFAULT_BATCH_SIZE = 5000
+DEFAULT_MAX_BATCHES = 50
+DEFAULT_MINUTE_HORIZON_HOURS = 48
+DEFAULT_PLAN_OPS_RETENTION_DAYS = 30
+
+def compact_batch(cur, batch_size: int) -> Tuple[int, int]:
+    '''
+    Забирает из журнала самые старые batch_size изменений, суммирует их по сессиям
+    и прибавляет к шарду 0 в session_stats одним запросом. Удаление из журнала и запись счётчиков
+    происходят в одном операторе, поэтому get-stats никогда не видит изменение дважды.
+    Тот же оператор раскладывает изменения по минутным корзинам истории по времени их записи в журнал
+    и увеличивает версию статистики затронутых мероприятий (новые корзины меняют ответ get-stats).
+    Возвращает (число свёрнутых изменений, число обновлённых счётчиков).
+    '''
+    cur.execute('''
+        WITH batch AS (
+            DELETE FROM t_p73504605_landing_exhibition_m.session_stats_deltas
+            WHERE id IN (
+                SELECT id FROM t_p73504605_landing_exhibition_m.session_stats_deltas
+                ORDER BY id
+                LIMIT %s
+            )
+            RETURNING event_id, session_key, delta, created_at
+        ), applied AS (
+            INSERT INTO t_p73504605_landing_exhibition_m.session_stats
+            (event_id, session_key, interest_count)
+            SELECT event_id, session_key, SUM(delta)
+            FROM batch
+            GROUP BY event_id, session_key
+            ORDER BY event_id, session_key
+            ON CONFLICT (event_id, session_key, shard)
+            DO UPDATE SET
+                interest_count = t_p73504605_landing_exhibition_m.session_stats.interest_count + EXCLUDED.interest_count,
+                updated_at = CURRENT_TIMESTAMP
+            RETURNING 1
+        ), history AS (
+            INSERT INTO t_p73504605_landing_exhibition_m.session_interest_minutes 
+            (event_id, session_key, bucket, added, removed) 
+            SELECT 
+                event_id, 
+                session_key, 
+                date_trunc('minute', created_at), 
+                COUNT(*) FILTER (WHERE delta > 0), 
+                COUNT(*) FILTER (WHERE delta < 0) 
+            FROM batch 
+            WHERE (SELECT COUNT(*) FROM applied) > 0 
+            GROUP BY 1, 2, 3 
+            ORDER BY 1, 2, 3 
+            ON CONFLICT (event_id, session_key, bucket, shard) 
+            DO UPDATE SET 
+                added = t_p73504605_landing_exhibition_m.session_interest_minutes.added + EXCLUDED.added,
+                removed = t_p73504605_landing_exhibition_m.session_interest_minutes.removed + EXCLUDED.removed
+        ), bumped AS (
+            INSERT INTO t_p73504605_landing_exhibition_m.stats_versions 
+            (event_id, shard, version) 
+            SELECT DISTINCT event_id, 0, 1 
+            FROM batch 
+            WHERE (SELECT COUNT(*) FROM applied) > 0 
+            ORDER BY event_id 
+            ON CONFLICT (event_id, shard) 
+            DO UPDATE SET version = t_p73504605_landing_exhibition_m.stats_versions.version + 1
+        )
+        SELECT (SELECT COUNT(*) FROM batch), (SELECT COUNT(*) FROM applied)
+    ''', (batch_size,))
+    return cur.fetchone()
+
+def compact_pair_batch(cur, batch_size: int) -> int:
+    '''Сворачивает самые старые batch_size изменений пар в шард 0 session_pairs, как compact_batch'''
+    cur.execute('''
+        WITH batch AS (
+            DELETE FROM t_p73504605_landing_exhibition_m.session_pair_deltas 
+            WHERE id IN (
+                SELECT id FROM t_p73504605_landing_exhibition_m.session_pair_deltas 
+                ORDER BY id 
+                LIMIT %s
+            ) 
+            RETURNING event_id, session_a, session_b, delta
+        ), applied AS (
+            INSERT INTO t_p73504605_landing_exhibition_m.session_pairs 
+            (event_id, session_a, session_b, pair_count) 
+            SELECT event_id, session_a, session_b, SUM(delta) 
+            FROM batch 
+            GROUP BY event_id, session_a, session_b 
+            ORDER BY event_id, session_a, session_b 
+            ON CONFLICT (event_id, session_a, session_b, shard) 
+            DO UPDATE SET 
+                pair_count = t_p73504605_landing_exhibition_m.session_pairs.pair_count + EXCLUDED.pair_count,
+                updated_at = CURRENT_TIMESTAMP
+        )
+        SELECT COUNT(*) FROM batch
+    ''', (batch_size,))
+    return cur.fetchone()[0]
+
+def downsample_batch(cur, horizon_hours: int, batch_size: int) -> int:
+    '''
+    Переносит до batch_size минутных корзин старше горизонта в часовые и удаляет их.
+    Как и сворачивание журнала, удаление и запись происходят в одном операторе:
+    часовой ряд в get-stats не теряет и не удваивает изменения. Версия статистики затронутых
+    мероприятий увеличивается тем же оператором.
+    '''
+    cur.execute('''
+        WITH moved AS (
+            DELETE FROM t_p73504605_landing_exhibition_m.session_interest_minutes 
+            WHERE (event_id, session_key, bucket, shard) IN (
+                SELECT event_id, session_key, bucket, shard 
+                FROM t_p73504605_landing_exhibition_m.session_interest_minutes 
+                WHERE bucket < date_trunc('hour', timezone('UTC', now()) - make_interval(hours => %s)) 
+                ORDER BY bucket 
+                LIMIT %s
+            ) 
+            RETURNING event_id, session_key, bucket, added, removed
+        ), applied AS (
+            INSERT INTO t_p73504605_landing_exhibition_m.session_interest_hours 
+            (event_id, session_key, bucket, added, removed) 
+            SELECT event_id, session_key, date_trunc('hour', bucket), SUM(added), SUM(removed) 
+            FROM moved 
+            GROUP BY 1, 2, 3 
+            ORDER BY 1, 2, 3 
+            ON CONFLICT (event_id, session_key, bucket) 
+            DO UPDATE SET 
+                added = t_p73504605_landing_exhibition_m.session_interest_hours.added + EXCLUDED.added,
+                removed = t_p73504605_landing_exhibition_m.session_interest_hours.removed + EXCLUDED.removed
+            RETURNING 1
+        ), bumped AS (
+            INSERT INTO t_p73504605_landing_exhibition_m.stats_versions 
+            (event_id, shard, version) 
+            SELECT DISTINCT event_id, 0, 1 
+            FROM moved 
+            WHERE (SELECT COUNT(*) FROM applied) > 0 
+            ORDER BY event_id 
+            ON CONFLICT (event_id, shard) 
+            DO UPDATE SET version = t_p73504605_landing_exhibition_m.stats_versions.version + 1
+        )
+        SELECT COUNT(*) FROM moved
+    ''', (horizon_hours, batch_size))
+    return cur.fetchone()[0]
+
+def prune_plan_ops_batch(cur, retention_days: int, batch_size: int) -> int:
+    '''
+    Удаляет до batch_size самых старых записей plan_ops, применённых раньше срока хранения.
+    opId нужен, пока клиент может повторить ту же операцию; клиент убирает операцию из очереди
+    после первого успешного ответа, так что повтор спустя недели уже не придёт.
+    '''
+    cur.execute('''
+        DELETE FROM t_p73504605_landing_exhibition_m.plan_ops 
+        WHERE (event_id, user_id, op_id) IN (
+            SELECT event_id, user_id, op_id 
+            FROM t_p73504605_landing_exhibition_m.plan_ops 
+            WHERE applied_at < LOCALTIMESTAMP - make_interval(days => %s) 
+            ORDER BY applied_at 
+            LIMIT %s
+        )
+    ''', (retention_days, batch_size))
+    return cur.rowcount
+
+@tracing.traced
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    method: str = event.get('httpMethod', 'POST')
+    
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+    
+    if method != 'POST':
+        return {
+            'statusCode': 405,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': 'Method not allowed'}),
+            'isBase64Encoded': False
+        }
+    
+    body_data = json.loads(event.get('body') or '{}')
+    batch_size = body_data.get('batchSize', DEFAULT_BATCH_SIZE)
+    max_batches = body_data.get('maxBatches', DEFAULT_MAX_BATCHES)
+    
+    if not isinstance(batch_size, int) or not isinstance(max_batches, int) or batch_size < 1 or max_batches < 1:
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': 'batchSize and maxBatches must be positive integers'}),
+            'isBase64Encoded': False
+        }
+    
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        return {
+            'statusCode': 500,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': 'Database configuration missing'}),
+            'isBase64Encoded': False
+        }
+    
+    conn = db.get_connection(database_url)
+    
+    try:
+        cur = conn.cursor()
+        
+        # Одновременно работает только один запуск: пересекающийся вызов по расписанию просто выходит
+        cur.execute("SELECT pg_try_advisory_lock(hashtext('compact-stats'))")
+        if not cur.fetchone()[0]:
+            conn.rollback()
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({
+                    'success': True,
+                    'skipped': True,
+                    'compacted': 0,
+                    'counters': 0,
+                    'batches': 0,
+                    'pairsCompacted': 0,
+                    'downsampled': 0,
+                    'opsPruned': 0
+                }),
+                'isBase64Encoded': False
+            }
+        conn.commit()
+        
+        # Блокировка сессионная (прогон коммитит по пачкам) и снимается при любом исходе:
+        # иначе упавший прогон оставил бы её на соединении в пуле, и сворачивание больше не запускалось бы.
+        # Если снять не удалось, соединение закрывается: сервер снимет блокировку вместе с сессией,
+        # а release не вернёт закрытое соединение в пул
+        try:
+            compacted = 0
+            counters = 0
+            batches = 0
+            while batches < max_batches:
+                batch_rows, batch_counters = compact_batch(cur, batch_size)
+                conn.commit()
+                if batch_rows == 0:
+                    break
+                compacted += batch_rows
+                counters += batch_counters
+                batches += 1
+                if batch_rows < batch_size:
+                    break
+            
+            pairs_compacted = 0
+            for _ in range(max_batches):
+                pair_rows = compact_pair_batch(cur, batch_size)
+                conn.commit()
+                pairs_compacted += pair_rows
+                if pair_rows < batch_size:
+                    break
+            
+            # Граница горизонта округлена до начала часа: внутри горизонта минутный ряд остаётся полным
+            horizon_hours = int(os.environ.get('STATS_MINUTE_HORIZON_HOURS', DEFAULT_MINUTE_HORIZON_HOURS))
+            downsampled = 0
+            for _ in range(max_batches):
+                moved = downsample_batch(cur, horizon_hours, batch_size)
+                conn.commit()
+                downsampled += moved
+                if moved < batch_size:
+                    break
+            
+            retention_days = int(os.environ.get('PLAN_OPS_RETENTION_DAYS', DEFAULT_PLAN_OPS_RETENTION_DAYS))
+            ops_pruned = 0
+            for _ in range(max_batches):
+                pruned = prune_plan_ops_batch(cur, retention_days, batch_size)
+                conn.commit()
+                ops_pruned += pruned
+                if pruned < batch_size:
+                    break
+        finally:
+            try:
+                conn.rollback()
+                cur.execute("SELECT pg_advisory_unlock(hashtext('compact-stats'))")
+                conn.commit()
+            except psycopg2.Error:
+                conn.close()
+        cur.close()
+        
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({
+                'success': True,
+                'skipped': False,
+                'compacted': compacted,
+                'counters': counters,
+                'batches': batches,
+                'pairsCompacted': pairs_compacted,
+                'downsampled': downsampled,
+                'opsPruned': ops_pruned
+            }),
+            'isBase64Encoded': False
+        }
+    
+    except Exception as e:
+        if not conn.closed:
+            conn.rollback()
+        return {
+            'statusCode': 500,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
+    finally:
+        db.release(conn)
@@ -0,0 +1,265 @@
+'''
+Business: Выгрузка статистики интереса вместе с программой мероприятия в CSV или XLSX
+Args: event с httpMethod, queryStringParameters (eventId, format=csv|xlsx), headers (Accept-Encoding)
+Returns: HTTP response с файлом выгрузки (base64), CSV сжимается gzip, если клиент его принимает;
+         413, если выгрузка больше MAX_EXPORT_BYTES или MAX_EXPORT_ROWS
+'''
+
+import base64
+import gzip
+import io
+import json
+import os
+import re
+from datetime import date
+from typing import Dict, Any, Optional
+import db
+import tracing
+
+# Строк за одну выборку из серверного курсора при сборке XLSX
+EXPORT_CHUNK_ROWS = 2000
+# Тело ответа платформа не стримит: файл целиком лежит в памяти, а затем ещё и в base64 (+1/3).
+# Файл больше этого не отдаём — base64 должен влезть в лимит ответа функции (3.5 МБ)
+MAX_EXPORT_BYTES = 2_500_000
+# Строк в XLSX: openpyxl тратит время и временный файл на каждую строку ещё до сжатия книги
+MAX_EXPORT_ROWS = 50_000
+
+EXPORT_COLUMNS = ['День', 'Зал', 'Начало', 'Конец', 'Название', 'Спикер', 'Интерес', 'ID сессии']
+
+# Сессии программы из кеша (program_cache.data->sessions в формате ProgramData.sessions)
+# FULL JOIN со счётчиками: в выгрузку попадают и доклады без интереса, и сессии из планов,
+# которых уже нет в программе. Сопоставление по точному ID сессии.
+EXPORT_SQL = '''
+    WITH program AS (
+        SELECT DISTINCT ON (s->>'id')
+            s->>'id' AS session_id,
+            s->>'date' AS date,
+            s->>'hall' AS hall,
+            s->>'start' AS start,
+            s->>'end' AS "end",
+            s->>'title' AS title,
+            s->>'speaker' AS speaker
+        FROM t_p73504605_landing_exhibition_m.program_cache c
+        CROSS JOIN jsonb_array_elements(
+            CASE WHEN jsonb_typeof(c.data->'sessions') = 'array' THEN c.data->'sessions' ELSE '[]'::jsonb END
+        ) AS s
+        WHERE c.event_id = %(event_id)s AND s->>'id' IS NOT NULL
+        ORDER BY s->>'id', c.last_updated DESC
+    ), counts AS (
+        SELECT session_key, GREATEST(0, SUM(interest_count))::int AS interest_count
+        FROM (
+            SELECT session_key, interest_count
+            FROM t_p73504605_landing_exhibition_m.session_stats
+            WHERE event_id = %(event_id)s
+            UNION ALL
+            SELECT session_key, delta
+            FROM t_p73504605_landing_exhibition_m.session_stats_deltas
+            WHERE event_id = %(event_id)s
+        ) all_counts
+        GROUP BY session_key
+    ), stats AS (
+        SELECT s.session_id, s.session_date, s.hall, s.starts_at, s.ends_at, counts.interest_count
+        FROM counts
+        JOIN t_p73504605_landing_exhibition_m.event_sessions s ON s.id = counts.session_key
+    ), merged AS (
+        SELECT
+            COALESCE(p.session_id, st.session_id) AS session_id,
+            COALESCE(p.date, st.session_date) AS day,
+            COALESCE(p.hall, st.hall) AS hall,
+            COALESCE(st.starts_at, t_p73504605_landing_exhibition_m.session_id_time(p.start)) AS starts_at,
+            COALESCE(st.ends_at, t_p73504605_landing_exhibition_m.session_id_time(p."end")) AS ends_at,
+            p.start AS raw_start,
+            p."end" AS raw_end,
+            p.title,
+            p.speaker,
+            COALESCE(st.interest_count, 0) AS interest_count
+        FROM program p
+        FULL JOIN stats st ON st.session_id = p.session_id
+    )
+    SELECT
+        day AS "День",
+        hall AS "Зал",
+        COALESCE(to_char(starts_at, 'HH24:MI'), raw_start) AS "Начало",
+        COALESCE(to_char(ends_at, 'HH24:MI'), raw_end) AS "Конец",
+        title AS "Название",
+        speaker AS "Спикер",
+        interest_count AS "Интерес",
+        session_id AS "ID сессии"
+    FROM merged
+    ORDER BY day NULLS LAST, starts_at NULLS LAST, hall, session_id
+'''
+
+class CappedBuffer(io.BytesIO):
+    '''
+    Буфер, который перестаёт расти на MAX_EXPORT_BYTES. Лишние куски молча отбрасываются,
+    а не прерывают COPY исключением: так соединение остаётся в рабочем состоянии.
+    '''
+    
+    def __init__(self, limit: int):
+        super().__init__()
+        self.limit = limit
+        self.overflow = False
+    
+    def write(self, data) -> int:
+        if self.overflow or self.tell() + len(data) > self.limit:
+            self.overflow = True
+            return len(data)
+        return super().write(data)
+
+def export_csv(conn, event_id: str, use_gzip: bool) -> Optional[bytes]:
+    '''
+    CSV собирает сам Postgres через COPY ... TO STDOUT: строки приходят кусками и сразу
+    пишутся в буфер (через gzip, если можно), без промежуточных объектов Python на строку.
+    Файл больше MAX_EXPORT_BYTES — None.
+    '''
+    buffer = CappedBuffer(MAX_EXPORT_BYTES)
+    sink = gzip.GzipFile(fileobj=buffer, mode='wb') if use_gzip else buffer
+    # BOM, чтобы Excel открыл кириллицу в UTF-8
+    sink.write('\ufeff'.encode('utf-8'))
+    
+    cur = conn.cursor()
+    query = cur.mogrify(EXPORT_SQL, {'event_id': event_id}).decode('utf-8')
+    cur.copy_expert(f'COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER true)', sink)
+    cur.close()
+    
+    if use_gzip:
+        sink.close()
+    if buffer.overflow:
+        return None
+    return buffer.getvalue()
+
+def export_xlsx(conn, event_id: str) -> Optional[bytes]:
+    '''
+    XLSX пишется потоково: строки читаются серверным курсором по EXPORT_CHUNK_ROWS,
+    а write-only книга openpyxl сразу сбрасывает их во временный файл.
+    Больше MAX_EXPORT_ROWS строк или MAX_EXPORT_BYTES в готовом файле — None.
+    '''
+    from openpyxl import Workbook
+    
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Статистика')
+    sheet.append(EXPORT_COLUMNS)
+    
+    cur = conn.cursor(name='export_stats')
+    cur.itersize = EXPORT_CHUNK_ROWS
+    cur.execute(EXPORT_SQL, {'event_id': event_id})
+    for rows, row in enumerate(cur, 1):
+        if rows > MAX_EXPORT_ROWS:
+            cur.close()
+            return None
+        sheet.append(list(row))
+    cur.close()
+    
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    if buffer.tell() > MAX_EXPORT_BYTES:
+        return None
+    return buffer.getvalue()
+
+@tracing.traced
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    method: str = event.get('httpMethod', 'GET')
+    
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+    
+    if method != 'GET':
+        return {
+            'statusCode': 405,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': 'Method not allowed'}),
+            'isBase64Encoded': False
+        }
+    
+    params = event.get('queryStringParameters') or {}
+    event_id: str = params.get('eventId', '')
+    export_format: str = params.get('format', 'csv')
+    request_headers = {key.lower(): value for key, value in (event.get('headers') or {}).items()}
+    use_gzip = 'gzip' in request_headers.get('accept-encoding', '')
+    
+    if not event_id or export_format not in ('csv', 'xlsx'):
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': 'eventId is required and format must be csv or xlsx'}),
+            'isBase64Encoded': False
+        }
+    
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        return {
+            'statusCode': 500,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': 'Database configuration missing'}),
+            'isBase64Encoded': False
+        }
+    
+    try:
+        filename = f"stats_{re.sub(r'[^0-9A-Za-z._-]', '_', event_id)}_{date.today().isoformat()}.{export_format}"
+        headers = {
+            'Content-Disposition': f'attachment; filename="{filename}"',
+            'Cache-Control': 'no-cache',
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Expose-Headers': 'Content-Disposition'
+        }
+        
+        if export_format == 'xlsx':
+            content = db.read_with_fallback(
+                database_url, db.read_your_writes(event), lambda conn: export_xlsx(conn, event_id)
+            )
+            headers['Content-Type'] = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        else:
+            content = db.read_with_fallback(
+                database_url, db.read_your_writes(event), lambda conn: export_csv(conn, event_id, use_gzip)
+            )
+            headers['Content-Type'] = 'text/csv; charset=utf-8'
+            if use_gzip:
+                headers['Content-Encoding'] = 'gzip'
+        
+        if content is None:
+            return {
+                'statusCode': 413,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({'error': f'Export too large: over {MAX_EXPORT_ROWS} rows or {MAX_EXPORT_BYTES} bytes'}),
+                'isBase64Encoded': False
+            }
+        
+        return {
+            'statusCode': 200,
+            'headers': headers,
+            'body': base64.b64encode(content).decode('ascii'),
+            'isBase64Encoded': True
+        }
+    
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
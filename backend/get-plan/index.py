@@ -7,8 +7,28 @@ Returns: HTTP response с планом пользователя
 import json
 import os
 from typing import Dict, Any
-import psycopg2
+import db
+import tracing
 
+def read_plan(conn, user_id: str, event_id: str):
+    '''ID сессий плана в порядке пользователя; плана нет — None'''
+    cur = conn.cursor()
+    with tracing.span('plan-select'):
+        cur.execute('''
+            SELECT ARRAY(
+                SELECT s.session_id 
+                FROM unnest(p.session_keys) WITH ORDINALITY AS k(session_key, pos) 
+                JOIN t_p73504605_landing_exhibition_m.event_sessions s ON s.id = k.session_key 
+                ORDER BY k.pos
+            ) 
+            FROM t_p73504605_landing_exhibition_m.user_plans p 
+            WHERE p.user_id = %s AND p.event_id = %s
+        ''', (user_id, event_id))
+        result = cur.fetchone()
+    cur.close()
+    return result
+
+@tracing.traced
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
@@ -63,18 +83,10 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     
-    conn = psycopg2.connect(database_url)
-    
     try:
-        cur = conn.cursor()
-        
-        cur.execute('''
-            SELECT session_ids FROM t_p73504605_landing_exhibition_m.user_plans 
-            WHERE user_id = %s AND event_id = %s
-        ''', (user_id, event_id))
-        
-        result = cur.fetchone()
-        cur.close()
+        result = db.read_with_fallback(
+            database_url, db.read_your_writes(event), lambda conn: read_plan(conn, user_id, event_id)
+        )
         
         if result:
             return {
@@ -107,5 +119,3 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'body': json.dumps({'error': str(e)}),
             'isBase64Encoded': False
         }
-    finally:
-        conn.close()
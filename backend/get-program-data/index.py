@@ -1,14 +1,69 @@
+import hashlib
 import json
 import os
-import psycopg2
-import urllib.request
-from datetime import datetime, timedelta
+import time
+import psycopg2.errors
+import db
+import program_sync
+import queries
+import sheets_parser
+import tracing
 
+# Кеш свежий 5 минут, если у мероприятия не задан свой cache_ttl_seconds
+CACHE_TTL_SECONDS = 300
+# Сколько после TTL кеш ещё отдаётся устаревшим, пока лист обновляет другой запрос (cache_max_stale_seconds)
+CACHE_MAX_STALE_SECONDS = 3600
+# Сколько запрос без кеша ждёт обновления, которое уже ведёт другой запрос: загрузка листа и Meta с запасом
+REFRESH_WAIT_SECONDS = program_sync.SHEET_TIMEOUT_SECONDS * 2
+
+def refresh_lock_key(event_id: str, sheet_gid: str) -> int:
+    '''Ключ advisory-блокировки обновления листа: одно обновление (event_id, sheet_gid) на все контейнеры'''
+    digest = hashlib.md5(f'program_cache|{event_id}|{sheet_gid}'.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big', signed=True)
+
+def refresh_sheet(cur, event_id: str, sheet_id: str, sheet_gid: str, meta_gid) -> None:
+    '''
+    Загружает лист в program_cache на курсоре вызывающего; лист не загрузился — исключение.
+    meta_gid — сохранённый у мероприятия лист Meta (NULL — по умолчанию), тот же, что у sync-program-data.
+    '''
+    if meta_gid is None:
+        meta_gid = sheets_parser.META_SHEET_GID
+    with tracing.span('refresh'):
+        result = program_sync.sync_sheets(cur, event_id, sheet_id, [sheet_gid], meta_gid)
+    if result['errors']:
+        raise RuntimeError(result['errors'][0]['error'])
+
+def read_cache_state(conn, event_id: str, sheet_gid: str):
+    '''Кеш листа и настройки кеша мероприятия одним запросом; мероприятия нет — None'''
+    conn.autocommit = True
+    cur = conn.cursor()
+    with tracing.span('cache'):
+        queries.execute(cur, 'cache_state', (event_id, sheet_gid, CACHE_TTL_SECONDS, CACHE_MAX_STALE_SECONDS))
+        state = cur.fetchone()
+    cur.close()
+    return state
+
+def cache_response(data, cache_status: str, cached_at) -> dict:
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'X-Cache': cache_status,
+            'X-Cache-Date': cached_at.isoformat()
+        },
+        'body': json.dumps(data)
+    }
+
+@tracing.traced
 def handler(event, context):
     '''
-    Business: Получение данных программы с кешированием в БД
+    Business: Получение данных программы с кешированием в БД (stale-while-revalidate)
     Args: event с queryStringParameters (eventId, sheetGid, forceRefresh)
-    Returns: HTTP response с данными программы
+    Returns: HTTP response с разобранным листом программы. X-Cache: HIT — кеш свежий;
+             STALE — кеш устарел, но в пределах max-stale, а лист уже обновляет другой запрос
+             (или таблица не ответила); MISS — лист загружен этим запросом;
+             COALESCED — дождались обновления другого запроса
     '''
     method = event.get('httpMethod', 'GET')
     
@@ -51,100 +106,95 @@ def handler(event, context):
             'body': json.dumps({'error': 'DATABASE_URL not configured'})
         }
     
-    conn = psycopg2.connect(dsn)
-    conn.autocommit = True
+    # Чтение кеша может идти в реплику (DATABASE_READ_URL), запись кеша — только в основную базу
+    state = db.read_with_fallback(
+        dsn, db.read_your_writes(event), lambda conn: read_cache_state(conn, event_id, sheet_gid)
+    )
+    
+    if not state:
+        return {
+            'statusCode': 404,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Event not found'})
+        }
+    
+    sheet_url, data, cached_at, age, ttl, max_stale = state[:6]
+    
+    if not force_refresh and data is not None and age <= ttl:
+        return cache_response(data, 'HIT', cached_at)
+    
+    sheet_id = program_sync.sheet_id_from_url(sheet_url)
+    if not sheet_id:
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Invalid sheet URL'})
+        }
+    
+    # Устаревший, но ещё допустимый кеш: лист обновляет синхронно тот запрос, который взял блокировку,
+    # остальные сразу получают устаревший кеш и не ждут Google. Фонового потока нет — контейнер
+    # замораживают после ответа; листы, которые никто не запрашивает, обновляет sync-program-data
+    serve_stale = not force_refresh and data is not None and age <= ttl + max_stale
+    
+    # Кеша нет, он слишком старый или устарел: обновляем в основной базе.
+    # Одновременные промахи по листу встают в очередь на advisory-блокировку: в Google идёт
+    # только первый, остальные после него перечитывают кеш
+    primary = db.get_connection(dsn)
     
     try:
-        cur = conn.cursor()
-        
-        # Проверяем кеш (если не форсируем обновление)
-        if not force_refresh:
-            safe_event_id = event_id.replace("'", "''")
-            safe_gid = sheet_gid.replace("'", "''")
+        cur = primary.cursor()
+        primary.autocommit = False
+        try:
+            if serve_stale:
+                cur.execute('SELECT pg_try_advisory_xact_lock(%s)', (refresh_lock_key(event_id, sheet_gid),))
+                if not cur.fetchone()[0]:
+                    primary.rollback()
+                    cur.close()
+                    return cache_response(data, 'STALE', cached_at)
+                waited = 0.0
+            else:
+                cur.execute(f"SET LOCAL lock_timeout = '{REFRESH_WAIT_SECONDS}s'")
+                wait_started = time.monotonic()
+                with tracing.span('refresh-lock'):
+                    cur.execute('SELECT pg_advisory_xact_lock(%s)', (refresh_lock_key(event_id, sheet_gid),))
+                waited = time.monotonic() - wait_started
             
-            # Кеш действителен 5 минут
-            cache_expiry = (datetime.now() - timedelta(minutes=5)).isoformat()
-            
-            cur.execute(f"""
-                SELECT data, last_updated 
-                FROM program_cache 
-                WHERE event_id = '{safe_event_id}' 
-                  AND sheet_gid = '{safe_gid}'
-                  AND last_updated > '{cache_expiry}'
-            """)
-            
-            cached = cur.fetchone()
-            if cached:
+            queries.execute(cur, 'cache_state', (event_id, sheet_gid, CACHE_TTL_SECONDS, CACHE_MAX_STALE_SECONDS))
+            locked_state = cur.fetchone()
+            if not locked_state:
+                # Мероприятие удалили, пока ждали блокировку
+                primary.rollback()
+                cur.close()
                 return {
-                    'statusCode': 200,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*',
-                        'X-Cache': 'HIT',
-                        'X-Cache-Date': cached[1].isoformat()
-                    },
-                    'body': json.dumps(cached[0])
+                    'statusCode': 404,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Event not found'})
                 }
-        
-        # Кеша нет или устарел - загружаем из Google Sheets
-        # Получаем URL таблицы из program_events
-        safe_event_id = event_id.replace("'", "''")
-        cur.execute(f"SELECT sheet_url FROM program_events WHERE id = '{safe_event_id}'")
-        event_row = cur.fetchone()
-        
-        if not event_row:
-            cur.close()
-            return {
-                'statusCode': 404,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Event not found'})
-            }
-        
-        sheet_url = event_row[0]
-        sheet_id_match = sheet_url.split('/spreadsheets/d/')
-        if len(sheet_id_match) < 2:
+            # Обновлено, пока ждали блокировку; forceRefresh принимает только обновление новее своего запроса
+            fresh_age = waited if force_refresh else locked_state[4]
+            if locked_state[1] is not None and locked_state[3] <= fresh_age:
+                primary.commit()
+                cur.close()
+                return cache_response(locked_state[1], 'COALESCED', locked_state[2])
+            
+            refresh_sheet(cur, event_id, sheet_id, sheet_gid, locked_state[6])
+            queries.execute(cur, 'cache_state', (event_id, sheet_gid, CACHE_TTL_SECONDS, CACHE_MAX_STALE_SECONDS))
+            refreshed = cur.fetchone()
+            primary.commit()
+        except (psycopg2.errors.LockNotAvailable, RuntimeError, OSError, ValueError) as e:
+            # Таблица не ответила или обновление другого запроса затянулось: лучше старый кеш, чем ошибка
+            primary.rollback()
             cur.close()
+            if data is not None:
+                return cache_response(data, 'STALE', cached_at)
             return {
-                'statusCode': 400,
+                'statusCode': 502,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Invalid sheet URL'})
+                'body': json.dumps({'error': f'Sheet not loaded: {e}'})
             }
         
-        sheet_id = sheet_id_match[1].split('/')[0]
-        csv_url = f'https://docs.google.com/spreadsheets/d/{sheet_id}/export?format=csv&gid={sheet_gid}'
-        
-        # Загружаем CSV (это нужно будет парсить на фронте, но можно и здесь)
-        # Пока возвращаем URL для загрузки клиентом
-        response_data = {
-            'csvUrl': csv_url,
-            'sheetId': sheet_id,
-            'gid': sheet_gid,
-            'cached': False,
-            'timestamp': datetime.now().isoformat()
-        }
-        
-        # Сохраняем в кеш
-        safe_gid = sheet_gid.replace("'", "''")
-        data_json = json.dumps(response_data).replace("'", "''")
-        
-        cur.execute(f"""
-            INSERT INTO program_cache (event_id, sheet_gid, data, last_updated)
-            VALUES ('{safe_event_id}', '{safe_gid}', '{data_json}', CURRENT_TIMESTAMP)
-            ON CONFLICT (event_id, sheet_gid) 
-            DO UPDATE SET data = '{data_json}', last_updated = CURRENT_TIMESTAMP
-        """)
-        
         cur.close()
-        
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*',
-                'X-Cache': 'MISS'
-            },
-            'body': json.dumps(response_data)
-        }
+        return cache_response(refreshed[1], 'MISS', refreshed[2])
     
     finally:
-        conn.close()
+        db.release(primary)
@@ -0,0 +1,470 @@
+'''
+Разбор CSV-листа программы из Google Sheets — порт fetchProgramData из src/utils/googleSheetsParser.ts.
+
+sync-program-data разбирает лист один раз при синхронизации и кладёт в program_cache готовые
+halls/sessions, поэтому клиентам не нужно гонять детекцию залов по всему CSV на телефоне.
+ID сессий обязаны совпадать с фронтендом символ в символ (ДАТА|ЗАЛ|НАЧАЛО|КОНЕЦ): по ним
+сопоставляются планы и статистика. Любая правка логики здесь делается и в googleSheetsParser.ts.
+
+Отличия от TS-версии: нет поля now (время клиента считает сам клиент), сортировка залов внутри
+слота повторяет localeCompare приближённо — без учёта регистра, строчные раньше заглавных.
+
+Файл одинаковый в sync-program-data и get-program-data (обновление кеша при промахе).
+'''
+
+import re
+from typing import Any, Dict, List, Optional
+
+# Лист Meta в таблице мероприятия (META_SHEET_GID во фронтенде)
+META_SHEET_GID = '1494690392'
+# Увеличивается при любой правке разбора: sync-program-data перепишет кеш и для неизменившихся листов
+PARSER_VERSION = 1
+
+MIN_START_MIN = 9 * 60
+# Колонки G (6) и H (7) игнорируются при формировании имени зала (0-based индексы)
+EXCLUDED_HEADER_COLS = {6, 7}
+# START_ROW = 5 соответствует строке 6 в Excel (строки 1-4 это meta, row 5 это заголовки времени)
+START_ROW = 5
+
+# Пробельные символы String.prototype.trim и \s в JS — у str.strip() и re \s набор другой
+_JS_SPACE = '\t\n\v\f\r \u00a0\u1680\u2000-\u200a\u2028\u2029\u202f\u205f\u3000\ufeff'
+_TRIM_RE = re.compile(f'^[{_JS_SPACE}]+|[{_JS_SPACE}]+$')
+_SPACES_RE = re.compile(f'[{_JS_SPACE}]+')
+_S = f'[{_JS_SPACE}]'
+
+_TIME_RE = re.compile(r'^([0-9]{1,2}):([0-9]{2})(?::[0-9]{2})?$')
+_HHMM_RE = re.compile(r'^([0-9]{1,2}):([0-9]{2})$')
+_TAG_BRACKETS_RE = re.compile(r'[{}\[\]()]')
+_TAG_PUNCT_RE = re.compile(r'''[.,;:!?/\\|'"`~^]+''')
+_TAG_ANY_RE = re.compile(r'\{([^}]*)\}')
+_TAG_RE = re.compile(r'\{([^}]+)\}')
+_TOPIC_RE = re.compile(f'^{_S}*Тема{_S}*:{_S}*(.+)$', re.IGNORECASE)
+_QUOTED_RE = re.compile(r'[«"](.*?)[»"]')
+_DASH_RE = re.compile(f'{_S}[—–-]{_S}')
+_COMMA_RE = re.compile(f'{_S}*,{_S}*')
+_JOB_KEYWORDS_RE = re.compile(
+    'директор|руковод|менеджер|основател|эксперт|инженер|профессор|доцент|автор|тренер|психолог|'
+    'консультант|специалист|аналитик|координатор|ассистент|преподаватель|лектор|методист|Lead|Senior|'
+    'Junior|Head|Chief|Manager|Director|Recruiter|BP|методолог|начальник',
+    re.IGNORECASE
+)
+_LINE_DASH_RE = re.compile(f'^{_S}*[–—-]{_S}*')
+_NON_WORD_RE = re.compile(r'[\W_]+')
+_BULLET_SPLIT_RE = re.compile(f'{_S}*[;|·]{_S}*|{_S}+[–—-]{_S}+')
+_PARAGRAPH_RE = re.compile(r'\n{2,}')
+_NEWLINES_RE = re.compile(r'\n+')
+_CSV_SPECIAL_RE = re.compile(r'[",\n]')
+_CSV_QUOTE_RE = re.compile(r'"')
+
+
+def _trim(value: Any) -> str:
+    return _TRIM_RE.sub('', str(value or ''))
+
+
+def _cell(rows: List[List[str]], r: int, c: int) -> str:
+    '''rows[r]?.[c] || '' — строки CSV бывают разной длины'''
+    if 0 <= r < len(rows) and 0 <= c < len(rows[r]):
+        return rows[r][c]
+    return ''
+
+
+def normalize_time(value: Any) -> str:
+    '''«09:30», «9:30:00» → «9:30»; пусто для не-времени, полуночи и всего раньше 9:00'''
+    m = _TIME_RE.match(_trim(value))
+    if not m:
+        return ''
+    hh = int(m.group(1))
+    mm = int(m.group(2))
+    if hh == 0 or hh * 60 + mm < MIN_START_MIN:
+        return ''
+    return f'{hh}:{mm:02d}'
+
+
+def _to_min(hhmm: str) -> Optional[int]:
+    m = _HHMM_RE.match(hhmm or '')
+    return int(m.group(1)) * 60 + int(m.group(2)) if m else None
+
+
+def canonical_tag(value: Any) -> str:
+    s = _TAG_BRACKETS_RE.sub(' ', str(value or ''))
+    s = _TAG_PUNCT_RE.sub(' ', s)
+    s = _trim(_SPACES_RE.sub(' ', s)).lower().replace('ё', 'е').replace('.', '')
+    return _trim(s)
+
+
+def pretty_tag(canon: str) -> str:
+    return ' '.join(w[0].upper() + w[1:] if w else w for w in canon.split(' '))
+
+
+def _parse_talk(text: str) -> Dict[str, Any]:
+    raw = _trim(str(text or '').replace('\r', ''))
+    all_lines = raw.split('\n')
+    head = all_lines.pop(0) or ''
+
+    tags_raw: List[str] = []
+
+    def pull_tags(s: str) -> str:
+        def take(m):
+            t = _trim(m.group(1))
+            if t:
+                tags_raw.append(t)
+            return ' '
+        return _trim(_SPACES_RE.sub(' ', _TAG_ANY_RE.sub(take, s)))
+
+    clean_head = _trim(pull_tags(head))
+
+    title = ''
+    body_lines = []
+    for line in all_lines:
+        m = _TOPIC_RE.match(line)
+        if m:
+            title = _trim(m.group(1))
+        else:
+            body_lines.append(line)
+
+    speaker = ''
+    role = ''
+
+    q = _QUOTED_RE.search(clean_head)
+    if q and not title:
+        title = _trim(q.group(1))
+
+    dash_parts = [p for p in (_trim(x) for x in _DASH_RE.split(clean_head)) if p]
+    if len(dash_parts) >= 2:
+        left = dash_parts.pop(0)
+        if not title:
+            title = ' — '.join(dash_parts)
+        p2 = _COMMA_RE.split(left)
+        speaker = p2.pop(0) or ''
+        role = ', '.join(p2)
+    else:
+        p = _COMMA_RE.split(clean_head)
+        by_dash = len(p) < 2
+        if not by_dash:
+            # Признаки должности во второй части: строчная первая буква (кроме англ. аббревиатур)
+            # или слова-маркеры должностей
+            rest_text = ', '.join(p[1:])
+            rest_trimmed = _trim(rest_text)
+            first_char = rest_trimmed[0] if rest_trimmed else ''
+            starts_with_lower = bool(first_char) and first_char == first_char.lower() \
+                and not re.match(r'[A-Z&]', rest_text)
+            if starts_with_lower or _JOB_KEYWORDS_RE.search(rest_text):
+                speaker = p[0]
+                role = ', '.join(p[1:])
+            else:
+                by_dash = True
+        if by_dash:
+            d = _DASH_RE.split(clean_head)
+            if len(d) == 2:
+                speaker = d[0]
+                title = title or d[1]
+            elif not title:
+                title = clean_head
+
+    abstract = _trim(pull_tags('\n'.join(body_lines)))
+
+    return {
+        'speaker': speaker,
+        'role': role,
+        'title': title,
+        'abstract': abstract,
+        'tagsCanon': [c for c in map(canonical_tag, tags_raw) if c],
+    }
+
+
+def _split_lines(s: str) -> List[str]:
+    return [x for x in (_trim(_LINE_DASH_RE.sub('', line, count=1)) for line in _NEWLINES_RE.split(s or '')) if x]
+
+
+def _norm_line(s: str) -> str:
+    return _trim(_SPACES_RE.sub(' ', _NON_WORD_RE.sub(' ', s.lower())))
+
+
+def _norm_all(s: str) -> str:
+    return ' '.join(_norm_line(line) for line in _split_lines(s))
+
+
+def _smart_merge_text(a: str, b: str) -> str:
+    a = _trim(a)
+    b = _trim(b)
+    if not a:
+        return b
+    if not b:
+        return a
+
+    na = _norm_all(a)
+    nb = _norm_all(b)
+    if nb.startswith(na):
+        return b
+    if na.startswith(nb):
+        return a
+
+    seen = set()
+    out = []
+    for line in _split_lines(a) + _split_lines(b):
+        n = _norm_line(line)
+        if not n or n in seen:
+            continue
+        seen.add(n)
+        out.append(line)
+    return '\n'.join(out)
+
+
+def _split_bullets(s: str) -> List[str]:
+    s = _trim(str(s or '').replace('\r', ''))
+    if not s:
+        return []
+    if '•' in s:
+        return [x for x in map(_trim, s.split('•')) if x]
+    if '\n' in s:
+        return [x for x in map(_trim, _NEWLINES_RE.split(s)) if x]
+    parts = [x for x in map(_trim, _BULLET_SPLIT_RE.split(s)) if x]
+    return parts or [s]
+
+
+def parse_csv(text: str) -> List[List[str]]:
+    '''
+    CSV листа программы: кавычки и переносы строк внутри ячеек, \\r выбрасывается везде.
+    Текст между служебными символами копируется срезами, а не по символу — лист бывает на сотни КБ.
+    '''
+    text = text.replace('\r', '')
+    rows: List[List[str]] = []
+    row: List[str] = []
+    cell: List[str] = []
+    in_quotes = False
+    pos = 0
+    while True:
+        m = (_CSV_QUOTE_RE if in_quotes else _CSV_SPECIAL_RE).search(text, pos)
+        if not m:
+            cell.append(text[pos:])
+            break
+        cell.append(text[pos:m.start()])
+        pos = m.end()
+        ch = m.group()
+        if ch == '"':
+            if in_quotes and text.startswith('"', pos):
+                cell.append('"')
+                pos += 1
+            else:
+                in_quotes = not in_quotes
+        elif ch == ',':
+            row.append(''.join(cell))
+            cell = []
+        else:
+            row.append(''.join(cell))
+            rows.append(row)
+            row = []
+            cell = []
+
+    last = ''.join(cell)
+    if last or row:
+        row.append(last)
+        rows.append(row)
+    return rows
+
+
+def parse_meta(text: str) -> Dict[str, str]:
+    '''Лист Meta: «ключ,значение» построчно, ключ в нижнем регистре, пустые строки пропускаются'''
+    rows: List[List[str]] = []
+    row: List[str] = []
+    cell: List[str] = []
+    in_quotes = False
+    i = 0
+    n = len(text)
+    while i < n:
+        ch = text[i]
+        if ch == '"':
+            if in_quotes and i + 1 < n and text[i + 1] == '"':
+                cell.append('"')
+                i += 1
+            else:
+                in_quotes = not in_quotes
+        elif ch == ',' and not in_quotes:
+            row.append(''.join(cell))
+            cell = []
+        elif ch in '\r\n' and not in_quotes:
+            if ch == '\r' and i + 1 < n and text[i + 1] == '\n':
+                i += 1
+            row.append(''.join(cell))
+            if any(_trim(c) for c in row):
+                rows.append(row)
+            row = []
+            cell = []
+        else:
+            cell.append(ch)
+        i += 1
+
+    if cell or row:
+        row.append(''.join(cell))
+        if any(_trim(c) for c in row):
+            rows.append(row)
+
+    meta: Dict[str, str] = {}
+    for row in rows:
+        if len(row) >= 2:
+            key = _trim(row[0]).lower()
+            value = _trim(','.join(row[1:]))
+            if key and value:
+                meta[key] = value
+    return meta
+
+
+def _detect_halls(rows: List[List[str]]) -> List[Dict[str, Any]]:
+    '''Залы — пары колонок (начало, конец), где хотя бы в одной строке есть валидное время'''
+    R = len(rows)
+    C = len(rows[0])
+
+    def header_name(c1: int, c2: int) -> str:
+        parts = []
+        for c in range(c1, min(c2 + 1, C)):
+            if c in EXCLUDED_HEADER_COLS:
+                continue
+            v = _trim(_cell(rows, 0, c))
+            if v:
+                parts.append(v)
+        return _trim(' '.join(parts))
+
+    def hall_bullets(c1: int, c2: int) -> List[str]:
+        parts = [v for v in (_trim(_cell(rows, 1, c)) for c in range(c1, min(c2 + 1, C))) if v]
+        return _split_bullets(' '.join(parts))
+
+    halls = []
+    c = 0
+    while c <= C - 2:
+        time_hits = 0
+        text_col = c + 2
+        for r in range(START_ROW, R):
+            if normalize_time(_cell(rows, r, c)) and normalize_time(_cell(rows, r, c + 1)):
+                time_hits += 1
+                # Если в c+2 время, а не текст, то текст скорее в c+3
+                if normalize_time(_trim(_cell(rows, r, c + 2))) and _trim(_cell(rows, r, c + 3)):
+                    text_col = c + 3
+
+        if time_hits >= 1:
+            name = header_name(c, text_col)
+            if name:
+                halls.append({'id': str(c), 'name': name, 'bullets': hall_bullets(c, text_col)})
+            c = text_col + 1
+        else:
+            c += 1
+    return halls
+
+
+def _extract_tags(text: str, tags_raw: List[str]) -> str:
+    def take(m):
+        t = _trim(m.group(1))
+        if t:
+            tags_raw.append(t)
+        return ''
+    return _trim(_TAG_RE.sub(take, text))
+
+
+def _hall_sessions(rows: List[List[str]], hall: Dict[str, Any], meta_date: str) -> List[Dict[str, Any]]:
+    R = len(rows)
+    cs = int(hall['id'])
+    ce = cs + 1
+    ct = cs + 2
+    sessions = []
+
+    r = START_ROW
+    while r < R:
+        s0 = normalize_time(_cell(rows, r, cs))
+        e0 = normalize_time(_cell(rows, r, ce))
+        raw0 = _trim(_cell(rows, r, ct))
+        photo_url = _trim(_cell(rows, r, ct + 1))
+
+        # Строка без времени начала/конца или без текста не начинает новый доклад
+        if not s0 or not e0 or not raw0:
+            r += 1
+            continue
+
+        # Продолжения доклада — следующие строки без времени, но с текстом
+        next_row = r + 1
+        while next_row < R:
+            next_text = _trim(_cell(rows, next_row, ct))
+            if normalize_time(_cell(rows, next_row, cs)) or normalize_time(_cell(rows, next_row, ce)) \
+                    or not next_text:
+                break
+            raw0 += '\n' + next_text
+            next_row += 1
+        r = next_row
+
+        parts = _PARAGRAPH_RE.split(raw0.replace('\r', ''))
+        header = _trim(parts.pop(0))
+        rest = _trim('\n\n'.join(parts))
+
+        tags_raw: List[str] = []
+        clean_header = _extract_tags(header, tags_raw)
+        clean_rest = _extract_tags(rest, tags_raw)
+
+        talk = _parse_talk(clean_header)
+        desc = _smart_merge_text(talk['abstract'], clean_rest)
+
+        tags_canon: List[str] = []
+        for tag in tags_raw + talk['tagsCanon']:
+            canon = canonical_tag(tag)
+            if canon and canon not in tags_canon:
+                tags_canon.append(canon)
+
+        if _to_min(e0) <= _to_min(s0):
+            continue
+
+        # Дата в ID различает одинаковые сессии на разных днях
+        if meta_date:
+            session_id = f"{meta_date}|{hall['name']}|{s0}|{e0}"
+        else:
+            session_id = f"{hall['name']}|{s0}|{e0}|{talk['title'] or clean_header or raw0}"
+
+        session = {
+            'id': session_id,
+            'hallId': hall['id'],
+            'hall': hall['name'],
+            'start': s0,
+            'end': e0,
+            'title': talk['title'] or '',
+            'speaker': talk['speaker'] or '',
+            'role': talk['role'] or '',
+            'desc': desc,
+            'tags': [pretty_tag(c) for c in tags_canon],
+            'tagsCanon': tags_canon,
+        }
+        if photo_url:
+            session['photo'] = photo_url
+        session['date'] = meta_date
+        sessions.append(session)
+    return sessions
+
+
+def parse_program(csv_text: str, meta: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    '''
+    Разбирает CSV дневного листа в ProgramData (title, halls, sessions, meta) без поля now.
+    meta — результат parse_meta для листа Meta, если он есть.
+    Бросает ValueError, если в листе меньше START_ROW + 1 строк.
+    '''
+    meta = meta or {}
+    rows = parse_csv(csv_text)
+    if len(rows) < 6:
+        raise ValueError('Недостаточно данных в таблице')
+
+    halls = _detect_halls(rows)
+    meta_date = meta.get('date') or _trim(_cell(rows, 1, 0))
+
+    sessions = []
+    for hall in halls:
+        sessions.extend(_hall_sessions(rows, hall, meta_date))
+    sessions.sort(key=lambda s: (_to_min(s['start']), s['hall'].lower(), s['hall'].swapcase()))
+
+    title = meta.get('title') or _trim(_cell(rows, 0, 0) or 'Программа мероприятия')
+    return {
+        'title': title,
+        'halls': halls,
+        'sessions': sessions,
+        'meta': {
+            'title': title,
+            'subtitle': meta.get('subtitle') or _trim(_cell(rows, 1, 0)),
+            'date': meta_date,
+            'venue': meta.get('venue') or _trim(_cell(rows, 3, 0)),
+            'logoId': meta.get('logoid') or '',
+            'coverId': meta.get('coverid') or '',
+        },
+    }
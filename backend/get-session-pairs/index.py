@@ -0,0 +1,176 @@
+'''
+Business: Пары сессий, которые участники планируют вместе, для переноса докладов между залами
+Args: event с httpMethod, queryStringParameters (eventId, limit — размер каждого списка)
+Returns: HTTP response с самыми частыми парами и пересекающимися по времени парами (clashes)
+'''
+
+import json
+import os
+from typing import Dict, Any
+import psycopg2
+import psycopg2.extras
+import db
+import tracing
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 200
+# Доклады одного дня с перерывом не больше этого считаются идущими подряд
+BACK_TO_BACK_GAP_MINUTES = 15
+
+# Сумма шардов session_pairs плюс несвёрнутые изменения журнала; время и день берутся
+# из разобранных колонок event_sessions
+PAIRS_SQL = '''
+    WITH counts AS (
+        SELECT session_a, session_b, SUM(pair_count)::int AS pair_count
+        FROM (
+            SELECT session_a, session_b, pair_count
+            FROM t_p73504605_landing_exhibition_m.session_pairs
+            WHERE event_id = %(event_id)s
+            UNION ALL
+            SELECT session_a, session_b, delta
+            FROM t_p73504605_landing_exhibition_m.session_pair_deltas
+            WHERE event_id = %(event_id)s
+        ) all_counts
+        GROUP BY session_a, session_b
+        HAVING SUM(pair_count) > 0
+    ), pairs AS (
+        SELECT
+            a.session_id AS session_a,
+            b.session_id AS session_b,
+            c.pair_count,
+            a.session_date IS NOT DISTINCT FROM b.session_date
+                AND a.starts_at < b.ends_at AND b.starts_at < a.ends_at AS parallel,
+            a.session_date IS NOT DISTINCT FROM b.session_date
+                AND (b.starts_at - a.ends_at BETWEEN INTERVAL '0' AND make_interval(mins => %(gap)s)
+                     OR a.starts_at - b.ends_at BETWEEN INTERVAL '0' AND make_interval(mins => %(gap)s)) AS back_to_back,
+            a.session_date AS date,
+            to_char(GREATEST(a.starts_at, b.starts_at), 'HH24:MI') AS overlap_start,
+            to_char(LEAST(a.ends_at, b.ends_at), 'HH24:MI') AS overlap_end
+        FROM counts c
+        JOIN t_p73504605_landing_exhibition_m.event_sessions a ON a.id = c.session_a
+        JOIN t_p73504605_landing_exhibition_m.event_sessions b ON b.id = c.session_b
+    )
+'''
+
+def read_pairs(conn, event_id: str, limit: int):
+    '''Самые частые пары и самые частые пересекающиеся по времени пары: (pairs, clashes)'''
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    query_params = {'event_id': event_id, 'gap': BACK_TO_BACK_GAP_MINUTES, 'limit': limit}
+    
+    cur.execute(PAIRS_SQL + '''
+        SELECT
+            session_a,
+            session_b,
+            pair_count,
+            CASE WHEN parallel THEN 'parallel' WHEN back_to_back THEN 'backToBack' END AS relation
+        FROM pairs
+        ORDER BY pair_count DESC, session_a, session_b
+        LIMIT %(limit)s
+    ''', query_params)
+    top_pairs = [dict(row) for row in cur.fetchall()]
+    
+    # Пересекающиеся по времени пары: столько участников не смогут попасть на оба доклада
+    cur.execute(PAIRS_SQL + '''
+        SELECT session_a, session_b, pair_count, date, overlap_start, overlap_end
+        FROM pairs
+        WHERE parallel
+        ORDER BY pair_count DESC, session_a, session_b
+        LIMIT %(limit)s
+    ''', query_params)
+    clashes = [dict(row) for row in cur.fetchall()]
+    
+    cur.close()
+    return top_pairs, clashes
+
+@tracing.traced
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    method: str = event.get('httpMethod', 'GET')
+    
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+    
+    if method != 'GET':
+        return {
+            'statusCode': 405,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': 'Method not allowed'}),
+            'isBase64Encoded': False
+        }
+    
+    params = event.get('queryStringParameters') or {}
+    event_id: str = params.get('eventId', '')
+    limit_param: str = str(params.get('limit') or DEFAULT_LIMIT)
+    
+    if not event_id:
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': 'eventId is required'}),
+            'isBase64Encoded': False
+        }
+    
+    if not limit_param.isdigit() or not 1 <= int(limit_param) <= MAX_LIMIT:
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': f'limit must be an integer between 1 and {MAX_LIMIT}'}),
+            'isBase64Encoded': False
+        }
+    
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        return {
+            'statusCode': 500,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': 'Database configuration missing'}),
+            'isBase64Encoded': False
+        }
+    
+    try:
+        top_pairs, clashes = db.read_with_fallback(
+            database_url, db.read_your_writes(event), lambda conn: read_pairs(conn, event_id, int(limit_param))
+        )
+        
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Cache-Control': 'no-cache',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'pairs': top_pairs, 'clashes': clashes}),
+            'isBase64Encoded': False
+        }
+    
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
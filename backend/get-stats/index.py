@@ -1,15 +1,313 @@
 '''
 Business: Получение статистики интереса к докладам для организаторов
-Args: event с httpMethod, queryStringParameters (eventId)
-Returns: HTTP response со статистикой по сессиям
+Args: event с httpMethod, queryStringParameters (eventId; limit, cursor — топ-N и постраничная выдача;
+      hall, date, from, to — фильтры по залу, дню и времени начала; groupBy=hall|slot — агрегаты;
+      series=minute|hour, sessionId, since, until — динамика интереса по минутным или часовым корзинам),
+      headers (If-None-Match)
+Returns: HTTP response со статистикой по сессиям или группам, либо 304, если она не менялась
 '''
 
+import base64
+import hashlib
 import json
 import os
-from typing import Dict, Any
+import re
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional, Tuple
 import psycopg2
+import psycopg2.extensions
 import psycopg2.extras
+import db
+import tracing
 
+MAX_LIMIT = 500
+GROUP_BY_COLUMNS = {
+    'hall': ['hall'],
+    'slot': ['session_date', 'starts_at', 'ends_at']
+}
+SERIES_RESOLUTIONS = ('minute', 'hour')
+TIME_PATTERN = re.compile(r'^([01]?[0-9]|2[0-3])[:.]([0-5][0-9])$')
+
+def encode_cursor(interest_count: int, session_key: int) -> str:
+    return base64.urlsafe_b64encode(f'{interest_count}:{session_key}'.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor: str) -> Tuple[int, int]:
+    interest_count, session_key = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split(':')
+    return int(interest_count), int(session_key)
+
+def parse_time(value: str) -> str:
+    match = TIME_PATTERN.match(value.strip())
+    if not match:
+        raise ValueError('from and to must be times in HH:MM format')
+    return f'{int(match.group(1)):02d}:{match.group(2)}'
+
+def parse_timestamp(value: str) -> str:
+    '''Метки в базе — TIMESTAMP без зоны в UTC: время со смещением переводится в UTC, без смещения считается UTC'''
+    try:
+        parsed = datetime.fromisoformat(value.strip())
+    except ValueError:
+        raise ValueError('since and until must be ISO 8601 timestamps')
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed.isoformat()
+
+def parse_stats_query(params: Dict[str, Any]) -> Dict[str, Any]:
+    '''
+    Разбирает параметры выборки. Без limit, фильтров и groupBy ответ прежний: все сессии мероприятия.
+    Бросает ValueError с текстом для 400.
+    '''
+    query: Dict[str, Any] = {
+        'hall': params.get('hall') or None,
+        'date': params.get('date') or None,
+        'from': parse_time(params['from']) if params.get('from') else None,
+        'to': parse_time(params['to']) if params.get('to') else None,
+        'limit': None,
+        'cursor': None,
+        'groupBy': params.get('groupBy') or None,
+        'series': params.get('series') or None,
+        'sessionId': params.get('sessionId') or None,
+        'since': parse_timestamp(params['since']) if params.get('since') else None,
+        'until': parse_timestamp(params['until']) if params.get('until') else None
+    }
+    
+    if params.get('limit'):
+        if not str(params['limit']).isdigit() or not 1 <= int(params['limit']) <= MAX_LIMIT:
+            raise ValueError(f'limit must be an integer between 1 and {MAX_LIMIT}')
+        query['limit'] = int(params['limit'])
+    
+    if query['groupBy'] is not None and query['groupBy'] not in GROUP_BY_COLUMNS:
+        raise ValueError('groupBy must be one of: hall, slot')
+    
+    if query['series'] is not None:
+        if query['series'] not in SERIES_RESOLUTIONS:
+            raise ValueError('series must be one of: minute, hour')
+        if query['groupBy'] or params.get('cursor'):
+            raise ValueError('series cannot be combined with groupBy or cursor')
+    
+    if params.get('cursor'):
+        if query['groupBy']:
+            raise ValueError('cursor is not supported with groupBy')
+        try:
+            query['cursor'] = decode_cursor(params['cursor'])
+        except (ValueError, UnicodeDecodeError):
+            raise ValueError('cursor is invalid')
+    
+    return query
+
+def get_stats_etag(cur, event_id: str, query: Dict[str, Any]) -> str:
+    '''
+    Версия статистики мероприятия: сумма stats_versions по шардам. Её увеличивает в той же транзакции
+    каждое изменение счётчиков, журнала, истории и итогов, поэтому ETag есть всегда, в том числе
+    во время частых сохранений, и меняется ровно тогда, когда меняются данные.
+    Параметры выборки входят в ETag: у каждой страницы и каждого среза своя версия.
+    '''
+    cur.execute('''
+        SELECT COALESCE(SUM(version), 0) AS version 
+        FROM t_p73504605_landing_exhibition_m.stats_versions 
+        WHERE event_id = %s
+    ''', (event_id,))
+    version = cur.fetchone()['version']
+    fingerprint = json.dumps(query, sort_keys=True)
+    digest = hashlib.md5(f'{event_id}|{version}|{fingerprint}'.encode('utf-8')).hexdigest()
+    return f'"{digest[:20]}"'
+
+# Сессии мероприятия после фильтров (индексы по event_sessions) и сумма их шардов session_stats
+# вместе с ещё не свёрнутыми compact-stats изменениями из журнала. Шард может быть отрицательным,
+# поэтому к нулю приводится только сумма
+FILTERED_COUNTS_SQL = '''
+    WITH sessions AS (
+        SELECT id, session_id, session_date, hall, starts_at, ends_at 
+        FROM t_p73504605_landing_exhibition_m.event_sessions 
+        WHERE event_id = %(event_id)s 
+          AND (%(hall)s::text IS NULL OR hall = %(hall)s) 
+          AND (%(date)s::text IS NULL OR session_date = %(date)s) 
+          AND (%(from)s::time IS NULL OR starts_at >= %(from)s::time) 
+          AND (%(to)s::time IS NULL OR starts_at < %(to)s::time)
+    ), counts AS (
+        SELECT session_key, GREATEST(0, SUM(interest_count))::int AS interest_count 
+        FROM (
+            SELECT session_key, interest_count 
+            FROM t_p73504605_landing_exhibition_m.session_stats 
+            WHERE event_id = %(event_id)s AND session_key IN (SELECT id FROM sessions) 
+            UNION ALL 
+            SELECT session_key, delta 
+            FROM t_p73504605_landing_exhibition_m.session_stats_deltas 
+            WHERE event_id = %(event_id)s AND session_key IN (SELECT id FROM sessions)
+        ) all_counts 
+        GROUP BY session_key
+    )
+'''
+
+def fetch_sessions(cur, event_id: str, query: Dict[str, Any]) -> Tuple[list, Optional[str]]:
+    '''
+    Сессии по убыванию интереса. С limit — страница и курсор следующей: курсор хранит
+    (interest_count, номер сессии) последней строки, следующая страница продолжает строго после неё.
+    '''
+    cursor_count, cursor_key = query['cursor'] or (None, None)
+    cur.execute(FILTERED_COUNTS_SQL + '''
+        SELECT 
+            c.session_key, 
+            s.session_id, 
+            c.interest_count, 
+            s.session_date AS date, 
+            s.hall, 
+            to_char(s.starts_at, 'HH24:MI') AS start, 
+            to_char(s.ends_at, 'HH24:MI') AS "end" 
+        FROM counts c 
+        JOIN sessions s ON s.id = c.session_key 
+        WHERE %(cursor_count)s::int IS NULL 
+           OR c.interest_count < %(cursor_count)s::int 
+           OR (c.interest_count = %(cursor_count)s::int AND c.session_key > %(cursor_key)s::int) 
+        ORDER BY c.interest_count DESC, c.session_key 
+        LIMIT %(limit)s
+    ''', {
+        'event_id': event_id,
+        'hall': query['hall'],
+        'date': query['date'],
+        'from': query['from'],
+        'to': query['to'],
+        'cursor_count': cursor_count,
+        'cursor_key': cursor_key,
+        'limit': query['limit'] + 1 if query['limit'] else None
+    })
+    rows = cur.fetchall()
+    
+    next_cursor = None
+    if query['limit'] and len(rows) > query['limit']:
+        rows = rows[:query['limit']]
+        next_cursor = encode_cursor(rows[-1]['interest_count'], rows[-1]['session_key'])
+    
+    sessions = []
+    for row in rows:
+        session = dict(row)
+        del session['session_key']
+        sessions.append(session)
+    return sessions, next_cursor
+
+def fetch_groups(cur, event_id: str, query: Dict[str, Any]) -> list:
+    '''Суммарный интерес по залам или по временным слотам: GROUP BY считает сама база'''
+    columns = GROUP_BY_COLUMNS[query['groupBy']]
+    group_columns = ', '.join(f's.{column}' for column in columns)
+    cur.execute(FILTERED_COUNTS_SQL + f'''
+        SELECT 
+            {group_columns}, 
+            SUM(c.interest_count)::int AS interest_count, 
+            COUNT(*)::int AS sessions 
+        FROM counts c 
+        JOIN sessions s ON s.id = c.session_key 
+        GROUP BY {group_columns} 
+        ORDER BY interest_count DESC, {group_columns} 
+        LIMIT %(limit)s
+    ''', {
+        'event_id': event_id,
+        'hall': query['hall'],
+        'date': query['date'],
+        'from': query['from'],
+        'to': query['to'],
+        'limit': query['limit']
+    })
+    
+    groups = []
+    for row in cur.fetchall():
+        group = dict(row)
+        if query['groupBy'] == 'slot':
+            starts_at = group.pop('starts_at')
+            ends_at = group.pop('ends_at')
+            group['date'] = group.pop('session_date')
+            group['start'] = starts_at.strftime('%H:%M') if starts_at else None
+            group['end'] = ends_at.strftime('%H:%M') if ends_at else None
+        groups.append(group)
+    return groups
+
+def fetch_series(cur, event_id: str, query: Dict[str, Any]) -> list:
+    '''
+    Добавления и удаления по корзинам времени для мероприятия или одной сессии (sessionId).
+    Минутный ряд есть только в пределах горизонта compact-stats; часовой складывает
+    перенесённые часовые корзины со свежими минутными, округлёнными до часа.
+    '''
+    minutes_sql = '''
+        SELECT date_trunc(%(resolution)s, m.bucket) AS bucket, m.added, m.removed 
+        FROM t_p73504605_landing_exhibition_m.session_interest_minutes m 
+        WHERE m.event_id = %(event_id)s 
+          AND (%(session_id)s::text IS NULL OR m.session_key = (SELECT id FROM matched_session)) 
+          AND (%(since)s::timestamp IS NULL OR m.bucket >= %(since)s::timestamp) 
+          AND (%(until)s::timestamp IS NULL OR m.bucket < %(until)s::timestamp)
+    '''
+    hours_sql = '''
+        UNION ALL 
+        SELECT h.bucket, h.added, h.removed 
+        FROM t_p73504605_landing_exhibition_m.session_interest_hours h 
+        WHERE h.event_id = %(event_id)s 
+          AND (%(session_id)s::text IS NULL OR h.session_key = (SELECT id FROM matched_session)) 
+          AND (%(since)s::timestamp IS NULL OR h.bucket >= %(since)s::timestamp) 
+          AND (%(until)s::timestamp IS NULL OR h.bucket < %(until)s::timestamp)
+    '''
+    cur.execute('''
+        WITH matched_session AS (
+            SELECT id FROM t_p73504605_landing_exhibition_m.event_sessions 
+            WHERE event_id = %(event_id)s AND session_id = %(session_id)s
+        )
+        SELECT bucket, SUM(added)::int AS added, SUM(removed)::int AS removed 
+        FROM (''' + minutes_sql + (hours_sql if query['series'] == 'hour' else '') + ''') buckets 
+        GROUP BY bucket 
+        ORDER BY bucket 
+        LIMIT %(limit)s
+    ''', {
+        'event_id': event_id,
+        'resolution': query['series'],
+        'session_id': query['sessionId'],
+        'since': query['since'],
+        'until': query['until'],
+        'limit': query['limit']
+    })
+    return [
+        {'bucket': row['bucket'].isoformat() + 'Z', 'added': row['added'], 'removed': row['removed']}
+        for row in cur.fetchall()
+    ]
+
+def read_stats(conn, event_id: str, query: Dict[str, Any], if_none_match: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+    '''(ETag, тело ответа); тело None — клиент прислал этот ETag в If-None-Match'''
+    # Версия и данные читаются из одного снимка: ETag в ответе всегда соответствует телу
+    conn.set_session(isolation_level=psycopg2.extensions.ISOLATION_LEVEL_REPEATABLE_READ)
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    
+    with tracing.span('etag'):
+        etag = get_stats_etag(cur, event_id, query)
+    if etag in [tag.strip() for tag in if_none_match.split(',')]:
+        cur.close()
+        return etag, None
+    
+    with tracing.span('query'):
+        if query['series']:
+            result: Dict[str, Any] = {
+                'series': query['series'],
+                'sessionId': query['sessionId'],
+                'points': fetch_series(cur, event_id, query)
+            }
+        elif query['groupBy']:
+            result = {
+                'groupBy': query['groupBy'],
+                'groups': fetch_groups(cur, event_id, query)
+            }
+        else:
+            sessions, next_cursor = fetch_sessions(cur, event_id, query)
+            result = {'sessions': sessions}
+            if query['limit']:
+                result['nextCursor'] = next_cursor
+        
+        # Участники с непустым планом: поддерживаемый save-plan счётчик вместо COUNT(DISTINCT user_id)
+        cur.execute('''
+            SELECT total_users 
+            FROM t_p73504605_landing_exhibition_m.event_totals 
+            WHERE event_id = %s
+        ''', (event_id,))
+        totals = cur.fetchone()
+    result['totalUsers'] = totals['total_users'] if totals else 0
+    
+    cur.close()
+    return etag, result
+
+@tracing.traced
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
@@ -19,7 +317,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
+                'Access-Control-Allow-Headers': 'Content-Type, If-None-Match',
                 'Access-Control-Max-Age': '86400'
             },
             'body': '',
@@ -39,6 +337,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     
     params = event.get('queryStringParameters') or {}
     event_id: str = params.get('eventId', '')
+    request_headers = {key.lower(): value for key, value in (event.get('headers') or {}).items()}
+    if_none_match: str = request_headers.get('if-none-match', '')
     
     if not event_id:
         return {
@@ -51,6 +351,19 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     
+    try:
+        query = parse_stats_query(params)
+    except ValueError as e:
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
+    
     database_url = os.environ.get('DATABASE_URL')
     if not database_url:
         return {
@@ -63,45 +376,36 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     
-    conn = psycopg2.connect(database_url)
-    
     try:
-        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-        
-        cur.execute('''
-            SELECT session_id, interest_count 
-            FROM t_p73504605_landing_exhibition_m.session_stats 
-            WHERE event_id = %s 
-            ORDER BY interest_count DESC
-        ''', (event_id,))
-        
-        stats = cur.fetchall()
-        
-        cur.execute('''
-            SELECT COUNT(DISTINCT user_id) as total_users 
-            FROM t_p73504605_landing_exhibition_m.user_plans 
-            WHERE event_id = %s
-        ''', (event_id,))
-        
-        total_users = cur.fetchone()['total_users']
-        
-        cur.close()
-        
-        result = {
-            'totalUsers': total_users,
-            'sessions': [dict(row) for row in stats]
-        }
+        etag, result = db.read_with_fallback(
+            database_url, db.read_your_writes(event), lambda conn: read_stats(conn, event_id, query, if_none_match)
+        )
+        if result is None:
+            return {
+                'statusCode': 304,
+                'headers': {
+                    'ETag': etag,
+                    'Cache-Control': 'no-cache',
+                    'Access-Control-Allow-Origin': '*',
+                    'Access-Control-Expose-Headers': 'ETag'
+                },
+                'body': '',
+                'isBase64Encoded': False
+            }
         
         return {
             'statusCode': 200,
             'headers': {
                 'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
+                'Cache-Control': 'no-cache',
+                'ETag': etag,
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Expose-Headers': 'ETag'
             },
             'body': json.dumps(result),
             'isBase64Encoded': False
         }
-        
+    
     except Exception as e:
         return {
             'statusCode': 500,
@@ -112,5 +416,3 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'body': json.dumps({'error': str(e)}),
             'isBase64Encoded': False
         }
-    finally:
-        conn.close()
@@ -20,6 +20,7 @@ from reportlab.lib.enums import TA_CENTER, TA_LEFT
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak, HRFlowable, Image
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
+import tracing
 
 LOGO_FILE_ID = '1Od5EAbR38Nu53sswxwRUrBVYTCdSSivq'
 COVER_IMAGE_ID = '1Lam16DwG622LGqp0DrHwgY4xKWV3WLvU'
@@ -247,7 +248,8 @@ class FooterCanvas:
 
 def create_pdf(data: Dict[str, Any]) -> bytes:
     """Создание PDF"""
-    setup_fonts()
+    with tracing.span('fonts'):
+        setup_fonts()
     
     buffer = io.BytesIO()
     
@@ -266,8 +268,9 @@ def create_pdf(data: Dict[str, Any]) -> bytes:
     print(f'🖼️ Cover ID: {meta.cover_id}')
     print(f'🏢 Logo ID: {meta.logo_id}')
     
-    cover_img = download_image(meta.cover_id or COVER_IMAGE_ID)
-    logo_img = download_image(meta.logo_id or LOGO_FILE_ID)
+    with tracing.span('images'):
+        cover_img = download_image(meta.cover_id or COVER_IMAGE_ID)
+        logo_img = download_image(meta.logo_id or LOGO_FILE_ID)
     
     doc = SimpleDocTemplate(
         buffer,
@@ -506,11 +509,13 @@ def create_pdf(data: Dict[str, Any]) -> bytes:
     
     # Сборка
     footer = FooterCanvas(logo_img, meta)
-    doc.build(story, onFirstPage=footer.draw_footer, onLaterPages=footer.draw_footer)
+    with tracing.span('build'):
+        doc.build(story, onFirstPage=footer.draw_footer, onLaterPages=footer.draw_footer)
     
     return buffer.getvalue()
 
 
+@tracing.traced
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method = event.get('httpMethod', 'POST')
     
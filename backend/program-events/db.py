@@ -0,0 +1,197 @@
+'''
+Соединения с БД, которые переживают вызовы тёплого контейнера: TCP, TLS и авторизация в Postgres
+проходят один раз на соединение, а не на каждый запрос.
+
+Небольшой пул на уровне модуля: get_connection() выдаёт свободное соединение (или открывает новое),
+release() возвращает его в пул. В облаке контейнер обслуживает один запрос за раз и держит одно
+соединение; в одном процессе с потоками (локальный сервер, бенчмарки) каждый запрос получает своё,
+и поток на запрос не плодит новых подключений.
+
+Чтения могут идти в реплику: если задан DATABASE_READ_URL, get_read_connection() подключается к ней,
+а когда реплика недоступна — к основной базе. Запрос с readYourWrites=1 читает из основной базы,
+например get-plan сразу после save-plan, пока реплика не догнала запись.
+
+get_read_connection() уходит в основную базу, только если реплика не отвечает при подключении.
+Если реплика обрывает соединение посреди чтения (рестарт, переключение), чтение нужно повторить:
+read_with_fallback() выполняет функцию чтения и при OperationalError один раз повторяет её на
+основной базе. Хендлер, который берёт соединение через get_read_connection() сам, на обрыв
+реплики отвечает ошибкой.
+
+Каждая функция деплоится своей папкой, поэтому файл скопирован во все функции без изменений.
+'''
+
+import os
+import threading
+import time
+import weakref
+from typing import Any, Callable, Dict, List, Tuple, TypeVar
+
+import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
+
+import tracing
+
+# Соединение, которое простаивало дольше, перед выдачей проверяется SELECT 1:
+# прокси или сервер могли закрыть его, пока контейнер спал
+PING_AFTER_SECONDS = 30
+# Свободных соединений на адрес базы; лишние при возврате закрываются
+MAX_IDLE_CONNECTIONS = 8
+# Сколько ждать подключения к реплике, прежде чем читать из основной базы
+REPLICA_CONNECT_TIMEOUT_SECONDS = 2
+# После неудачного подключения реплика не пробуется столько секунд: запросы сразу идут в основную базу
+REPLICA_RETRY_SECONDS = 30
+
+_lock = threading.Lock()
+# Свободные соединения по адресу базы: (соединение, когда возвращено)
+_idle: Dict[str, List[Tuple[Any, float]]] = {}
+# Адрес базы каждого открытого соединения
+_urls: 'weakref.WeakKeyDictionary[Any, str]' = weakref.WeakKeyDictionary()
+_replica_down_until = 0.0
+
+T = TypeVar('T')
+
+def _open(database_url: str, **connect_kwargs):
+    with tracing.span('db-connect'):
+        conn = psycopg2.connect(database_url, **connect_kwargs)
+    with _lock:
+        _urls[conn] = database_url
+    return conn
+
+def _discard(conn) -> None:
+    with _lock:
+        _urls.pop(conn, None)
+    try:
+        conn.close()
+    except psycopg2.Error:
+        pass
+
+def get_connection(database_url: str, **connect_kwargs):
+    '''
+    Свободное соединение с этой базой из пула или новое. Простоявшее дольше
+    PING_AFTER_SECONDS проверяется запросом; мёртвое закрывается и берётся следующее.
+    '''
+    while True:
+        with _lock:
+            idle = _idle.get(database_url)
+            if not idle:
+                break
+            conn, released_at = idle.pop()
+        
+        if conn.closed:
+            _discard(conn)
+            continue
+        if time.monotonic() - released_at > PING_AFTER_SECONDS:
+            try:
+                with tracing.span('db-ping'):
+                    cur = conn.cursor()
+                    cur.execute('SELECT 1')
+                    cur.close()
+                    conn.rollback()
+            except psycopg2.Error:
+                _discard(conn)
+                continue
+        return conn
+    
+    return _open(database_url, **connect_kwargs)
+
+def get_read_connection(database_url: str, read_your_writes: bool = False):
+    '''
+    Соединение для чтения: реплика из DATABASE_READ_URL, если она задана и отвечает,
+    иначе основная база database_url. read_your_writes=True всегда ведёт в основную базу.
+    '''
+    global _replica_down_until
+    read_url = os.environ.get('DATABASE_READ_URL')
+    if not read_url or read_your_writes or time.monotonic() < _replica_down_until:
+        return get_connection(database_url)
+    
+    try:
+        return get_connection(read_url, connect_timeout=REPLICA_CONNECT_TIMEOUT_SECONDS)
+    except psycopg2.OperationalError:
+        _replica_down_until = time.monotonic() + REPLICA_RETRY_SECONDS
+        return get_connection(database_url)
+
+def read_with_fallback(database_url: str, read_your_writes: bool, read: Callable[[Any], T]) -> T:
+    '''
+    Выполняет read(conn) на соединении для чтения и возвращает результат. Реплика оборвала
+    соединение посреди чтения (OperationalError) — она пропускается REPLICA_RETRY_SECONDS,
+    а read один раз повторяется на основной базе. read должен только читать: при повторе
+    он выполняется с начала. Соединения возвращаются в пул.
+    '''
+    global _replica_down_until
+    conn = get_read_connection(database_url, read_your_writes)
+    try:
+        return read(conn)
+    except psycopg2.errors.QueryCanceled:
+        # statement_timeout — медленный запрос, а не упавшая реплика: в основной базе было бы так же
+        raise
+    except psycopg2.OperationalError:
+        if connected_to(conn, database_url):
+            raise
+        _replica_down_until = time.monotonic() + REPLICA_RETRY_SECONDS
+    finally:
+        release(conn)
+    
+    conn = get_connection(database_url)
+    try:
+        return read(conn)
+    finally:
+        release(conn)
+
+def connected_to(conn, database_url: str) -> bool:
+    '''Соединение открыто к этой базе (например, чтение не ушло в реплику)'''
+    with _lock:
+        return _urls.get(conn) == database_url
+
+def read_your_writes(event: Dict[str, Any]) -> bool:
+    '''Запрос просит читать из основной базы: ?readYourWrites=1'''
+    params = event.get('queryStringParameters') or {}
+    return str(params.get('readYourWrites', '')).lower() in ('1', 'true')
+
+def release(conn) -> None:
+    '''
+    Вместо conn.close() в конце запроса: откатывает незавершённую транзакцию, возвращает
+    настройки сессии по умолчанию и кладёт соединение в пул для следующего вызова — без
+    запросов к серверу, если транзакция уже завершена. Сломанное соединение закрывается —
+    следующий вызов подключится заново. Сессионные advisory-блокировки хендлер снимает сам
+    (или закрывает соединение, если снять не удалось).
+    '''
+    if conn.closed:
+        _discard(conn)
+        return
+    
+    try:
+        status = conn.info.transaction_status
+        if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+            _discard(conn)
+            return
+        if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            conn.rollback()
+        conn.autocommit = False
+        conn.isolation_level = None
+        conn.notifies.clear()
+    except psycopg2.Error:
+        _discard(conn)
+        return
+    
+    with _lock:
+        database_url = _urls.get(conn)
+        idle = _idle.setdefault(database_url, []) if database_url else None
+        if idle is not None and len(idle) < MAX_IDLE_CONNECTIONS:
+            idle.append((conn, time.monotonic()))
+            return
+    _discard(conn)
+
+def close_all() -> None:
+    '''Закрывает все открытые соединения (бенчмарки перед пересозданием схемы)'''
+    global _replica_down_until
+    with _lock:
+        connections = list(_urls.keys())
+        _urls.clear()
+        _idle.clear()
+    for conn in connections:
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+    _replica_down_until = 0.0
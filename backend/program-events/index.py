@@ -1,7 +1,39 @@
 import json
 import os
-import psycopg2
+import db
+import queries
+import tracing
 
+def valid_cache_seconds(value) -> bool:
+    '''TTL и max-stale кеша программы: целое число секунд не меньше 0 или null — значение по умолчанию'''
+    return value is None or (isinstance(value, int) and not isinstance(value, bool) and value >= 0)
+
+def read_events(conn, event_id):
+    '''Строки мероприятий: одно по event_id (пустой список, если его нет) или все'''
+    conn.autocommit = True
+    cur = conn.cursor()
+    if event_id:
+        queries.execute(cur, 'event_get', (event_id,))
+    else:
+        queries.execute(cur, 'event_list')
+    rows = cur.fetchall()
+    cur.close()
+    return rows
+
+def event_json(row) -> dict:
+    return {
+        'id': row[0],
+        'name': row[1],
+        'sheetUrl': row[2],
+        'logoUrl': row[3],
+        'coverUrl': row[4],
+        'daySheets': row[5],
+        'createdAt': row[6].isoformat() if row[6] else None,
+        'cacheTtlSeconds': row[7],
+        'cacheMaxStaleSeconds': row[8]
+    }
+
+@tracing.traced
 def handler(event, context):
     '''
     Business: Управление программами событий (CRUD)
@@ -31,64 +63,35 @@ def handler(event, context):
             'body': json.dumps({'error': 'DATABASE_URL not configured'})
         }
     
-    conn = psycopg2.connect(dsn)
-    conn.autocommit = True
-    
-    try:
-        if method == 'GET':
-            event_id = event.get('queryStringParameters', {}).get('id')
-            
-            if event_id:
-                cur = conn.cursor()
-                safe_id = event_id.replace("'", "''")
-                cur.execute(f"SELECT id, name, sheet_url, logo_url, cover_url, day_sheets, created_at FROM program_events WHERE id = '{safe_id}'")
-                row = cur.fetchone()
-                cur.close()
-                
-                if not row:
-                    return {
-                        'statusCode': 404,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Event not found'})
-                    }
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({
-                        'id': row[0],
-                        'name': row[1],
-                        'sheetUrl': row[2],
-                        'logoUrl': row[3],
-                        'coverUrl': row[4],
-                        'daySheets': row[5],
-                        'createdAt': row[6].isoformat() if row[6] else None
-                    })
-                }
-            else:
-                cur = conn.cursor()
-                cur.execute("SELECT id, name, sheet_url, logo_url, cover_url, day_sheets, created_at FROM program_events ORDER BY created_at DESC")
-                rows = cur.fetchall()
-                cur.close()
-                
-                events = [
-                    {
-                        'id': row[0],
-                        'name': row[1],
-                        'sheetUrl': row[2],
-                        'logoUrl': row[3],
-                        'coverUrl': row[4],
-                        'daySheets': row[5],
-                        'createdAt': row[6].isoformat() if row[6] else None
-                    }
-                    for row in rows
-                ]
+    if method == 'GET':
+        event_id = event.get('queryStringParameters', {}).get('id')
+        # GET только читает и может идти в реплику (DATABASE_READ_URL)
+        rows = db.read_with_fallback(dsn, db.read_your_writes(event), lambda conn: read_events(conn, event_id))
+        events = [event_json(row) for row in rows]
+        
+        if event_id:
+            if not events:
                 return {
-                    'statusCode': 200,
+                    'statusCode': 404,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'events': events})
+                    'body': json.dumps({'error': 'Event not found'})
                 }
-        
-        elif method == 'POST':
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps(events[0])
+            }
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'events': events})
+        }
+    
+    conn = db.get_connection(dsn)
+    conn.autocommit = True
+    
+    try:
+        if method == 'POST':
             body = json.loads(event.get('body', '{}'))
             event_id = body.get('id')
             name = body.get('name')
@@ -96,6 +99,8 @@ def handler(event, context):
             logo_url = body.get('logoUrl', '')
             cover_url = body.get('coverUrl', '')
             day_sheets = body.get('daySheets', '')
+            cache_ttl = body.get('cacheTtlSeconds')
+            cache_max_stale = body.get('cacheMaxStaleSeconds')
             
             if not event_id or not name or not sheet_url:
                 return {
@@ -104,14 +109,18 @@ def handler(event, context):
                     'body': json.dumps({'error': 'Missing required fields: id, name, sheetUrl'})
                 }
             
+            if not valid_cache_seconds(cache_ttl) or not valid_cache_seconds(cache_max_stale):
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'cacheTtlSeconds and cacheMaxStaleSeconds must be non-negative integers'})
+                }
+            
             cur = conn.cursor()
-            safe_id = event_id.replace("'", "''")
-            safe_name = name.replace("'", "''")
-            safe_url = sheet_url.replace("'", "''")
-            safe_logo = logo_url.replace("'", "''") if logo_url else ''
-            safe_cover = cover_url.replace("'", "''") if cover_url else ''
-            safe_days = day_sheets.replace("'", "''") if day_sheets else ''
-            cur.execute(f"INSERT INTO program_events (id, name, sheet_url, logo_url, cover_url, day_sheets) VALUES ('{safe_id}', '{safe_name}', '{safe_url}', '{safe_logo}', '{safe_cover}', '{safe_days}')")
+            queries.execute(cur, 'event_insert', (
+                event_id, name, sheet_url, logo_url or '', cover_url or '', day_sheets or '',
+                cache_ttl, cache_max_stale
+            ))
             cur.close()
             
             return {
@@ -128,6 +137,8 @@ def handler(event, context):
             logo_url = body.get('logoUrl', '')
             cover_url = body.get('coverUrl', '')
             day_sheets = body.get('daySheets', '')
+            cache_ttl = body.get('cacheTtlSeconds')
+            cache_max_stale = body.get('cacheMaxStaleSeconds')
             
             if not event_id or not name or not sheet_url:
                 return {
@@ -136,14 +147,18 @@ def handler(event, context):
                     'body': json.dumps({'error': 'Missing required fields: id, name, sheetUrl'})
                 }
             
+            if not valid_cache_seconds(cache_ttl) or not valid_cache_seconds(cache_max_stale):
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'cacheTtlSeconds and cacheMaxStaleSeconds must be non-negative integers'})
+                }
+            
             cur = conn.cursor()
-            safe_id = event_id.replace("'", "''")
-            safe_name = name.replace("'", "''")
-            safe_url = sheet_url.replace("'", "''")
-            safe_logo = logo_url.replace("'", "''") if logo_url else ''
-            safe_cover = cover_url.replace("'", "''") if cover_url else ''
-            safe_days = day_sheets.replace("'", "''") if day_sheets else ''
-            cur.execute(f"UPDATE program_events SET name = '{safe_name}', sheet_url = '{safe_url}', logo_url = '{safe_logo}', cover_url = '{safe_cover}', day_sheets = '{safe_days}' WHERE id = '{safe_id}'")
+            queries.execute(cur, 'event_update', (
+                event_id, name, sheet_url, logo_url or '', cover_url or '', day_sheets or '',
+                cache_ttl, cache_max_stale
+            ))
             cur.close()
             
             return {
@@ -163,8 +178,7 @@ def handler(event, context):
                 }
             
             cur = conn.cursor()
-            safe_id = event_id.replace("'", "''")
-            cur.execute(f"DELETE FROM program_events WHERE id = '{safe_id}'")
+            queries.execute(cur, 'event_delete', (event_id,))
             cur.close()
             
             return {
@@ -181,4 +195,4 @@ def handler(event, context):
             }
     
     finally:
-        conn.close()
\ No newline at end of file
+        db.release(conn)
\ No newline at end of file
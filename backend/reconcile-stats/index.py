@@ -0,0 +1,255 @@
+'''
+Business: Сверка счётчиков session_stats с планами пользователей и исправление расхождений
+Args: event с httpMethod, body (eventId — необязательно, без него сверяются все мероприятия;
+      full — пересчитать все сессии, а не только изменённые после водяного знака)
+Returns: HTTP response с числом проверенных и исправленных счётчиков (включая event_totals)
+'''
+
+import json
+import os
+from typing import Dict, Any, List, Optional
+import psycopg2
+import psycopg2.extensions
+import db
+import tracing
+
+# Сохранение, начатое до сверки, но закоммиченное после, имеет updated_at раньше водяного знака.
+# Перекрытие окна гарантирует, что такие планы попадут в следующий прогон.
+WATERMARK_OVERLAP = '5 minutes'
+
+def reconcile_event(cur, event_id: str, full: bool) -> Dict[str, Any]:
+    '''
+    Пересчитывает ожидаемые счётчики одним unnest(session_keys) ... GROUP BY по планам мероприятия
+    и одним upsert переписывает разошедшиеся строки session_stats.
+    Ожидаемое значение раскладывается по шардам так же, как пишет save-plan (hash(user_id) % stats_shards);
+    несвёрнутые изменения журнала вычитаются из шарда 0, куда их потом добавит compact-stats.
+    Проверяются только сессии из планов, счётчиков и журнала, изменённых после водяного знака.
+    '''
+    cur.execute('''
+        SELECT watermark - INTERVAL %s
+        FROM t_p73504605_landing_exhibition_m.stats_reconcile_state
+        WHERE event_id = %s
+    ''', (WATERMARK_OVERLAP, event_id))
+    row = cur.fetchone()
+    since = None if full or not row else row[0]
+    
+    cur.execute('''
+        WITH affected AS (
+            SELECT DISTINCT k.session_key
+            FROM t_p73504605_landing_exhibition_m.user_plans p, unnest(p.session_keys) AS k(session_key)
+            WHERE p.event_id = %(event_id)s
+              AND (%(since)s::timestamp IS NULL OR p.updated_at > %(since)s::timestamp)
+            UNION
+            SELECT session_key
+            FROM t_p73504605_landing_exhibition_m.session_stats
+            WHERE event_id = %(event_id)s
+              AND (%(since)s::timestamp IS NULL OR updated_at > %(since)s::timestamp)
+            UNION
+            SELECT session_key
+            FROM t_p73504605_landing_exhibition_m.session_stats_deltas
+            WHERE event_id = %(event_id)s
+        ), shards AS (
+            SELECT COALESCE((SELECT stats_shards FROM t_p73504605_landing_exhibition_m.program_events WHERE id = %(event_id)s), 1) AS n
+        ), expected AS (
+            SELECT k.session_key, abs(hashtext(p.user_id)::bigint) %% shards.n AS shard, COUNT(DISTINCT p.id) AS cnt
+            FROM t_p73504605_landing_exhibition_m.user_plans p
+            CROSS JOIN shards
+            CROSS JOIN unnest(p.session_keys) AS k(session_key)
+            WHERE p.event_id = %(event_id)s
+              AND k.session_key IN (SELECT session_key FROM affected)
+            GROUP BY k.session_key, abs(hashtext(p.user_id)::bigint) %% shards.n
+        ), target AS (
+            SELECT session_key, shard, SUM(cnt) AS cnt
+            FROM (
+                SELECT session_key, shard, cnt FROM expected
+                UNION ALL
+                SELECT session_key, 0, -SUM(delta)
+                FROM t_p73504605_landing_exhibition_m.session_stats_deltas
+                WHERE event_id = %(event_id)s
+                GROUP BY session_key
+            ) parts
+            GROUP BY session_key, shard
+        ), current AS (
+            SELECT session_key, shard, interest_count
+            FROM t_p73504605_landing_exhibition_m.session_stats
+            WHERE event_id = %(event_id)s
+              AND session_key IN (SELECT session_key FROM affected)
+        ), diff AS (
+            SELECT
+                COALESCE(t.session_key, c.session_key) AS session_key,
+                COALESCE(t.shard, c.shard) AS shard,
+                COALESCE(t.cnt, 0) AS target
+            FROM target t
+            FULL JOIN current c ON c.session_key = t.session_key AND c.shard = t.shard
+            WHERE COALESCE(t.cnt, 0) <> COALESCE(c.interest_count, 0)
+        ), applied AS (
+            INSERT INTO t_p73504605_landing_exhibition_m.session_stats
+            (event_id, session_key, shard, interest_count)
+            SELECT %(event_id)s, session_key, shard, target FROM diff
+            ORDER BY session_key, shard
+            ON CONFLICT (event_id, session_key, shard)
+            DO UPDATE SET interest_count = EXCLUDED.interest_count, updated_at = CURRENT_TIMESTAMP
+            RETURNING session_key
+        )
+        SELECT
+            (SELECT COUNT(*) FROM affected),
+            (SELECT COUNT(*) FROM applied),
+            (SELECT COUNT(DISTINCT session_key) FROM applied)
+    ''', {'event_id': event_id, 'since': since})
+    checked, fixed_counters, fixed_sessions = cur.fetchone()
+    
+    # Итог участников сверяется полным подсчётом: фоновой задаче он по карману, в отличие от get-stats
+    cur.execute('''
+        WITH actual AS (
+            SELECT COUNT(*) AS total_users
+            FROM t_p73504605_landing_exhibition_m.user_plans
+            WHERE event_id = %(event_id)s AND cardinality(session_keys) > 0
+        )
+        INSERT INTO t_p73504605_landing_exhibition_m.event_totals (event_id, total_users)
+        SELECT %(event_id)s, total_users FROM actual
+        ON CONFLICT (event_id)
+        DO UPDATE SET total_users = EXCLUDED.total_users, updated_at = CURRENT_TIMESTAMP
+        WHERE t_p73504605_landing_exhibition_m.event_totals.total_users <> EXCLUDED.total_users
+    ''', {'event_id': event_id})
+    fixed_totals = cur.rowcount
+    
+    # Исправленные счётчики меняют ответ get-stats: новая версия статистики для ETag
+    if fixed_counters or fixed_totals:
+        cur.execute('''
+            INSERT INTO t_p73504605_landing_exhibition_m.stats_versions (event_id, shard, version)
+            VALUES (%s, 0, 1)
+            ON CONFLICT (event_id, shard)
+            DO UPDATE SET version = t_p73504605_landing_exhibition_m.stats_versions.version + 1
+        ''', (event_id,))
+    
+    cur.execute('''
+        INSERT INTO t_p73504605_landing_exhibition_m.stats_reconcile_state
+        (event_id, watermark, last_fixed)
+        VALUES (%s, CURRENT_TIMESTAMP, %s)
+        ON CONFLICT (event_id)
+        DO UPDATE SET watermark = EXCLUDED.watermark, last_fixed = EXCLUDED.last_fixed, updated_at = CURRENT_TIMESTAMP
+    ''', (event_id, fixed_counters))
+    
+    return {
+        'eventId': event_id,
+        'checked': checked,
+        'fixedCounters': fixed_counters,
+        'fixedSessions': fixed_sessions,
+        'fixedTotals': fixed_totals
+    }
+
+@tracing.traced
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    method: str = event.get('httpMethod', 'POST')
+    
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+    
+    if method != 'POST':
+        return {
+            'statusCode': 405,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': 'Method not allowed'}),
+            'isBase64Encoded': False
+        }
+    
+    body_data = json.loads(event.get('body') or '{}')
+    event_id: Optional[str] = body_data.get('eventId')
+    full: bool = bool(body_data.get('full', False))
+    
+    if event_id is not None and (not isinstance(event_id, str) or not event_id):
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': 'eventId must be a non-empty string'}),
+            'isBase64Encoded': False
+        }
+    
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        return {
+            'statusCode': 500,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': 'Database configuration missing'}),
+            'isBase64Encoded': False
+        }
+    
+    conn = db.get_connection(database_url)
+    # Планы, журнал и счётчики читаются из одного снимка; если параллельное сохранение
+    # или compact-stats успели изменить ту же строку, сверка мероприятия повторяется
+    conn.set_session(isolation_level=psycopg2.extensions.ISOLATION_LEVEL_REPEATABLE_READ)
+    
+    try:
+        cur = conn.cursor()
+        
+        if event_id:
+            event_ids: List[str] = [event_id]
+        else:
+            cur.execute('''
+                SELECT event_id FROM t_p73504605_landing_exhibition_m.user_plans
+                UNION
+                SELECT event_id FROM t_p73504605_landing_exhibition_m.session_stats
+            ''')
+            event_ids = [row[0] for row in cur.fetchall()]
+            conn.commit()
+        
+        results = []
+        for current_event_id in event_ids:
+            for attempt in range(5):
+                try:
+                    results.append(reconcile_event(cur, current_event_id, full))
+                    conn.commit()
+                    break
+                except psycopg2.extensions.TransactionRollbackError:
+                    conn.rollback()
+                    if attempt == 4:
+                        raise
+        
+        cur.close()
+        
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({
+                'success': True,
+                'fixedCounters': sum(result['fixedCounters'] for result in results),
+                'events': results
+            }),
+            'isBase64Encoded': False
+        }
+    
+    except Exception as e:
+        conn.rollback()
+        return {
+            'statusCode': 500,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
+    finally:
+        db.release(conn)
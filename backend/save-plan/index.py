@@ -1,15 +1,392 @@
 '''
 Business: Сохранение плана докладов пользователя и обновление статистики
-Args: event с httpMethod, body (eventId, userId, sessionIds)
+Args: event с httpMethod, body (eventId, userId и sessionIds — весь план целиком,
+      либо ops — батч операций {opId, op: add|remove, sessionId, clientTs} из офлайн-очереди)
+      env STATS_WRITE_MODE: direct (по умолчанию) обновляет session_stats сразу,
+      deferred только пишет +1/-1 в session_stats_deltas для compact-stats (и так же для пар
+      сессий session_pairs / session_pair_deltas)
+      env STATS_NOTIFY: on — после коммита сообщать watch-stats (pg_notify) номера изменившихся
+      сессий; off (по умолчанию) — только версия для ETag get-stats: коммиты с NOTIFY Postgres
+      выполняет по одному под общей блокировкой очереди уведомлений
 Returns: HTTP response со статусом операции
 '''
 
+import hashlib
 import json
 import os
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterable, List, Optional, Set, Tuple
 import psycopg2
 from psycopg2.extras import execute_values
+import db
+import tracing
 
+MAX_OPS_PER_REQUEST = 500
+# Предел payload у NOTIFY — 8000 байт; длинный список заменяется пустым («изменилось всё»)
+NOTIFY_PAYLOAD_LIMIT = 7900
+# Строк stats_versions на мероприятие: участник увеличивает строку hash(user_id) % STATS_VERSION_SHARDS,
+# так что сохранения разных участников не ждут друг друга даже в режиме deferred
+STATS_VERSION_SHARDS = 16
+
+# Номер сессии в event_sessions не меняется после выдачи, поэтому тёплый контейнер
+# помнит соответствия между вызовами и ходит в словарь только за новыми сессиями.
+# В кеш попадают только закоммиченные номера.
+SESSION_KEY_CACHE_LIMIT = 50000
+session_keys_cache: Dict[Tuple[str, str], int] = {}
+session_ids_cache: Dict[int, str] = {}
+
+def remember_session_keys(event_id: str, keys_by_id: Dict[str, int]) -> None:
+    if len(session_keys_cache) + len(keys_by_id) > SESSION_KEY_CACHE_LIMIT:
+        session_keys_cache.clear()
+        session_ids_cache.clear()
+    for session_id, key in keys_by_id.items():
+        session_keys_cache[(event_id, session_id)] = key
+        session_ids_cache[key] = session_id
+
+def resolve_session_keys(cur, event_id: str, session_ids: Iterable[str]) -> Dict[str, int]:
+    '''
+    Переводит строковые ID сессий в номера из event_sessions, добавляя в словарь новые.
+    Если ту же новую сессию параллельно добавил другой запрос, ON CONFLICT DO NOTHING
+    пропустит её, а снимок запроса ещё не увидит чужую строку — тогда запрос повторяется.
+    '''
+    keys_by_id: Dict[str, int] = {}
+    missing: Set[str] = set()
+    for session_id in session_ids:
+        key = session_keys_cache.get((event_id, session_id))
+        if key is None:
+            missing.add(session_id)
+        else:
+            keys_by_id[session_id] = key
+    
+    for _ in range(3):
+        if not missing:
+            return keys_by_id
+        cur.execute('''
+            WITH input AS (
+                SELECT unnest(%(session_ids)s::text[]) AS session_id
+            ), inserted AS (
+                INSERT INTO t_p73504605_landing_exhibition_m.event_sessions 
+                (event_id, session_id) 
+                SELECT %(event_id)s, session_id FROM input ORDER BY session_id 
+                ON CONFLICT (event_id, session_id) DO NOTHING 
+                RETURNING id, session_id
+            )
+            SELECT id, session_id FROM inserted 
+            UNION ALL 
+            SELECT s.id, s.session_id 
+            FROM t_p73504605_landing_exhibition_m.event_sessions s 
+            JOIN input ON input.session_id = s.session_id 
+            WHERE s.event_id = %(event_id)s
+        ''', {'event_id': event_id, 'session_ids': sorted(missing)})
+        for key, session_id in cur.fetchall():
+            keys_by_id[session_id] = key
+            missing.discard(session_id)
+    
+    if missing:
+        raise RuntimeError('Could not resolve session keys: concurrent updates')
+    return keys_by_id
+
+def session_ids_for_keys(cur, session_keys: List[int]) -> List[str]:
+    '''Обратный перевод номеров сессий в строковые ID для ответа клиенту'''
+    missing = [key for key in session_keys if key not in session_ids_cache]
+    found: Dict[int, str] = {}
+    if missing:
+        cur.execute('''
+            SELECT id, session_id FROM t_p73504605_landing_exhibition_m.event_sessions 
+            WHERE id = ANY(%s)
+        ''', (missing,))
+        found = dict(cur.fetchall())
+    return [session_ids_cache.get(key) or found[key] for key in session_keys]
+
+def valid_ops(ops: Any) -> bool:
+    if not isinstance(ops, list) or len(ops) > MAX_OPS_PER_REQUEST:
+        return False
+    for op in ops:
+        if not isinstance(op, dict) or op.get('op') not in ('add', 'remove'):
+            return False
+        if not isinstance(op.get('opId'), str) or not op['opId']:
+            return False
+        if not isinstance(op.get('sessionId'), str) or not op['sessionId']:
+            return False
+        if op.get('clientTs') is not None and not isinstance(op['clientTs'], (int, float)):
+            return False
+    return True
+
+def record_ops(cur, event_id: str, user_id: str, ops: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    '''
+    Записывает op_id в plan_ops и возвращает только операции, которые ещё не применялись,
+    в порядке clientTs. Ретрай того же батча получит пустой список и ничего не изменит.
+    '''
+    unique_ops: List[Dict[str, Any]] = []
+    seen: Set[str] = set()
+    for op in ops:
+        if op['opId'] not in seen:
+            seen.add(op['opId'])
+            unique_ops.append(op)
+    if not unique_ops:
+        return []
+    rows = [
+        (event_id, user_id, op['opId'], op['op'], op['sessionId'],
+         int(op['clientTs']) if op.get('clientTs') is not None else None)
+        for op in unique_ops
+    ]
+    
+    fresh = execute_values(cur, '''
+        INSERT INTO t_p73504605_landing_exhibition_m.plan_ops 
+        (event_id, user_id, op_id, op, session_id, client_ts) 
+        VALUES %s 
+        ON CONFLICT (event_id, user_id, op_id) DO NOTHING 
+        RETURNING op_id
+    ''', rows, page_size=len(rows), fetch=True)
+    fresh_ids = {row[0] for row in fresh}
+    
+    fresh_ops = [op for op in unique_ops if op['opId'] in fresh_ids]
+    fresh_ops.sort(key=lambda op: op.get('clientTs') or 0)
+    return fresh_ops
+
+def apply_ops(session_keys: List[int], ops: List[Dict[str, Any]], keys_by_id: Dict[str, int]) -> List[int]:
+    result = list(session_keys)
+    for op in ops:
+        key = keys_by_id[op['sessionId']]
+        if op['op'] == 'add' and key not in result:
+            result.append(key)
+        elif op['op'] == 'remove':
+            result = [session_key for session_key in result if session_key != key]
+    return result
+
+def lock_plan(cur, event_id: str, user_id: str) -> List[int]:
+    '''
+    Блокирует план пользователя до конца транзакции и возвращает его текущие сессии.
+    Если плана ещё нет, создаёт пустой: так параллельные батчи с двух устройств
+    применяются строго по очереди.
+    '''
+    cur.execute('''
+        INSERT INTO t_p73504605_landing_exhibition_m.user_plans 
+        (event_id, user_id, session_keys) 
+        VALUES (%s, %s, '{}') 
+        ON CONFLICT (user_id, event_id) 
+        DO UPDATE SET session_keys = t_p73504605_landing_exhibition_m.user_plans.session_keys 
+        RETURNING session_keys
+    ''', (event_id, user_id))
+    return cur.fetchone()[0] or []
+
+def upsert_plan(cur, event_id: str, user_id: str, session_keys: List[int]) -> List[int]:
+    '''
+    Сохраняет план одним запросом и возвращает предыдущий список сессий.
+    UPDATE берёт строку плана под FOR UPDATE и возвращает старое значение,
+    INSERT ... ON CONFLICT создаёт план, если его ещё не было.
+    Если план одновременно создали с другого устройства, ни одна ветка не сработает:
+    тогда запрос повторяется и попадает в UPDATE с уже заблокированной строкой.
+    '''
+    params = {'event_id': event_id, 'user_id': user_id, 'session_keys': session_keys}
+    for _ in range(3):
+        cur.execute('''
+            WITH updated AS (
+                UPDATE t_p73504605_landing_exhibition_m.user_plans p 
+                SET session_keys = %(session_keys)s::int[], updated_at = CURRENT_TIMESTAMP 
+                FROM (
+                    SELECT id, session_keys FROM t_p73504605_landing_exhibition_m.user_plans 
+                    WHERE user_id = %(user_id)s AND event_id = %(event_id)s 
+                    FOR UPDATE
+                ) old 
+                WHERE p.id = old.id 
+                RETURNING old.session_keys
+            ), inserted AS (
+                INSERT INTO t_p73504605_landing_exhibition_m.user_plans 
+                (event_id, user_id, session_keys) 
+                SELECT %(event_id)s, %(user_id)s, %(session_keys)s::int[] 
+                WHERE NOT EXISTS (SELECT 1 FROM updated) 
+                ON CONFLICT (user_id, event_id) DO NOTHING 
+                RETURNING id
+            )
+            SELECT 
+                EXISTS (SELECT 1 FROM updated), 
+                (SELECT session_keys FROM updated), 
+                EXISTS (SELECT 1 FROM inserted)
+        ''', params)
+        was_updated, old_session_keys, was_inserted = cur.fetchone()
+        if was_updated:
+            return old_session_keys or []
+        if was_inserted:
+            return []
+    raise RuntimeError('Could not save plan: concurrent updates')
+
+def apply_stats_delta(cur, event_id: str, user_id: str, added: Set[int], removed: Set[int]) -> None:
+    '''
+    Применяет весь дифф плана к session_stats одним upsert-запросом.
+    Новые строки вставляются с 1 для добавленных сессий и с 0 для убранных,
+    поэтому при конфликте EXCLUDED.interest_count однозначно задаёт +1 или -1.
+    Счётчик пишется в шард hash(user_id) % program_events.stats_shards, разные пользователи не ждут
+    друг друга. Отдельный шард может уйти ниже нуля (после смены stats_shards -1 попадает не в тот шард,
+    что +1), поэтому шард не ограничивается нулём: к нулю приводится сумма шардов при чтении.
+    Строки отсортированы, чтобы параллельные сохранения брали блокировки в одном порядке.
+    Тем же запросом изменение попадает в минутную корзину session_interest_minutes того же шарда;
+    корзина пишется после счётчиков, так что порядок блокировок не меняется.
+    '''
+    session_keys = sorted(added | removed)
+    if not session_keys:
+        return
+    initial = [1 if session_key in added else 0 for session_key in session_keys]
+    
+    cur.execute('''
+        WITH input AS (
+            SELECT d.session_key, d.initial, d.pos, abs(hashtext(%(user_id)s)::bigint) %% shards.n AS shard 
+            FROM unnest(%(session_keys)s::int[], %(initial)s::int[]) WITH ORDINALITY AS d(session_key, initial, pos), 
+                (SELECT COALESCE((SELECT stats_shards FROM t_p73504605_landing_exhibition_m.program_events WHERE id = %(event_id)s), 1) AS n) shards 
+        ), counted AS (
+            INSERT INTO t_p73504605_landing_exhibition_m.session_stats 
+            (event_id, session_key, shard, interest_count) 
+            SELECT %(event_id)s, session_key, shard, initial 
+            FROM input 
+            ORDER BY pos 
+            ON CONFLICT (event_id, session_key, shard) 
+            DO UPDATE SET 
+                interest_count = t_p73504605_landing_exhibition_m.session_stats.interest_count
+                    + CASE WHEN EXCLUDED.interest_count > 0 THEN 1 ELSE -1 END,
+                updated_at = CURRENT_TIMESTAMP 
+            RETURNING 1
+        )
+        INSERT INTO t_p73504605_landing_exhibition_m.session_interest_minutes 
+        (event_id, session_key, bucket, shard, added, removed) 
+        SELECT %(event_id)s, session_key, date_trunc('minute', timezone('UTC', now())), shard, initial, 1 - initial 
+        FROM input 
+        WHERE (SELECT COUNT(*) FROM counted) > 0 
+        ORDER BY pos 
+        ON CONFLICT (event_id, session_key, bucket, shard) 
+        DO UPDATE SET 
+            added = t_p73504605_landing_exhibition_m.session_interest_minutes.added + EXCLUDED.added,
+            removed = t_p73504605_landing_exhibition_m.session_interest_minutes.removed + EXCLUDED.removed
+    ''', {'event_id': event_id, 'user_id': user_id, 'session_keys': session_keys, 'initial': initial})
+
+def append_stats_delta(cur, event_id: str, added: Set[int], removed: Set[int]) -> None:
+    '''
+    Отложенная запись: дописывает +1/-1 в журнал session_stats_deltas без блокировок
+    строк session_stats. Счётчики и минутные корзины истории сворачивает compact-stats,
+    get-stats учитывает журнал.
+    '''
+    rows = [(event_id, session_key, 1) for session_key in added]
+    rows += [(event_id, session_key, -1) for session_key in removed]
+    if not rows:
+        return
+    
+    execute_values(cur, '''
+        INSERT INTO t_p73504605_landing_exhibition_m.session_stats_deltas 
+        (event_id, session_key, delta) 
+        VALUES %s
+    ''', rows, page_size=len(rows))
+
+def plan_pair_changes(old_session_keys: List[int], session_keys: List[int]) -> Tuple[List[Tuple[int, int]], List[Tuple[int, int]]]:
+    '''
+    Пары сессий, которые план приобрёл и потерял. Считаются только от дельты:
+    каждая добавленная сессия образует пары с новым планом, каждая убранная — со старым,
+    так что добавление одной сессии стоит O(размер плана), а не O(размер плана²).
+    '''
+    old_set = set(old_session_keys)
+    new_set = set(session_keys)
+    gained = {
+        (min(added, other), max(added, other))
+        for added in new_set - old_set for other in new_set if other != added
+    }
+    lost = {
+        (min(removed, other), max(removed, other))
+        for removed in old_set - new_set for other in old_set if other != removed
+    }
+    return sorted(gained), sorted(lost)
+
+def apply_pair_delta(cur, event_id: str, user_id: str, gained: List[Tuple[int, int]], lost: List[Tuple[int, int]]) -> None:
+    '''
+    Обновляет session_pairs одним upsert с тем же приёмом знака, что и apply_stats_delta,
+    в шард пользователя, без ограничения шарда нулём; пары отсортированы для одинакового порядка блокировок.
+    '''
+    changes = sorted([(pair, 1) for pair in gained] + [(pair, 0) for pair in lost])
+    if not changes:
+        return
+    
+    cur.execute('''
+        INSERT INTO t_p73504605_landing_exhibition_m.session_pairs 
+        (event_id, session_a, session_b, shard, pair_count) 
+        SELECT %(event_id)s, d.session_a, d.session_b, abs(hashtext(%(user_id)s)::bigint) %% shards.n, d.initial 
+        FROM unnest(%(session_a)s::int[], %(session_b)s::int[], %(initial)s::int[]) WITH ORDINALITY AS d(session_a, session_b, initial, pos), 
+            (SELECT COALESCE((SELECT stats_shards FROM t_p73504605_landing_exhibition_m.program_events WHERE id = %(event_id)s), 1) AS n) shards 
+        ORDER BY d.pos 
+        ON CONFLICT (event_id, session_a, session_b, shard) 
+        DO UPDATE SET 
+            pair_count = t_p73504605_landing_exhibition_m.session_pairs.pair_count
+                + CASE WHEN EXCLUDED.pair_count > 0 THEN 1 ELSE -1 END,
+            updated_at = CURRENT_TIMESTAMP
+    ''', {
+        'event_id': event_id,
+        'user_id': user_id,
+        'session_a': [pair[0] for pair, _ in changes],
+        'session_b': [pair[1] for pair, _ in changes],
+        'initial': [initial for _, initial in changes]
+    })
+
+def append_pair_delta(cur, event_id: str, gained: List[Tuple[int, int]], lost: List[Tuple[int, int]]) -> None:
+    '''Отложенная запись пар: +1/-1 в журнал session_pair_deltas для compact-stats'''
+    rows = [(event_id, session_a, session_b, 1) for session_a, session_b in gained]
+    rows += [(event_id, session_a, session_b, -1) for session_a, session_b in lost]
+    if not rows:
+        return
+    
+    execute_values(cur, '''
+        INSERT INTO t_p73504605_landing_exhibition_m.session_pair_deltas 
+        (event_id, session_a, session_b, delta) 
+        VALUES %s
+    ''', rows, page_size=len(rows))
+
+def stats_channel(event_id: str) -> str:
+    '''Канал LISTEN/NOTIFY мероприятия; eventId хешируется, чтобы уложиться в 63 байта имени'''
+    return 'stats_' + hashlib.md5(event_id.encode('utf-8')).hexdigest()
+
+def publish_stats_change(cur, event_id: str, user_id: str, changed: Set[int]) -> None:
+    '''
+    Увеличивает версию статистики мероприятия (ETag get-stats) и при STATS_NOTIFY=on сообщает
+    watch-stats номера изменившихся сессий — одним запросом. Оба действия транзакционные: версия
+    и NOTIFY видны только после коммита и только если сохранение закоммичено.
+    '''
+    if not changed:
+        return
+    bump = '''
+        INSERT INTO t_p73504605_landing_exhibition_m.stats_versions 
+        (event_id, shard, version) 
+        VALUES (%(event_id)s, abs(hashtext(%(user_id)s)::bigint) %% %(shards)s, 1) 
+        ON CONFLICT (event_id, shard) 
+        DO UPDATE SET version = t_p73504605_landing_exhibition_m.stats_versions.version + 1 
+    '''
+    params = {'event_id': event_id, 'user_id': user_id, 'shards': STATS_VERSION_SHARDS}
+    if os.environ.get('STATS_NOTIFY', 'off') != 'on':
+        cur.execute(bump, params)
+        return
+    
+    payload = ','.join(str(session_key) for session_key in sorted(changed))
+    if len(payload) > NOTIFY_PAYLOAD_LIMIT:
+        payload = ''
+    cur.execute(f'''
+        WITH bumped AS ({bump} RETURNING 1)
+        SELECT pg_notify(%(channel)s, %(payload)s) FROM bumped
+    ''', dict(params, channel=stats_channel(event_id), payload=payload))
+
+def update_event_totals(cur, event_id: str, old_session_keys: List[int], session_keys: List[int]) -> None:
+    '''
+    Поддерживает event_totals.total_users — число участников с непустым планом.
+    Строка мероприятия меняется только когда план становится непустым или опустошается,
+    поэтому обычные сохранения её не блокируют.
+    '''
+    delta = int(bool(session_keys)) - int(bool(old_session_keys))
+    if delta == 0:
+        return
+    
+    cur.execute('''
+        INSERT INTO t_p73504605_landing_exhibition_m.event_totals 
+        (event_id, total_users) 
+        VALUES (%s, GREATEST(0, %s)) 
+        ON CONFLICT (event_id) 
+        DO UPDATE SET 
+            total_users = GREATEST(0, t_p73504605_landing_exhibition_m.event_totals.total_users + %s),
+            updated_at = CURRENT_TIMESTAMP
+    ''', (event_id, delta, delta))
+
+@tracing.traced
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'POST')
     
@@ -41,8 +418,9 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     event_id: str = body_data.get('eventId', '')
     user_id: str = body_data.get('userId', '')
     session_ids: List[str] = body_data.get('sessionIds', [])
+    ops: Optional[List[Dict[str, Any]]] = body_data.get('ops')
     
-    if not event_id or not user_id or not isinstance(session_ids, list):
+    if not event_id or not user_id or not isinstance(session_ids, list) or (ops is not None and not valid_ops(ops)):
         return {
             'statusCode': 400,
             'headers': {
@@ -65,64 +443,51 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     
-    conn = psycopg2.connect(database_url)
+    conn = db.get_connection(database_url)
     
     try:
         cur = conn.cursor()
         
-        cur.execute('''
-            SELECT id FROM t_p73504605_landing_exhibition_m.user_plans 
-            WHERE user_id = %s AND event_id = %s
-        ''', (user_id, event_id))
-        
-        existing = cur.fetchone()
-        
-        if existing:
-            cur.execute('''
-                SELECT session_ids FROM t_p73504605_landing_exhibition_m.user_plans 
-                WHERE user_id = %s AND event_id = %s
-            ''', (user_id, event_id))
-            old_session_ids = cur.fetchone()[0] or []
-            
-            cur.execute('''
-                UPDATE t_p73504605_landing_exhibition_m.user_plans 
-                SET session_ids = %s, updated_at = CURRENT_TIMESTAMP 
-                WHERE user_id = %s AND event_id = %s
-            ''', (session_ids, user_id, event_id))
-        else:
-            old_session_ids = []
-            cur.execute('''
-                INSERT INTO t_p73504605_landing_exhibition_m.user_plans 
-                (event_id, user_id, session_ids) 
-                VALUES (%s, %s, %s)
-            ''', (event_id, user_id, session_ids))
-        
-        removed_sessions = set(old_session_ids) - set(session_ids)
-        for session_id in removed_sessions:
-            cur.execute('''
-                INSERT INTO t_p73504605_landing_exhibition_m.session_stats 
-                (event_id, session_id, interest_count) 
-                VALUES (%s, %s, 0) 
-                ON CONFLICT (event_id, session_id) 
-                DO UPDATE SET 
-                    interest_count = GREATEST(0, t_p73504605_landing_exhibition_m.session_stats.interest_count - 1),
-                    updated_at = CURRENT_TIMESTAMP
-            ''', (event_id, session_id))
+        with tracing.span('plan'):
+            if ops is None:
+                keys_by_id = resolve_session_keys(cur, event_id, session_ids)
+                session_keys = [keys_by_id[session_id] for session_id in session_ids]
+                old_session_keys = upsert_plan(cur, event_id, user_id, session_keys)
+            else:
+                fresh_ops = record_ops(cur, event_id, user_id, ops)
+                keys_by_id = resolve_session_keys(cur, event_id, [op['sessionId'] for op in fresh_ops])
+                old_session_keys = lock_plan(cur, event_id, user_id)
+                session_keys = apply_ops(old_session_keys, fresh_ops, keys_by_id)
+                if session_keys != old_session_keys:
+                    cur.execute('''
+                        UPDATE t_p73504605_landing_exhibition_m.user_plans 
+                        SET session_keys = %s::int[], updated_at = CURRENT_TIMESTAMP 
+                        WHERE user_id = %s AND event_id = %s
+                    ''', (session_keys, user_id, event_id))
+                session_ids = session_ids_for_keys(cur, session_keys)
         
-        added_sessions = set(session_ids) - set(old_session_ids)
-        for session_id in added_sessions:
-            cur.execute('''
-                INSERT INTO t_p73504605_landing_exhibition_m.session_stats 
-                (event_id, session_id, interest_count) 
-                VALUES (%s, %s, 1) 
-                ON CONFLICT (event_id, session_id) 
-                DO UPDATE SET 
-                    interest_count = t_p73504605_landing_exhibition_m.session_stats.interest_count + 1,
-                    updated_at = CURRENT_TIMESTAMP
-            ''', (event_id, session_id))
+        removed_sessions = set(old_session_keys) - set(session_keys)
+        added_sessions = set(session_keys) - set(old_session_keys)
+        gained_pairs, lost_pairs = plan_pair_changes(old_session_keys, session_keys)
+        with tracing.span('stats'):
+            if os.environ.get('STATS_WRITE_MODE', 'direct') == 'deferred':
+                append_stats_delta(cur, event_id, added_sessions, removed_sessions)
+                append_pair_delta(cur, event_id, gained_pairs, lost_pairs)
+            else:
+                apply_stats_delta(cur, event_id, user_id, added_sessions, removed_sessions)
+                apply_pair_delta(cur, event_id, user_id, gained_pairs, lost_pairs)
+            update_event_totals(cur, event_id, old_session_keys, session_keys)
+            publish_stats_change(cur, event_id, user_id, added_sessions | removed_sessions)
         
-        conn.commit()
+        with tracing.span('commit'):
+            conn.commit()
         cur.close()
+        remember_session_keys(event_id, keys_by_id)
+        
+        result: Dict[str, Any] = {'success': True, 'message': 'Plan saved successfully'}
+        if ops is not None:
+            result['sessionIds'] = session_ids
+            result['applied'] = [op['opId'] for op in fresh_ops]
         
         return {
             'statusCode': 200,
@@ -130,10 +495,10 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'Content-Type': 'application/json',
                 'Access-Control-Allow-Origin': '*'
             },
-            'body': json.dumps({'success': True, 'message': 'Plan saved successfully'}),
+            'body': json.dumps(result),
             'isBase64Encoded': False
         }
-        
+    
     except Exception as e:
         conn.rollback()
         return {
@@ -146,4 +511,4 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     finally:
-        conn.close()
+        db.release(conn)
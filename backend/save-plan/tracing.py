@@ -0,0 +1,118 @@
+'''
+Лёгкая трассировка handler: именованные интервалы (span) внутри запроса.
+
+Handler оборачивается декоратором @tracing.traced, участки кода — with tracing.span('имя').
+Для попавших в выборку запросов (доля TRACE_SAMPLE_RATE, по умолчанию 0.1) ответ получает
+заголовок Server-Timing (видно во вкладке Network браузера), а в лог пишется одна JSON-строка
+на запрос со всеми интервалами. Вне выборки span() возвращает пустой объект и почти ничего не стоит.
+
+Каждая функция деплоится своей папкой, поэтому файл скопирован во все функции без изменений.
+'''
+
+import contextvars
+import functools
+import json
+import os
+import random
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+DEFAULT_SAMPLE_RATE = 0.1
+
+_current: 'contextvars.ContextVar[Optional[Trace]]' = contextvars.ContextVar('trace', default=None)
+
+class Trace:
+    '''Интервалы одного запроса: (имя, начало, конец) в секундах perf_counter'''
+
+    __slots__ = ('started', 'spans')
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.spans: List[Tuple[str, float, float]] = []
+
+    def server_timing(self, total_ms: float) -> str:
+        '''Заголовок Server-Timing: повторяющиеся имена суммируются, в конце total'''
+        durations: Dict[str, float] = {}
+        for name, start, end in self.spans:
+            durations[name] = durations.get(name, 0.0) + (end - start) * 1000
+        parts = [f'{name};dur={duration:.2f}' for name, duration in durations.items()]
+        parts.append(f'total;dur={total_ms:.2f}')
+        return ', '.join(parts)
+
+class _Span:
+    __slots__ = ('trace', 'name', 'start')
+
+    def __init__(self, trace: Trace, name: str) -> None:
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self) -> '_Span':
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.trace.spans.append((self.name, self.start, time.perf_counter()))
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> '_NoopSpan':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+_NOOP = _NoopSpan()
+
+def span(name: str):
+    '''Интервал текущего запроса: with tracing.span('plan-select'): ...'''
+    trace = _current.get()
+    return _NOOP if trace is None else _Span(trace, name)
+
+def sample_rate() -> float:
+    try:
+        return min(1.0, max(0.0, float(os.environ.get('TRACE_SAMPLE_RATE', DEFAULT_SAMPLE_RATE))))
+    except ValueError:
+        return DEFAULT_SAMPLE_RATE
+
+def traced(handler: Callable[[Dict[str, Any], Any], Dict[str, Any]]):
+    '''Декоратор handler: выборка, Server-Timing в ответе и JSON-строка в лог'''
+    function_name = os.path.basename(os.path.dirname(os.path.abspath(handler.__code__.co_filename)))
+
+    @functools.wraps(handler)
+    def wrapper(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+        rate = sample_rate()
+        if rate <= 0 or random.random() >= rate:
+            return handler(event, context)
+
+        trace = Trace()
+        token = _current.set(trace)
+        response: Optional[Dict[str, Any]] = None
+        try:
+            response = handler(event, context)
+            return response
+        finally:
+            _current.reset(token)
+            total_ms = (time.perf_counter() - trace.started) * 1000
+            status = response.get('statusCode', 200) if response is not None else 500
+            if response is not None:
+                headers = response.setdefault('headers', {})
+                headers['Server-Timing'] = trace.server_timing(total_ms)
+                headers['Timing-Allow-Origin'] = '*'
+            log_line = {
+                'function': function_name,
+                'requestId': getattr(context, 'request_id', None),
+                'method': event.get('httpMethod'),
+                'status': status,
+                'durationMs': round(total_ms, 3),
+                'spans': [
+                    {'name': name, 'startMs': round((start - trace.started) * 1000, 3),
+                     'durMs': round((end - start) * 1000, 3)}
+                    for name, start, end in trace.spans
+                ]
+            }
+            sys.stdout.write(json.dumps(log_line, ensure_ascii=False) + '\n')
+            sys.stdout.flush()
+
+    return wrapper
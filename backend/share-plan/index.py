@@ -8,12 +8,24 @@ import json
 import uuid
 import os
 from typing import Dict, Any
-import psycopg2
 from psycopg2.extras import execute_values
+import db
+import tracing
 
 def get_db_connection():
-    return psycopg2.connect(os.environ['DATABASE_URL'])
+    return db.get_connection(os.environ['DATABASE_URL'])
 
+def read_shared_plan(conn, plan_id: str):
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT session_ids FROM t_p73504605_landing_exhibition_m.shared_plans WHERE plan_id = %s",
+        (plan_id,)
+    )
+    row = cur.fetchone()
+    cur.close()
+    return row
+
+@tracing.traced
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
@@ -50,12 +62,12 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         conn = get_db_connection()
         cur = conn.cursor()
         cur.execute(
-            "INSERT INTO shared_plans (plan_id, session_ids) VALUES (%s, %s)",
+            "INSERT INTO t_p73504605_landing_exhibition_m.shared_plans (plan_id, session_ids) VALUES (%s, %s)",
             (plan_id, plan_data)
         )
         conn.commit()
         cur.close()
-        conn.close()
+        db.release(conn)
         
         return {
             'statusCode': 200,
@@ -82,15 +94,9 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'isBase64Encoded': False
             }
         
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute(
-            "SELECT session_ids FROM shared_plans WHERE plan_id = %s",
-            (plan_id,)
+        row = db.read_with_fallback(
+            os.environ['DATABASE_URL'], db.read_your_writes(event), lambda conn: read_shared_plan(conn, plan_id)
         )
-        row = cur.fetchone()
-        cur.close()
-        conn.close()
         
         if not row:
             return {
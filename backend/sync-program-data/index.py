@@ -1,14 +1,20 @@
 import json
 import os
-import psycopg2
-import urllib.request
 from datetime import datetime
+import db
+import program_sync
+import queries
+import sheets_parser
+import tracing
 
+@tracing.traced
 def handler(event, context):
     '''
     Business: Синхронизация данных из Google Sheets в БД (парсинг CSV)
-    Args: event с body {eventId, sheetGid}
-    Returns: HTTP response с результатом синхронизации
+    Args: event с body {eventId, sheetGids, metaGid, force}; metaGid запоминается у мероприятия,
+          без него берётся сохранённый лист Meta (get-program-data обновляет кеш по нему же)
+    Returns: HTTP response с результатом синхронизации: changed — листы, переписанные в кеше,
+             unchanged — листы без изменений (запись пропущена), errors — не загрузившиеся
     '''
     method = event.get('httpMethod', 'POST')
     
@@ -35,6 +41,8 @@ def handler(event, context):
     body = json.loads(body_str) if body_str else {}
     event_id = body.get('eventId')
     sheet_gids = body.get('sheetGids', ['0'])  # Можем синхронизировать несколько листов
+    meta_gid = body.get('metaGid')
+    force = bool(body.get('force'))  # переписать кеш, даже если листы не менялись
     
     if not event_id:
         return {
@@ -51,15 +59,14 @@ def handler(event, context):
             'body': json.dumps({'error': 'DATABASE_URL not configured'})
         }
     
-    conn = psycopg2.connect(dsn)
+    conn = db.get_connection(dsn)
     conn.autocommit = True
     
     try:
         cur = conn.cursor()
         
         # Получаем URL таблицы
-        safe_event_id = event_id.replace("'", "''")
-        cur.execute(f"SELECT sheet_url FROM program_events WHERE id = '{safe_event_id}'")
+        queries.execute(cur, 'event_sheet_url', (event_id,))
         event_row = cur.fetchone()
         
         if not event_row:
@@ -70,9 +77,8 @@ def handler(event, context):
                 'body': json.dumps({'error': 'Event not found'})
             }
         
-        sheet_url = event_row[0]
-        sheet_id_match = sheet_url.split('/spreadsheets/d/')
-        if len(sheet_id_match) < 2:
+        sheet_id = program_sync.sheet_id_from_url(event_row[0])
+        if not sheet_id:
             cur.close()
             return {
                 'statusCode': 400,
@@ -80,44 +86,28 @@ def handler(event, context):
                 'body': json.dumps({'error': 'Invalid sheet URL'})
             }
         
-        sheet_id = sheet_id_match[1].split('/')[0]
+        sheet_gids = list(dict.fromkeys(str(gid) for gid in sheet_gids))
         
-        synced = []
-        errors = []
-        
-        # Синхронизируем каждый лист
-        for gid in sheet_gids:
-            try:
-                csv_url = f'https://docs.google.com/spreadsheets/d/{sheet_id}/export?format=csv&gid={gid}'
-                
-                # Загружаем CSV
-                req = urllib.request.Request(csv_url, headers={'Accept': 'text/csv'})
-                with urllib.request.urlopen(req, timeout=10) as response:
-                    csv_content = response.read().decode('utf-8')
-                
-                # Сохраняем RAW CSV в кеш (парсинг будет на фронте пока)
-                # В будущем можно добавить полный парсинг здесь
-                cache_data = {
-                    'sheetId': sheet_id,
-                    'gid': gid,
-                    'csvContent': csv_content,
-                    'syncedAt': datetime.now().isoformat()
-                }
-                
-                safe_gid = gid.replace("'", "''")
-                data_json = json.dumps(cache_data).replace("'", "''")
-                
-                cur.execute(f"""
-                    INSERT INTO program_cache (event_id, sheet_gid, data, last_updated)
-                    VALUES ('{safe_event_id}', '{safe_gid}', '{data_json}', CURRENT_TIMESTAMP)
-                    ON CONFLICT (event_id, sheet_gid) 
-                    DO UPDATE SET data = '{data_json}', last_updated = CURRENT_TIMESTAMP
-                """)
-                
-                synced.append(gid)
-            
-            except Exception as e:
-                errors.append({'gid': gid, 'error': str(e)})
+        # Изменившиеся листы пишутся одной транзакцией: кеш не остаётся наполовину от разных синхронизаций
+        conn.autocommit = False
+        try:
+            if meta_gid is None:
+                meta_gid = event_row[1]
+            else:
+                meta_gid = str(meta_gid)
+                queries.execute(cur, 'event_set_meta_gid', (event_id, meta_gid))
+            if meta_gid is None:
+                meta_gid = sheets_parser.META_SHEET_GID
+            result = program_sync.sync_sheets(cur, event_id, sheet_id, sheet_gids, meta_gid, force)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            result = {
+                'changed': [],
+                'unchanged': [],
+                'versions': {},
+                'errors': [{'gid': gid, 'error': str(e)} for gid in sheet_gids]
+            }
         
         cur.close()
         
@@ -129,11 +119,11 @@ def handler(event, context):
             },
             'body': json.dumps({
                 'success': True,
-                'synced': synced,
-                'errors': errors,
+                'synced': [gid for gid in sheet_gids if gid in result['changed'] or gid in result['unchanged']],
+                **result,
                 'timestamp': datetime.now().isoformat()
             })
         }
     
     finally:
-        conn.close()
\ No newline at end of file
+        db.release(conn)
\ No newline at end of file
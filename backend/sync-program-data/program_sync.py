@@ -0,0 +1,201 @@
+'''
+Синхронизация листов программы из Google Sheets в program_cache: загрузка, разбор и запись.
+
+Листы (и лист Meta) качаются параллельно, условными запросами, если выгрузка присылала валидаторы.
+Строка кеша переписывается, только если изменился CSV листа, лист Meta или версия парсера; у
+неизменившихся обновляется лишь checked_at — JSONB и его TOAST не трогаются, version не растёт.
+
+Транзакцией управляет вызывающий: sync_sheets только выполняет запросы на курсоре.
+
+Файл одинаковый в sync-program-data и get-program-data (обновление устаревшего кеша в запросе).
+'''
+
+import contextvars
+import hashlib
+import os
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from psycopg2.extras import Json
+
+import queries
+import sheets_parser
+import tracing
+
+DEFAULT_EXPORT_URL = 'https://docs.google.com/spreadsheets/d'
+# Листов, которые качаются одновременно; остальные ждут свободный поток
+MAX_PARALLEL_FETCHES = 4
+# Сколько ждать один лист целиком, от запроса до последнего байта
+SHEET_TIMEOUT_SECONDS = 10
+# Размер куска при чтении ответа: между кусками проверяется таймаут листа
+READ_CHUNK_BYTES = 64 * 1024
+
+@dataclass
+class SheetFetch:
+    '''Ответ выгрузки листа. text is None — 304: лист не менялся с прошлой синхронизации'''
+    text: Optional[str]
+    content_hash: Optional[str]
+    etag: Optional[str]
+    last_modified: Optional[str]
+
+def sheet_id_from_url(sheet_url: str) -> Optional[str]:
+    '''ID таблицы из ссылки вида https://docs.google.com/spreadsheets/d/<id>/edit'''
+    parts = (sheet_url or '').split('/spreadsheets/d/')
+    return parts[1].split('/')[0] if len(parts) >= 2 else None
+
+def fetch_sheet_csv(sheet_id: str, gid: str,
+                    validators: Optional[Tuple[Optional[str], Optional[str]]] = None) -> SheetFetch:
+    '''
+    Выгрузка одного листа таблицы в CSV. SHEETS_EXPORT_URL подменяет адрес Google Sheets
+    (локальная заглушка в бенчмарке). Медленный ответ обрывается через SHEET_TIMEOUT_SECONDS.
+    validators — (ETag, Last-Modified) прошлой выгрузки: запрос становится условным, если они есть.
+    '''
+    export_url = os.environ.get('SHEETS_EXPORT_URL', DEFAULT_EXPORT_URL).rstrip('/')
+    csv_url = f'{export_url}/{sheet_id}/export?format=csv&gid={gid}'
+    headers = {'Accept': 'text/csv'}
+    etag, last_modified = validators or (None, None)
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    req = urllib.request.Request(csv_url, headers=headers)
+    deadline = time.monotonic() + SHEET_TIMEOUT_SECONDS
+    try:
+        with tracing.span('sheet-fetch'), urllib.request.urlopen(req, timeout=SHEET_TIMEOUT_SECONDS) as response:
+            chunks = []
+            while True:
+                chunk = response.read(READ_CHUNK_BYTES)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f'sheet {gid} not loaded in {SHEET_TIMEOUT_SECONDS}s')
+            content = b''.join(chunks)
+            return SheetFetch(
+                text=content.decode('utf-8'),
+                content_hash=hashlib.sha256(content).hexdigest(),
+                etag=response.headers.get('ETag'),
+                last_modified=response.headers.get('Last-Modified')
+            )
+    except urllib.error.HTTPError as e:
+        if e.code != 304:
+            raise
+        return SheetFetch(text=None, content_hash=None, etag=etag, last_modified=last_modified)
+
+def sheet_missing(error: Exception) -> bool:
+    '''Выгрузка ответила, что такого листа нет (а не временная ошибка сети или Google)'''
+    return isinstance(error, urllib.error.HTTPError) and error.code in (400, 404)
+
+def fetch_sheets(sheet_id: str, gids: List[str],
+                 validators: Dict[str, Tuple[Optional[str], Optional[str]]]) -> Dict[str, Union[SheetFetch, Exception]]:
+    '''
+    Качает листы параллельно, не больше MAX_PARALLEL_FETCHES сразу: синхронизация занимает
+    примерно время самого медленного листа, а не сумму. По каждому gid — ответ или исключение.
+    '''
+    results: Dict[str, Union[SheetFetch, Exception]] = {}
+    if not gids:
+        return results
+    with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_FETCHES, len(gids))) as pool:
+        # Копия контекста на каждый лист: span('sheet-fetch') из потока попадает в трассировку запроса
+        futures = {
+            pool.submit(contextvars.copy_context().run, fetch_sheet_csv, sheet_id, gid, validators.get(gid)): gid
+            for gid in gids
+        }
+        for future in as_completed(futures):
+            try:
+                results[futures[future]] = future.result()
+            except Exception as e:
+                results[futures[future]] = e
+    return results
+
+def sync_sheets(cur, event_id: str, sheet_id: str, sheet_gids: List[str],
+                meta_gid: Optional[str] = sheets_parser.META_SHEET_GID, force: bool = False) -> Dict[str, Any]:
+    '''
+    Загружает, разбирает и записывает листы мероприятия. Возвращает changed (переписанные листы),
+    unchanged, versions (новая version по каждому переписанному) и errors (не загрузившиеся или
+    не разобранные листы). force=True переписывает листы, даже если они не менялись.
+    Ошибка записи в БД пробрасывается: вызывающий откатывает транзакцию.
+    '''
+    changed: List[str] = []
+    unchanged: List[str] = []
+    versions: Dict[str, int] = {}
+    errors: List[Dict[str, str]] = []
+
+    sheet_gids = list(dict.fromkeys(str(gid) for gid in sheet_gids))
+
+    # Что уже лежит в кеше: хеши для сравнения и валидаторы для условных запросов
+    stored = {}
+    if not force:
+        queries.execute(cur, 'cache_validators', (event_id, sheet_gids))
+        stored = {row[0]: row[1:] for row in cur.fetchall()}
+
+    # Все листы (и Meta) качаются одновременно; повторяющиеся gid — один раз.
+    # Meta не кешируется отдельной строкой и всегда качается целиком — он маленький
+    fetched = fetch_sheets(
+        sheet_id,
+        list(dict.fromkeys(sheet_gids + ([meta_gid] if meta_gid else []))),
+        {gid: (row[2], row[3]) for gid, row in stored.items() if gid != meta_gid}
+    )
+
+    # Лист Meta общий для всех дней и необязательный: без него (meta_gid не задан или такого листа
+    # в таблице нет) дата и заголовки берутся из самих листов, как на фронте.
+    # Временная ошибка загрузки Meta — не «листа нет»: разбор без Meta дал бы другие дату и ID сессий
+    # и переписал бы весь кеш, поэтому листы пропускаются и в кеше остаются прежние строки
+    meta_text = ''
+    meta_fetch = fetched.get(meta_gid) if meta_gid else None
+    if isinstance(meta_fetch, Exception) and not sheet_missing(meta_fetch):
+        errors = [{'gid': gid, 'error': f'Meta sheet {meta_gid} not loaded: {meta_fetch}'} for gid in sheet_gids]
+        return {'changed': changed, 'unchanged': unchanged, 'versions': versions, 'errors': errors}
+    if isinstance(meta_fetch, SheetFetch) and meta_fetch.text is not None:
+        meta_text = meta_fetch.text
+    meta = sheets_parser.parse_meta(meta_text)
+    # Разбор листа зависит ещё от Meta и от самого парсера: при их смене лист переписывается
+    inputs_hash = hashlib.sha256(f'{sheets_parser.PARSER_VERSION}\0{meta_text}'.encode('utf-8')).hexdigest()
+
+    parsed = []
+    for gid in sheet_gids:
+        try:
+            sheet = fetched[gid]
+            if isinstance(sheet, Exception):
+                raise sheet
+
+            content_hash, stored_inputs_hash = stored.get(gid, (None, None))[:2]
+            if stored_inputs_hash == inputs_hash and (sheet.text is None or sheet.content_hash == content_hash):
+                unchanged.append(gid)
+                continue
+            if sheet.text is None:
+                # 304, но поменялся Meta или парсер: нужен сам лист
+                sheet = fetch_sheet_csv(sheet_id, gid)
+
+            # Разбираем один раз здесь: клиенты получают готовые залы и сессии вместо сырого CSV
+            with tracing.span('parse'):
+                program = sheets_parser.parse_program(sheet.text, meta)
+
+            parsed.append((gid, sheet, {
+                'sheetId': sheet_id,
+                'gid': gid,
+                **program,
+                'syncedAt': datetime.now().isoformat()
+            }))
+
+        except Exception as e:
+            errors.append({'gid': gid, 'error': str(e)})
+
+    with tracing.span('cache-write'):
+        for gid, sheet, cache_data in parsed:
+            queries.execute(cur, 'cache_sync_upsert', (
+                event_id, gid, Json(cache_data), sheet.content_hash, inputs_hash,
+                sheet.etag, sheet.last_modified
+            ))
+            versions[gid] = cur.fetchone()[0]
+            changed.append(gid)
+        # Неизменившиеся листы проверены только что: свежесть кеша отсчитывается заново
+        if unchanged:
+            queries.execute(cur, 'cache_mark_checked', (event_id, unchanged))
+
+    return {'changed': changed, 'unchanged': unchanged, 'versions': versions, 'errors': errors}
@@ -0,0 +1,113 @@
+'''
+Именованные параметризованные запросы к program_events и program_cache.
+
+Запрос готовится через PREPARE один раз на соединение, дальше выполняется EXECUTE имя(параметры):
+Postgres не разбирает и не планирует текст заново, а значения (в том числе большой JSON кеша)
+экранирует libpq, а не цепочка replace в Python. Вместе с переиспользованием соединения (db.py)
+подготовленный запрос живёт столько же, сколько тёплый контейнер.
+
+Файл одинаковый в program-events, get-program-data и sync-program-data.
+'''
+
+import weakref
+from typing import Any, Dict, Sequence, Set, Tuple
+
+EVENT_COLUMNS = 'id, name, sheet_url, logo_url, cover_url, day_sheets, created_at, cache_ttl_seconds, cache_max_stale_seconds'
+
+# имя -> (типы параметров, текст запроса с $1, $2, ...)
+QUERIES: Dict[str, Tuple[Tuple[str, ...], str]] = {
+    'event_get': (
+        ('text',),
+        f'SELECT {EVENT_COLUMNS} FROM t_p73504605_landing_exhibition_m.program_events WHERE id = $1'
+    ),
+    'event_list': (
+        (),
+        f'SELECT {EVENT_COLUMNS} FROM t_p73504605_landing_exhibition_m.program_events ORDER BY created_at DESC'
+    ),
+    'event_insert': (
+        ('text', 'text', 'text', 'text', 'text', 'text', 'int', 'int'),
+        '''INSERT INTO t_p73504605_landing_exhibition_m.program_events
+               (id, name, sheet_url, logo_url, cover_url, day_sheets, cache_ttl_seconds, cache_max_stale_seconds)
+           VALUES ($1, $2, $3, $4, $5, $6, $7, $8)'''
+    ),
+    # Настройки кеша не пришли (NULL) — остаются прежними: форма мероприятия их не присылает
+    'event_update': (
+        ('text', 'text', 'text', 'text', 'text', 'text', 'int', 'int'),
+        '''UPDATE t_p73504605_landing_exhibition_m.program_events
+           SET name = $2, sheet_url = $3, logo_url = $4, cover_url = $5, day_sheets = $6,
+               cache_ttl_seconds = COALESCE($7, cache_ttl_seconds),
+               cache_max_stale_seconds = COALESCE($8, cache_max_stale_seconds)
+           WHERE id = $1'''
+    ),
+    'event_delete': (
+        ('text',),
+        'DELETE FROM t_p73504605_landing_exhibition_m.program_events WHERE id = $1'
+    ),
+    # URL таблицы и лист Meta мероприятия (meta_gid NULL — лист по умолчанию)
+    'event_sheet_url': (
+        ('text',),
+        'SELECT sheet_url, meta_gid FROM t_p73504605_landing_exhibition_m.program_events WHERE id = $1'
+    ),
+    # sync-program-data с явным metaGid запоминает его: кеш обновляется по тому же листу Meta
+    'event_set_meta_gid': (
+        ('text', 'text'),
+        'UPDATE t_p73504605_landing_exhibition_m.program_events SET meta_gid = $2 WHERE id = $1'
+    ),
+    # Строка кеша листа вместе с настройками кеша мероприятия; строки мероприятия нет — пустой результат.
+    # Возраст — от последней сверки с таблицей, по часам базы; $3, $4 — TTL и max-stale по умолчанию
+    'cache_state': (
+        ('text', 'text', 'int', 'int'),
+        '''SELECT e.sheet_url, c.data, c.last_updated,
+                  EXTRACT(EPOCH FROM CURRENT_TIMESTAMP - COALESCE(c.checked_at, c.last_updated))::float8,
+                  COALESCE(e.cache_ttl_seconds, $3), COALESCE(e.cache_max_stale_seconds, $4), e.meta_gid
+           FROM t_p73504605_landing_exhibition_m.program_events e
+           LEFT JOIN t_p73504605_landing_exhibition_m.program_cache c ON c.event_id = e.id AND c.sheet_gid = $2
+           WHERE e.id = $1'''
+    ),
+    # Что лежит в кеше по листам мероприятия: с этим sync-program-data решает, переписывать ли строку
+    'cache_validators': (
+        ('text', 'text[]'),
+        '''SELECT sheet_gid, content_hash, inputs_hash, etag, source_last_modified
+           FROM t_p73504605_landing_exhibition_m.program_cache
+           WHERE event_id = $1 AND sheet_gid = ANY($2)'''
+    ),
+    # Запись синхронизированного листа вместе с хешами и валидаторами выгрузки
+    'cache_sync_upsert': (
+        ('text', 'text', 'jsonb', 'text', 'text', 'text', 'text'),
+        '''INSERT INTO t_p73504605_landing_exhibition_m.program_cache
+               (event_id, sheet_gid, data, last_updated, checked_at, content_hash, inputs_hash, etag, source_last_modified)
+           VALUES ($1, $2, $3, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP, $4, $5, $6, $7)
+           ON CONFLICT (event_id, sheet_gid)
+           DO UPDATE SET data = EXCLUDED.data, last_updated = EXCLUDED.last_updated, checked_at = EXCLUDED.checked_at,
+                         content_hash = EXCLUDED.content_hash, inputs_hash = EXCLUDED.inputs_hash,
+                         etag = EXCLUDED.etag, source_last_modified = EXCLUDED.source_last_modified,
+                         version = t_p73504605_landing_exhibition_m.program_cache.version + 1
+           RETURNING version'''
+    ),
+    # Листы сверены с таблицей и не изменились: обновляется только время сверки
+    'cache_mark_checked': (
+        ('text', 'text[]'),
+        '''UPDATE t_p73504605_landing_exhibition_m.program_cache SET checked_at = CURRENT_TIMESTAMP
+           WHERE event_id = $1 AND sheet_gid = ANY($2)'''
+    ),
+}
+
+# Имена запросов, уже подготовленных на соединении; запись исчезает вместе с соединением
+_prepared: 'weakref.WeakKeyDictionary[Any, Set[str]]' = weakref.WeakKeyDictionary()
+
+def execute(cur, name: str, params: Sequence[Any] = ()) -> None:
+    '''
+    Выполняет именованный запрос на курсоре. При первом вызове на соединении — PREPARE
+    (PREPARE не транзакционный и переживает rollback), затем EXECUTE.
+    '''
+    arg_types, sql = QUERIES[name]
+    prepared = _prepared.setdefault(cur.connection, set())
+    if name not in prepared:
+        types = f" ({', '.join(arg_types)})" if arg_types else ''
+        cur.execute(f'PREPARE {name}{types} AS {sql}')
+        prepared.add(name)
+    
+    if params:
+        cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", tuple(params))
+    else:
+        cur.execute(f'EXECUTE {name}')
@@ -3,7 +3,9 @@ import os
 import base64
 import urllib.request
 import urllib.parse
+import tracing
 
+@tracing.traced
 def handler(event, context):
     '''
     Business: Загрузка изображений через imgbb API
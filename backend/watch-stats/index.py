@@ -0,0 +1,561 @@
+'''
+Business: Long-poll живой статистики для панели организатора: ждёт NOTIFY от save-plan
+          и отдаёт счётчики только изменившихся сессий, не чаще одного пакета за интервал
+Args: event с httpMethod, queryStringParameters (eventId; cursor — из прошлого ответа;
+      timeout — сколько ждать изменений, секунд)
+Returns: HTTP response с изменившимися сессиями, totalUsers и cursor для следующего запроса
+'''
+
+import hashlib
+import json
+import os
+import select
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Set, Tuple
+import psycopg2
+import psycopg2.extras
+import db
+import tracing
+
+DEFAULT_TIMEOUT_SECONDS = 25
+MAX_TIMEOUT_SECONDS = 25
+# Пакет изменений собирается столько секунд с начала запроса: каждая панель получает
+# не больше одного ответа за интервал, сколько бы сохранений ни пришло
+COALESCE_SECONDS = 2.0
+# Ждущий, чей интервал кончается чуть позже, присоединяется к уже открытому пакету канала:
+# пакет считается один раз на всех, а ответ сдвигается не больше чем на столько секунд
+BATCH_JOIN_SECONDS = 0.5
+# Канал без ждущих остаётся под LISTEN столько секунд: следующий запрос панели с cursor,
+# выданным этим контейнером, берёт изменения из журнала уведомлений без запроса к базе
+LISTEN_KEEP_SECONDS = 5
+# Сколько выданных курсоров канала помнит контейнер (у панелей одного пакета cursor общий)
+CURSOR_LIMIT = 256
+# Сохранение ставит updated_at временем начала транзакции, а NOTIFY доходит после коммита,
+# поэтому догоняющий запрос по cursor смотрит на это окно назад. Повтор безвреден:
+# в ответе текущие значения счётчиков, а не приращения.
+CURSOR_OVERLAP_SECONDS = 5
+
+def stats_channel(event_id: str) -> str:
+    '''Канал LISTEN/NOTIFY мероприятия — тот же, что в save-plan'''
+    return 'stats_' + hashlib.md5(event_id.encode('utf-8')).hexdigest()
+
+def parse_keys(payload: str) -> Optional[Set[int]]:
+    '''Номера сессий из payload; None — «изменилось всё» (пустой или неразборчивый payload)'''
+    if not payload:
+        return None
+    try:
+        return {int(key) for key in payload.split(',')}
+    except ValueError:
+        return None
+
+def changed_since(cur, event_id: str, cursor: str) -> Set[int]:
+    '''
+    Сессии, изменённые после cursor (с перекрытием): счётчики и несвёрнутый журнал.
+    cursor — LOCALTIMESTAMP, как updated_at; created_at журнала записан в UTC
+    '''
+    cur.execute('''
+        SELECT session_key
+        FROM t_p73504605_landing_exhibition_m.session_stats
+        WHERE event_id = %(event_id)s
+          AND updated_at > %(cursor)s::timestamp - make_interval(secs => %(overlap)s)
+        UNION
+        SELECT session_key
+        FROM t_p73504605_landing_exhibition_m.session_stats_deltas
+        WHERE event_id = %(event_id)s
+          AND created_at > timezone('UTC', %(cursor)s::timestamptz) - make_interval(secs => %(overlap)s)
+    ''', {'event_id': event_id, 'cursor': cursor, 'overlap': CURSOR_OVERLAP_SECONDS})
+    return {row['session_key'] for row in cur.fetchall()}
+
+def fetch_counts(cur, event_id: str, session_keys: Optional[Set[int]]) -> List[Dict[str, Any]]:
+    '''Текущие счётчики выбранных сессий (или всех, если session_keys = None) — как в get-stats'''
+    keys = None if session_keys is None else sorted(session_keys)
+    cur.execute('''
+        SELECT s.session_id, counts.interest_count
+        FROM (
+            SELECT session_key, GREATEST(0, SUM(interest_count))::int AS interest_count
+            FROM (
+                SELECT session_key, interest_count
+                FROM t_p73504605_landing_exhibition_m.session_stats
+                WHERE event_id = %(event_id)s AND (%(keys)s::int[] IS NULL OR session_key = ANY(%(keys)s::int[]))
+                UNION ALL
+                SELECT session_key, delta
+                FROM t_p73504605_landing_exhibition_m.session_stats_deltas
+                WHERE event_id = %(event_id)s AND (%(keys)s::int[] IS NULL OR session_key = ANY(%(keys)s::int[]))
+            ) all_counts
+            GROUP BY session_key
+        ) counts
+        JOIN t_p73504605_landing_exhibition_m.event_sessions s ON s.id = counts.session_key
+        ORDER BY counts.interest_count DESC
+    ''', {'event_id': event_id, 'keys': keys})
+    return [dict(row) for row in cur.fetchall()]
+
+def read_batch(database_url: str, event_id: str, session_keys: Optional[Set[int]]) -> Dict[str, Any]:
+    '''Тело ответа одной транзакцией: cursor, счётчики сессий (все, если session_keys = None) и totalUsers'''
+    conn = db.get_connection(database_url)
+    try:
+        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        cur.execute('''
+            SELECT LOCALTIMESTAMP AS now, COALESCE((
+                SELECT total_users
+                FROM t_p73504605_landing_exhibition_m.event_totals
+                WHERE event_id = %s
+            ), 0) AS total_users
+        ''', (event_id,))
+        row = cur.fetchone()
+        sessions = fetch_counts(cur, event_id, session_keys)
+        cur.close()
+        conn.commit()
+    finally:
+        db.release(conn)
+    
+    return {
+        'changed': True,
+        'full': session_keys is None,
+        'sessions': sessions,
+        'totalUsers': row['total_users'],
+        'cursor': row['now'].isoformat()
+    }
+
+class Waiter:
+    '''
+    Один ждущий запрос. since — номер уведомления, после которого ему нужны изменения (None, пока
+    LISTEN не подтверждён); changed — что нашёл догоняющий запрос (None — «изменилось всё»);
+    batch — пакет, в котором он получит ответ. Поля меняются под StatsListener.cond.
+    '''
+    
+    def __init__(self, database_url: str, event_id: str, cursor: str, coalesce_until: float):
+        self.database_url = database_url
+        self.event_id = event_id
+        self.channel = stats_channel(event_id)
+        self.cursor = cursor
+        self.coalesce_until = coalesce_until
+        self.since: Optional[int] = None
+        self.changed: Optional[Set[int]] = set()
+        self.batch: Optional['Batch'] = None
+        self.error: Optional[Exception] = None
+
+class Batch:
+    '''
+    Пакет изменений канала: считается один раз — первым из участников, дождавшимся flush_at, —
+    и отдаётся всем. Присоединиться может ждущий, чей интервал кончается до join_until.
+    '''
+    
+    def __init__(self, flush_at: float):
+        self.flush_at = flush_at
+        self.join_until = flush_at + BATCH_JOIN_SECONDS
+        self.waiters: Set[Waiter] = set()
+        self.computing = False
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[Exception] = None
+
+class Channel:
+    '''
+    Канал мероприятия в контейнере. Пока действует LISTEN, каждое уведомление получает номер
+    и ложится в log, а cursors помнит номер, на котором выдан каждый cursor этого контейнера:
+    запросу с таким cursor догоняющий запрос к базе не нужен. Потеря подписки увеличивает epoch
+    и забывает и журнал, и курсоры.
+    '''
+    
+    def __init__(self):
+        self.listening = False
+        self.epoch = 0
+        self.log: List[Tuple[int, Optional[Set[int]]]] = []
+        self.cursors: Dict[str, int] = {}
+        self.waiters: Set[Waiter] = set()
+        self.batches: List[Batch] = []
+        self.idle_since = time.monotonic()
+    
+    def reset(self) -> None:
+        self.listening = False
+        self.epoch += 1
+        self.log = []
+        self.cursors = {}
+    
+    def pending(self, waiter: Waiter) -> bool:
+        '''Есть ли у waiter изменения: от догоняющего запроса или уведомления после since'''
+        if waiter.changed is None or waiter.changed:
+            return True
+        return waiter.since is not None and bool(self.log) and self.log[-1][0] > waiter.since
+    
+    def batch_keys(self, batch: Batch) -> Optional[Set[int]]:
+        '''Объединение изменений всех участников пакета; лишние сессии безвредны — отдаются текущие значения'''
+        keys: Set[int] = set()
+        for waiter in batch.waiters:
+            if waiter.changed is None:
+                return None
+            keys |= waiter.changed
+        since = min((waiter.since for waiter in batch.waiters if waiter.since is not None), default=None)
+        if since is not None:
+            for seq, changed in self.log:
+                if seq <= since:
+                    continue
+                if changed is None:
+                    return None
+                keys |= changed
+        return keys
+    
+    def trim(self, seq: int) -> None:
+        '''Держит журнал только от самого старого номера, который ещё может понадобиться'''
+        while len(self.cursors) > CURSOR_LIMIT:
+            del self.cursors[next(iter(self.cursors))]
+        needed = list(self.cursors.values()) + [waiter.since for waiter in self.waiters if waiter.since is not None]
+        floor = min(needed, default=seq)
+        self.log = [entry for entry in self.log if entry[0] > floor]
+
+class StatsListener:
+    '''
+    Одно соединение LISTEN на контейнер для всех ждущих запросов: ожидание не держит соединение
+    из пула. Отдельного потока нет — контейнер могут заморозить после ответа. Соединение слушает
+    один из ждущих запросов (ведущий) и раскладывает уведомления по журналам каналов; ведущий
+    дождался своего — его место занимает следующий. Соединение трогает только ведущий, новые
+    подписки будят его через pipe. Ждущие одного канала собираются в общие пакеты, так что
+    выборка счётчиков идёт один раз на пакет, а не на каждую панель.
+    '''
+    
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.conn = None
+        self.leading = False
+        # Сквозной номер уведомлений: не сбрасывается при переподключении
+        self.seq = 0
+        self.channels: Dict[str, Channel] = {}
+        self.wake_read, self.wake_write = os.pipe()
+        os.set_blocking(self.wake_read, False)
+        os.set_blocking(self.wake_write, False)
+    
+    def subscribe(self, waiter: Waiter) -> bool:
+        '''
+        Регистрирует waiter; True — контейнер слушает канал непрерывно с выдачи его cursor,
+        и изменения после cursor уже в журнале (догоняющий запрос не нужен)
+        '''
+        with self.cond:
+            channel = self.channels.setdefault(waiter.channel, Channel())
+            channel.waiters.add(waiter)
+            if not channel.listening:
+                self._wake()
+                return False
+            known = waiter.cursor in channel.cursors
+            waiter.since = channel.cursors[waiter.cursor] if known else self.seq
+            return known
+    
+    def unsubscribe(self, waiter: Waiter) -> None:
+        with self.cond:
+            channel = self.channels.get(waiter.channel)
+            if channel is None:
+                return
+            channel.waiters.discard(waiter)
+            batch = waiter.batch
+            if batch is not None:
+                batch.waiters.discard(waiter)
+                if not batch.waiters and batch in channel.batches:
+                    channel.batches.remove(batch)
+            if not channel.waiters:
+                # Подписку снимает ведущий через LISTEN_KEEP_SECONDS: следующий запрос панели
+                # обычно приходит раньше и продолжает журнал
+                channel.idle_since = time.monotonic()
+                if not channel.listening:
+                    del self.channels[waiter.channel]
+            channel.trim(self.seq)
+    
+    def listen(self, waiter: Waiter, deadline: float) -> None:
+        '''Ждёт подтверждения LISTEN для waiter, но не дольше deadline'''
+        with self.cond:
+            while waiter.since is None and self._step(waiter, deadline - time.monotonic()):
+                pass
+    
+    def caught_up(self, waiter: Waiter, changed: Set[int]) -> None:
+        '''Добавляет изменения, найденные догоняющим запросом'''
+        with self.cond:
+            if waiter.changed is not None:
+                waiter.changed |= changed
+    
+    def next_batch(self, waiter: Waiter, deadline: float) -> Optional[Dict[str, Any]]:
+        '''Ждёт пакет с изменениями для waiter до deadline; None — изменений не было'''
+        with self.cond:
+            while True:
+                channel = self.channels[waiter.channel]
+                now = time.monotonic()
+                if waiter.batch is None and channel.pending(waiter):
+                    self._join(channel, waiter, now)
+                batch = waiter.batch
+                if batch is None:
+                    if self._step(waiter, deadline - now):
+                        continue
+                    # Изменений не было: тот же cursor продолжает журнал с since
+                    if channel.listening and waiter.since is not None:
+                        channel.cursors[waiter.cursor] = waiter.since
+                        channel.trim(self.seq)
+                    return None
+                if batch.error is not None:
+                    raise batch.error
+                if batch.result is not None:
+                    return batch.result
+                if batch.computing:
+                    self.cond.wait()
+                elif now >= batch.flush_at:
+                    self._compute(channel, batch, waiter)
+                else:
+                    self._step(waiter, batch.flush_at - now)
+    
+    def snapshot(self, database_url: str, event_id: str) -> Dict[str, Any]:
+        '''Полный снимок; если канал слушается, его cursor запоминается для следующего запроса'''
+        with self.cond:
+            channel = self.channels.get(stats_channel(event_id))
+            seq = self.seq
+            epoch = channel.epoch if channel is not None and channel.listening else None
+        result = read_batch(database_url, event_id, None)
+        with self.cond:
+            if epoch is not None and channel.listening and channel.epoch == epoch:
+                channel.cursors[result['cursor']] = seq
+                channel.trim(self.seq)
+        return result
+    
+    def _join(self, channel: Channel, waiter: Waiter, now: float) -> None:
+        for batch in channel.batches:
+            if waiter.coalesce_until <= batch.join_until:
+                break
+        else:
+            batch = Batch(max(now, waiter.coalesce_until))
+            channel.batches.append(batch)
+        batch.flush_at = max(batch.flush_at, waiter.coalesce_until)
+        batch.waiters.add(waiter)
+        waiter.batch = batch
+    
+    def _compute(self, channel: Channel, batch: Batch, waiter: Waiter) -> None:
+        '''Считает пакет вне cond; уведомления, пришедшие во время выборки, попадут в следующий'''
+        batch.computing = True
+        channel.batches.remove(batch)
+        keys = channel.batch_keys(batch)
+        seq, epoch, listening = self.seq, channel.epoch, channel.listening
+        self.cond.release()
+        try:
+            batch.result = read_batch(waiter.database_url, waiter.event_id, keys)
+        except Exception as e:
+            batch.error = e
+        finally:
+            self.cond.acquire()
+        if batch.result is not None and listening and channel.listening and channel.epoch == epoch:
+            channel.cursors[batch.result['cursor']] = seq
+            channel.trim(self.seq)
+        self.cond.notify_all()
+    
+    def _step(self, waiter: Waiter, timeout: float) -> bool:
+        '''Ждёт до timeout, по пути ведёт соединение, если никто не ведёт; False — время вышло'''
+        if waiter.error is not None:
+            raise waiter.error
+        if timeout <= 0:
+            return False
+        if self.leading:
+            self.cond.wait(timeout)
+            return True
+        self.leading = True
+        try:
+            self._lead(waiter.database_url, timeout)
+        finally:
+            self.leading = False
+            self.cond.notify_all()
+        if waiter.error is not None:
+            raise waiter.error
+        return True
+    
+    def _wake(self) -> None:
+        try:
+            os.write(self.wake_write, b'.')
+        except BlockingIOError:
+            pass
+    
+    def _drop_connection(self, error: Optional[Exception]) -> None:
+        '''Уведомления могли потеряться: кто уже слушал, получит полный снимок; кто ещё ждал LISTEN — error'''
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except psycopg2.Error:
+                pass
+        self.conn = None
+        for name, channel in list(self.channels.items()):
+            channel.reset()
+            if not channel.waiters:
+                del self.channels[name]
+            for waiter in channel.waiters:
+                if waiter.since is not None:
+                    waiter.changed = None
+                elif error is not None:
+                    waiter.error = error
+    
+    def _lead(self, database_url: str, timeout: float) -> None:
+        '''Один шаг ведущего (вызывается под cond): подписки, ожидание сокета, раскладка уведомлений'''
+        if self.conn is not None and self.conn.closed:
+            self._drop_connection(None)
+        now = time.monotonic()
+        unlisten: List[str] = []
+        for name, channel in list(self.channels.items()):
+            if not channel.waiters and (not channel.listening or now - channel.idle_since >= LISTEN_KEEP_SECONDS):
+                if channel.listening:
+                    unlisten.append(name)
+                channel.reset()
+                del self.channels[name]
+        to_listen = {name: channel for name, channel in self.channels.items() if not channel.listening}
+        conn = self.conn
+        error: Optional[Exception] = None
+        self.cond.release()
+        try:
+            if conn is None:
+                conn = db.get_connection(database_url)
+                conn.autocommit = True
+            statements = [f'LISTEN "{name}"' for name in to_listen]
+            statements += [f'UNLISTEN "{name}"' for name in unlisten]
+            if statements:
+                cur = conn.cursor()
+                cur.execute('; '.join(statements))
+                cur.close()
+                # Подписавшиеся ждут подтверждения LISTEN — отдаём его, не засыпая
+                timeout = 0
+            ready, _, _ = select.select([conn, self.wake_read], [], [], timeout)
+            if self.wake_read in ready:
+                os.read(self.wake_read, 1024)
+            if conn in ready:
+                conn.poll()
+        except (psycopg2.Error, OSError) as e:
+            error = e
+        finally:
+            self.cond.acquire()
+        
+        self.conn = conn
+        if error is not None:
+            self._drop_connection(error)
+            return
+        
+        for name, channel in to_listen.items():
+            # Канал могли покинуть, пока шёл LISTEN: возвращаем его, чтобы подписку сняли позже
+            if self.channels.setdefault(name, channel) is not channel:
+                continue
+            channel.listening = True
+            for waiter in channel.waiters:
+                if waiter.since is None:
+                    waiter.since = self.seq
+        for notify in conn.notifies:
+            channel = self.channels.get(notify.channel)
+            if channel is not None and channel.listening:
+                self.seq += 1
+                channel.log.append((self.seq, parse_keys(notify.payload)))
+        conn.notifies.clear()
+        for channel in self.channels.values():
+            channel.trim(self.seq)
+
+LISTENER = StatsListener()
+
+@tracing.traced
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    method: str = event.get('httpMethod', 'GET')
+    
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+    
+    if method != 'GET':
+        return {
+            'statusCode': 405,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': 'Method not allowed'}),
+            'isBase64Encoded': False
+        }
+    
+    params = event.get('queryStringParameters') or {}
+    event_id: str = params.get('eventId', '')
+    cursor: Optional[str] = params.get('cursor') or None
+    timeout_param: str = str(params.get('timeout') or DEFAULT_TIMEOUT_SECONDS)
+    
+    try:
+        cursor_valid = cursor is None or bool(datetime.fromisoformat(cursor))
+    except ValueError:
+        cursor_valid = False
+    
+    if not event_id or not cursor_valid or not timeout_param.isdigit() or int(timeout_param) > MAX_TIMEOUT_SECONDS:
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': f'eventId is required, cursor must come from a previous response and timeout must be 0..{MAX_TIMEOUT_SECONDS} seconds'}),
+            'isBase64Encoded': False
+        }
+    
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        return {
+            'statusCode': 500,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': 'Database configuration missing'}),
+            'isBase64Encoded': False
+        }
+    
+    
+    started = time.monotonic()
+    deadline = started + int(timeout_param)
+    
+    try:
+        # Первый запрос панели — полный снимок сразу, дальше только изменившиеся сессии
+        if cursor is None:
+            result = LISTENER.snapshot(database_url, event_id)
+        else:
+            # Пока ждём, соединение из пула не занято — слушает общее соединение контейнера
+            waiter = Waiter(database_url, event_id, cursor, min(started + COALESCE_SECONDS, deadline))
+            try:
+                if not LISTENER.subscribe(waiter):
+                    # cursor выдан другим контейнером или подписка прерывалась: сначала LISTEN,
+                    # потом догоняющий запрос — изменение между ними придёт уведомлением
+                    LISTENER.listen(waiter, deadline)
+                    conn = db.get_connection(database_url)
+                    conn.autocommit = True
+                    try:
+                        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+                        caught_up = changed_since(cur, event_id, cursor)
+                        cur.close()
+                    finally:
+                        db.release(conn)
+                    LISTENER.caught_up(waiter, caught_up)
+                result = LISTENER.next_batch(waiter, deadline)
+            finally:
+                LISTENER.unsubscribe(waiter)
+            if result is None:
+                result = {'changed': False, 'full': False, 'sessions': [], 'totalUsers': None, 'cursor': cursor}
+        
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Cache-Control': 'no-store',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps(result),
+            'isBase64Encoded': False
+        }
+    
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
@@ -0,0 +1,123 @@
+'''
+Общие помощники для локальных бенчмарков backend-функций.
+Бенчмарки работают против локального Postgres: BENCH_DATABASE_URL указывает на
+пустую базу, в которой схема пересоздаётся из db_migrations перед каждым прогоном.
+'''
+
+import importlib.util
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import psycopg2
+import psycopg2.extensions
+
+ROOT = Path(__file__).resolve().parent.parent
+BACKEND_DIR = ROOT / 'backend'
+MIGRATIONS_DIR = ROOT / 'db_migrations'
+SCHEMA = 't_p73504605_landing_exhibition_m'
+
+BENCH_DSN = os.environ.get('BENCH_DATABASE_URL', 'postgresql://postgres@localhost:5432/postgres')
+
+
+def reset_database(dsn: str = BENCH_DSN) -> None:
+    '''Пересоздаёт схему приложения и накатывает все миграции по порядку'''
+    # Соединения, которые хендлеры держат между вызовами (backend/*/db.py), помнят старую схему
+    if 'db' in sys.modules:
+        sys.modules['db'].close_all()
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    try:
+        cur = conn.cursor()
+        cur.execute('SELECT current_database()')
+        database = cur.fetchone()[0]
+        cur.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+        cur.execute(f'CREATE SCHEMA {SCHEMA}')
+        cur.execute(f'ALTER DATABASE "{database}" SET search_path = {SCHEMA}, public')
+        cur.execute(f'SET search_path = {SCHEMA}, public')
+        for migration in sorted(MIGRATIONS_DIR.glob('V*.sql')):
+            cur.execute(migration.read_text(encoding='utf-8'))
+        cur.close()
+    finally:
+        conn.close()
+
+
+def load_handler(function_name: str) -> Callable[[Dict[str, Any], Any], Dict[str, Any]]:
+    '''Импортирует backend/<function_name>/index.py и возвращает его handler'''
+    function_dir = BACKEND_DIR / function_name
+    if str(function_dir) not in sys.path:
+        sys.path.insert(0, str(function_dir))
+    module_name = 'bench_' + function_name.replace('-', '_')
+    spec = importlib.util.spec_from_file_location(module_name, function_dir / 'index.py')
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.handler
+
+
+class CountingCursor(psycopg2.extensions.cursor):
+    '''Курсор, который считает запросы и имитирует сетевую задержку до БД'''
+
+    def execute(self, query, vars=None):
+        self.connection.round_trips += 1
+        if self.connection.rtt:
+            time.sleep(self.connection.rtt)
+        return super().execute(query, vars)
+
+
+class CountingConnection(psycopg2.extensions.connection):
+    round_trips = 0
+    rtt = 0.0
+
+    def cursor(self, *args, **kwargs):
+        kwargs.setdefault('cursor_factory', CountingCursor)
+        return super().cursor(*args, **kwargs)
+
+
+class RoundTripCounter:
+    '''
+    Подменяет psycopg2.connect так, чтобы все соединения хендлеров считали запросы.
+    rtt_ms добавляет задержку на каждый запрос, как при походе в БД по сети.
+    '''
+
+    def __init__(self, rtt_ms: float = 0.0):
+        self.rtt = rtt_ms / 1000.0
+        self.connections: List[CountingConnection] = []
+        self._original_connect: Optional[Callable[..., Any]] = None
+
+    def __enter__(self) -> 'RoundTripCounter':
+        self._original_connect = psycopg2.connect
+
+        def connect(*args, **kwargs):
+            kwargs['connection_factory'] = CountingConnection
+            conn = self._original_connect(*args, **kwargs)
+            conn.rtt = self.rtt
+            self.connections.append(conn)
+            return conn
+
+        psycopg2.connect = connect
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        psycopg2.connect = self._original_connect
+
+    def take(self) -> int:
+        '''Возвращает число запросов с прошлого вызова'''
+        total = sum(conn.round_trips for conn in self.connections)
+        for conn in self.connections:
+            conn.round_trips = 0
+        self.connections = [conn for conn in self.connections if not conn.closed]
+        return total
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def post_event(body: str) -> Dict[str, Any]:
+    return {'httpMethod': 'POST', 'body': body, 'headers': {}, 'queryStringParameters': {}}
@@ -0,0 +1,148 @@
+'''
+Проверка синхронизации без лишних записей в sync-program-data.
+
+Локальный сервер (SHEETS_EXPORT_URL) отдаёт листы из fixtures; с --etag он присылает ETag и отвечает
+304 на совпавший If-None-Match, без него — как выгрузка без валидаторов, всегда целиком.
+Прогоны:
+1. первая синхронизация — все листы changed, version = 1;
+2. повтор без изменений — все листы unchanged, data и version не переписаны, сдвинут только checked_at;
+3. меняется один лист — changed только он, его version = 2;
+4. меняется Meta — changed все листы (разбор зависит от Meta), даже если сервер ответил 304;
+5. Meta отвечает 500 — все листы в errors, строки program_cache не тронуты (разбор без Meta не записан).
+Для каждого прогона печатается время, ответ sync-program-data и сколько WAL записала база.
+
+Запуск:
+    BENCH_DATABASE_URL=postgresql://postgres@localhost/bench python bench/conditional_sync.py --sheets 3 --etag
+'''
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+
+import psycopg2
+
+from _common import BENCH_DSN, post_event
+from parallel_sync import FIXTURES_DIR, META_GID, load_sync_module, seed_event
+
+
+class Sheets(BaseHTTPRequestHandler):
+    '''GET /<sheet>/export?format=csv&gid=<gid>: текущий текст листа, с ETag при use_etag'''
+
+    sheets: Dict[str, bytes] = {}
+    failing: set = set()
+    use_etag = False
+    not_modified = 0
+
+    def do_GET(self) -> None:
+        gid = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query).get('gid', [''])[0]
+        if gid not in self.sheets:
+            self.send_error(404)
+            return
+        if gid in self.failing:
+            self.send_error(500)
+            return
+        body = self.sheets[gid]
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        if self.use_etag and self.headers.get('If-None-Match') == etag:
+            Sheets.not_modified += 1
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/csv; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        if self.use_etag:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+def cache_rows(cur) -> Dict[str, tuple]:
+    cur.execute("SELECT sheet_gid, md5(data::text), last_updated, version FROM t_p73504605_landing_exhibition_m.program_cache WHERE event_id = 'bench'")
+    return {row[0]: row[1:] for row in cur.fetchall()}
+
+
+def wal_lsn(cur) -> str:
+    cur.execute('SELECT pg_current_wal_insert_lsn()::text')
+    return cur.fetchone()[0]
+
+
+def sync(module, cur, gids, step: str) -> Dict[str, tuple]:
+    lsn_before = wal_lsn(cur)
+    not_modified_before = Sheets.not_modified
+    started = time.perf_counter()
+    response = module.handler(post_event(json.dumps({'eventId': 'bench', 'sheetGids': gids, 'metaGid': META_GID})), None)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    assert response['statusCode'] == 200, response['body']
+    result = json.loads(response['body'])
+    cur.execute('SELECT pg_wal_lsn_diff(pg_current_wal_insert_lsn(), %s)', (lsn_before,))
+    print(json.dumps({
+        'step': step,
+        'ms': round(elapsed_ms, 1),
+        'changed': result['changed'],
+        'unchanged': result['unchanged'],
+        'versions': result['versions'],
+        'notModified': Sheets.not_modified - not_modified_before,
+        'walBytes': int(cur.fetchone()[0]),
+        'errors': result['errors'],
+    }, ensure_ascii=False))
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sheets', type=int, default=3, help='дневных листов')
+    parser.add_argument('--etag', action='store_true', help='сервер присылает ETag и отвечает 304')
+    args = parser.parse_args()
+
+    day = (FIXTURES_DIR / 'day1.csv').read_bytes()
+    gids = [str(index) for index in range(args.sheets)]
+    Sheets.sheets = {gid: day for gid in gids}
+    Sheets.sheets[META_GID] = (FIXTURES_DIR / 'meta.csv').read_bytes()
+    Sheets.use_etag = args.etag
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Sheets)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ['SHEETS_EXPORT_URL'] = f'http://127.0.0.1:{server.server_port}'
+    os.environ['DATABASE_URL'] = BENCH_DSN
+
+    seed_event()
+    module = load_sync_module()
+    conn = psycopg2.connect(BENCH_DSN)
+    conn.autocommit = True
+    cur = conn.cursor()
+
+    result = sync(module, cur, gids, 'first')
+    assert result['changed'] == gids
+    rows = cache_rows(cur)
+
+    result = sync(module, cur, gids, 'repeat')
+    assert result['unchanged'] == gids and not result['changed']
+    assert cache_rows(cur) == rows, 'неизменившиеся листы не должны переписываться'
+
+    Sheets.sheets[gids[0]] = day.replace('Кофе-брейк'.encode('utf-8'), 'Обед'.encode('utf-8'))
+    result = sync(module, cur, gids, 'one sheet edited')
+    assert result['changed'] == gids[:1] and result['versions'] == {gids[0]: 2}
+
+    Sheets.sheets[META_GID] = Sheets.sheets[META_GID].replace(b'28.10.2025', b'29.10.2025')
+    result = sync(module, cur, gids, 'meta edited')
+    assert result['changed'] == gids
+    rows = cache_rows(cur)
+
+    Sheets.failing = {META_GID}
+    result = sync(module, cur, gids, 'meta unavailable')
+    assert not result['changed'] and [error['gid'] for error in result['errors']] == gids
+    assert cache_rows(cur) == rows, 'сбой Meta не должен переписывать кеш'
+
+    conn.close()
+    server.shutdown()
@@ -0,0 +1,146 @@
+'''
+Бенчмарк живой статистики: панели организатора либо опрашивают get-stats каждые --poll секунд,
+либо держат long-poll watch-stats (LISTEN/NOTIFY от save-plan, STATS_NOTIFY=on). Во время прогона
+пользователи сохраняют планы с частотой --rate в секунду.
+
+Нагрузка на БД берётся из pg_stat_database (транзакции и прочитанные строки за прогон),
+пик соединений — из pg_stat_activity (watch-stats ждёт на одном общем соединении LISTEN),
+задержка — от сохранения до момента, когда сессия появилась на панели. В конце каждая панель
+режима watch должна совпасть с get-stats.
+
+Запуск:
+    BENCH_DATABASE_URL=postgresql://postgres@localhost/bench python bench/live_stats.py --dashboards 50
+'''
+
+import argparse
+import json
+import os
+import threading
+import time
+
+import psycopg2
+
+from _common import BENCH_DSN, load_handler, percentile, post_event, reset_database
+
+
+def database_activity():
+    conn = psycopg2.connect(BENCH_DSN)
+    cur = conn.cursor()
+    cur.execute('SELECT pg_stat_clear_snapshot()')
+    cur.execute('''
+        SELECT xact_commit + xact_rollback, tup_returned + tup_fetched
+        FROM pg_stat_database WHERE datname = current_database()
+    ''')
+    row = cur.fetchone()
+    conn.close()
+    return row
+
+
+def peak_connections(stop: threading.Event, peak: list) -> None:
+    '''Раз в 100 мс считает соединения с базой бенчмарка, кроме своего'''
+    conn = psycopg2.connect(BENCH_DSN)
+    conn.autocommit = True
+    cur = conn.cursor()
+    while not stop.is_set():
+        cur.execute('''
+            SELECT count(*) FROM pg_stat_activity
+            WHERE datname = current_database() AND pid <> pg_backend_pid()
+        ''')
+        peak[0] = max(peak[0], cur.fetchone()[0])
+        stop.wait(0.1)
+    conn.close()
+
+
+def run(mode: str, dashboards: int, duration: float, rate: float, poll: float) -> None:
+    reset_database()
+    os.environ['DATABASE_URL'] = BENCH_DSN
+    os.environ['STATS_WRITE_MODE'] = 'direct'
+    # NOTIFY нужен только панелям watch; опрос get-stats обходится версией для ETag
+    os.environ['STATS_NOTIFY'] = 'on' if mode == 'watch' else 'off'
+    save_plan = load_handler('save-plan')
+    get_stats = load_handler('get-stats')
+    watch_stats = load_handler('watch-stats')
+
+    saved_at = {}
+    latencies = []
+    requests = [0]
+    states = []
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def dashboard() -> None:
+        state = {}
+        states.append(state)
+        cursor = None
+        while not stop.is_set():
+            if mode == 'watch':
+                params = {'eventId': 'bench', 'timeout': '5'}
+                if cursor:
+                    params['cursor'] = cursor
+                body = json.loads(watch_stats({'httpMethod': 'GET', 'queryStringParameters': params}, None)['body'])
+                cursor = body['cursor']
+            else:
+                response = get_stats({'httpMethod': 'GET', 'queryStringParameters': {'eventId': 'bench'}}, None)
+                body = json.loads(response['body'])
+            seen_at = time.perf_counter()
+            with lock:
+                requests[0] += 1
+                for row in body['sessions']:
+                    if row['session_id'] not in state and row['session_id'] in saved_at:
+                        latencies.append((seen_at - saved_at[row['session_id']]) * 1000)
+                    state[row['session_id']] = row['interest_count']
+            if mode == 'poll':
+                stop.wait(poll)
+
+    def saver() -> None:
+        index = 0
+        while not stop.is_set():
+            session_id = f'28.10.2025|ЗАЛ {index % 5}|10:00|{index}'
+            body = json.dumps({'eventId': 'bench', 'userId': f'user-{index}', 'sessionIds': [session_id]})
+            with lock:
+                saved_at[session_id] = time.perf_counter()
+            save_plan(post_event(body), None)
+            index += 1
+            stop.wait(1.0 / rate)
+
+    before = database_activity()
+    peak = [0]
+    threads = [threading.Thread(target=dashboard) for _ in range(dashboards)] + [threading.Thread(target=saver)]
+    threads.append(threading.Thread(target=peak_connections, args=(stop, peak)))
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    after = database_activity()
+
+    truth = {
+        row['session_id']: row['interest_count']
+        for row in json.loads(get_stats({'httpMethod': 'GET', 'queryStringParameters': {'eventId': 'bench'}}, None)['body'])['sessions']
+    }
+    stale = sum(1 for state in states if state != truth)
+
+    print(f'{mode:>6} {len(saved_at):>6} {requests[0]:>9} {after[0] - before[0]:>9} {after[1] - before[1]:>11} '
+          f'{peak[0]:>6} {percentile(latencies, 50):>8.0f} {percentile(latencies, 95):>8.0f} {stale:>6}')
+    if mode == 'watch':
+        # Последнее сохранение после остановки могло не дойти до панели — сверяем ещё одним запросом
+        for state in states:
+            body = json.loads(watch_stats({'httpMethod': 'GET', 'queryStringParameters': {'eventId': 'bench', 'timeout': '0'}}, None)['body'])
+            state.update({row['session_id']: row['interest_count'] for row in body['sessions']})
+        assert all(state == truth for state in states), 'dashboard state differs from get-stats'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dashboards', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=20.0, help='секунд на режим')
+    parser.add_argument('--rate', type=float, default=5.0, help='сохранений в секунду')
+    parser.add_argument('--poll', type=float, default=2.0, help='интервал опроса get-stats, секунд')
+    parser.add_argument('--modes', default='poll,watch')
+    args = parser.parse_args()
+
+    print(f'{"mode":>6} {"saves":>6} {"requests":>9} {"db xacts":>9} {"rows read":>11} '
+          f'{"conns":>6} {"p50 ms":>8} {"p95 ms":>8} {"stale":>6}')
+    for mode in args.modes.split(','):
+        run(mode, args.dashboards, args.duration, args.rate, args.poll)
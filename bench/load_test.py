@@ -0,0 +1,253 @@
+'''
+Нагрузочный прогон backend по сценариям из backend/<функция>/tests.json.
+
+Профиль из bench/profiles.json задаёт веса: "функция" — все её сценарии с ожидаемым 2xx поровну,
+"функция:Название теста" — один сценарий. Например, conference-morning: 70% get-plan,
+25% save-plan, 5% get-stats. --concurrency потоков выбирают сценарии по весам и шлют их:
+по умолчанию прямо в handler функций (как tools/dev_server.py, в этом же процессе),
+с --url — по HTTP в запущенный tools/dev_server.py.
+
+userId в сценариях заменяется на одного из --users участников, чтобы запросы не упирались
+в одну строку; перед прогоном у каждого участника сохраняется план, а успешные POST/PUT-сценарии
+функций профиля выполняются по разу (создают мероприятие и т.п.).
+
+Результат — JSON: пропускная способность и p50/p95/p99 по каждой функции и в целом,
+ответ с кодом не из tests.json считается ошибкой.
+
+Запуск:
+    BENCH_DATABASE_URL=postgresql://postgres@localhost/bench python bench/load_test.py \
+        --profile conference-morning --concurrency 16 --duration 30 -o results.json
+'''
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urlsplit, parse_qsl
+
+from _common import BACKEND_DIR, BENCH_DSN, ROOT, percentile, reset_database
+
+sys.path.insert(0, str(ROOT / 'tools'))
+from dev_server import build_event, load_function  # noqa: E402
+
+PROFILES_PATH = ROOT / 'bench' / 'profiles.json'
+
+
+def load_scenarios(function_name: str) -> List[Dict[str, Any]]:
+    tests_path = BACKEND_DIR / function_name / 'tests.json'
+    return json.loads(tests_path.read_text(encoding='utf-8'))['tests']
+
+
+def resolve_profile(weights: Dict[str, float]) -> List[Tuple[str, Dict[str, Any], float]]:
+    '''(функция, сценарий, вес) для каждого ключа профиля'''
+    resolved = []
+    for key, weight in weights.items():
+        function_name, _, test_name = key.partition(':')
+        scenarios = load_scenarios(function_name)
+        if test_name:
+            chosen = [scenario for scenario in scenarios if scenario['name'] == test_name]
+            if not chosen:
+                raise SystemExit(f'{function_name}/tests.json has no test named {test_name!r}')
+        else:
+            chosen = [scenario for scenario in scenarios if 200 <= scenario['expectedStatus'] < 300]
+            if not chosen:
+                raise SystemExit(f'{function_name}/tests.json has no 2xx scenarios')
+        for scenario in chosen:
+            resolved.append((function_name, scenario, weight / len(chosen)))
+    return resolved
+
+
+def request_parts(scenario: Dict[str, Any], user_id: Optional[str]) -> Tuple[str, str, bytes]:
+    '''Метод, путь с query и тело сценария; userId подменяется на user_id'''
+    url = urlsplit(scenario.get('path') or '/')
+    query = dict(parse_qsl(url.query, keep_blank_values=True))
+    query.update(scenario.get('queryParams') or {})
+    body = scenario.get('body')
+    if user_id is not None:
+        if 'userId' in query:
+            query['userId'] = user_id
+        if isinstance(body, dict) and 'userId' in body:
+            body = dict(body, userId=user_id)
+    path = (url.path or '/') + ('?' + urlencode(query) if query else '')
+    data = json.dumps(body).encode('utf-8') if body is not None else b''
+    return scenario['method'], path, data
+
+
+class InProcessClient:
+    '''Вызывает handler функций напрямую, событие строится так же, как в tools/dev_server.py'''
+
+    def __init__(self, function_names: List[str]):
+        self.handlers = {name: load_function(BACKEND_DIR / name) for name in function_names}
+
+    def call(self, function_name: str, method: str, path: str, body: bytes) -> int:
+        headers = {'Content-Type': 'application/json'}
+        _, event = build_event(method, f'/{function_name}{path}', headers, body, '127.0.0.1')
+        return int(self.handlers[function_name](event, None).get('statusCode', 200))
+
+
+class HttpClient:
+    '''Шлёт запросы в запущенный tools/dev_server.py'''
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip('/')
+
+    def call(self, function_name: str, method: str, path: str, body: bytes) -> int:
+        request = urllib.request.Request(
+            f'{self.base_url}/{function_name}{path}',
+            data=body or None,
+            method=method,
+            headers={'Content-Type': 'application/json'}
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+
+
+def seed(client, resolved, users: int) -> None:
+    '''Разовые успешные POST/PUT-сценарии функций профиля и по плану у каждого участника'''
+    for function_name in sorted({function_name for function_name, _, _ in resolved}):
+        for scenario in load_scenarios(function_name):
+            if scenario['method'] in ('POST', 'PUT') and 200 <= scenario['expectedStatus'] < 300:
+                client.call(function_name, *request_parts(scenario, None))
+    if any('userId' in json.dumps(scenario) for _, scenario, _ in resolved):
+        save_plan = next(s for s in load_scenarios('save-plan') if s['name'] == 'Save new user plan')
+        seeder = client if isinstance(client, HttpClient) else InProcessClient(['save-plan'])
+        for index in range(users):
+            status = seeder.call('save-plan', *request_parts(save_plan, f'user-{index}'))
+            assert status == 200, f'seeding plan for user-{index} returned {status}'
+
+
+def summarize(samples: List[Tuple[str, float, bool, int]], elapsed: float) -> Dict[str, Any]:
+    def block(rows):
+        latencies = [latency for _, latency, _, _ in rows]
+        statuses: Dict[str, int] = {}
+        for _, _, _, status in rows:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        return {
+            'requests': len(rows),
+            'errors': sum(1 for _, _, ok, _ in rows if not ok),
+            'throughput_rps': round(len(rows) / elapsed, 1) if elapsed else 0.0,
+            'p50_ms': round(percentile(latencies, 50), 3),
+            'p95_ms': round(percentile(latencies, 95), 3),
+            'p99_ms': round(percentile(latencies, 99), 3),
+            'status': statuses
+        }
+
+    endpoints = {}
+    for function_name in sorted({row[0] for row in samples}):
+        endpoints[function_name] = block([row for row in samples if row[0] == function_name])
+    return {'total': block(samples), 'endpoints': endpoints}
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args) -> Dict[str, Any]:
+    profiles = json.loads(PROFILES_PATH.read_text(encoding='utf-8'))
+    if args.profile not in profiles:
+        raise SystemExit(f'unknown profile {args.profile!r}, expected one of: {", ".join(profiles)}')
+    weights = profiles[args.profile]
+    resolved = resolve_profile(weights)
+
+    if args.url:
+        client = HttpClient(args.url)
+    else:
+        if not args.keep_database:
+            reset_database()
+        os.environ['DATABASE_URL'] = BENCH_DSN
+        client = InProcessClient(sorted({function_name for function_name, _, _ in resolved}))
+    seed(client, resolved, args.users)
+
+    population = [(function_name, scenario) for function_name, scenario, _ in resolved]
+    population_weights = [weight for _, _, weight in resolved]
+    samples: List[Tuple[str, float, bool, int]] = []
+    lock = threading.Lock()
+    started = time.perf_counter()
+    measure_from = started + args.warmup
+    stop_at = measure_from + args.duration
+    remaining = [args.requests] if args.requests else None
+
+    def worker(worker_index: int) -> None:
+        rng = random.Random(args.seed * 1000 + worker_index)
+        local: List[Tuple[str, float, bool, int]] = []
+        while True:
+            now = time.perf_counter()
+            if remaining is None and now >= stop_at:
+                break
+            if remaining is not None and now >= measure_from:
+                with lock:
+                    if remaining[0] <= 0:
+                        break
+                    remaining[0] -= 1
+            function_name, scenario = rng.choices(population, population_weights)[0]
+            parts = request_parts(scenario, f'user-{rng.randrange(args.users)}')
+            request_started = time.perf_counter()
+            try:
+                status = client.call(function_name, *parts)
+            except Exception:
+                status = 0
+            finished = time.perf_counter()
+            if request_started >= measure_from:
+                local.append((function_name, (finished - request_started) * 1000,
+                              status == scenario['expectedStatus'], status))
+        with lock:
+            samples.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - max(measure_from, started)
+
+    return {
+        'profile': args.profile,
+        'weights': weights,
+        'mode': 'http' if args.url else 'in-process',
+        'concurrency': args.concurrency,
+        'users': args.users,
+        'duration_s': round(elapsed, 3),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        **summarize(samples, elapsed)
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--profile', default='conference-morning', help='профиль из bench/profiles.json')
+    parser.add_argument('--concurrency', type=int, default=8, help='параллельных клиентов')
+    parser.add_argument('--duration', type=float, default=20.0, help='секунд замера')
+    parser.add_argument('--requests', type=int, help='вместо --duration: всего запросов в замере')
+    parser.add_argument('--warmup', type=float, default=2.0, help='секунд прогрева, не входят в замер')
+    parser.add_argument('--users', type=int, default=500, help='участников, на которых подменяется userId')
+    parser.add_argument('--seed', type=int, default=1, help='seed выбора сценариев')
+    parser.add_argument('--url', help='адрес tools/dev_server.py вместо вызова handler в процессе')
+    parser.add_argument('--keep-database', action='store_true', help='не пересоздавать схему перед прогоном')
+    parser.add_argument('-o', '--output', help='файл для JSON (по умолчанию stdout)')
+    args = parser.parse_args()
+
+    result = json.dumps(run(args), ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as out:
+            out.write(result + '\n')
+    else:
+        print(result)
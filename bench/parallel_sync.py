@@ -0,0 +1,149 @@
+'''
+Бенчмарк параллельной загрузки листов в sync-program-data.
+
+Вместо Google Sheets отвечает локальный HTTP-сервер (SHEETS_EXPORT_URL): каждый лист отдаётся
+с заданной задержкой (--delays, секунды, по листу на значение; лист Meta — --meta-delay).
+Синхронизация прогоняется при MAX_PARALLEL_FETCHES = 1 (как раньше, по очереди) и с пулом по
+умолчанию; печатается время всей синхронизации рядом с суммой задержек и самым медленным листом.
+Последний прогон — лист, который отвечает дольше SHEET_TIMEOUT_SECONDS: он попадает в errors,
+остальные синхронизируются.
+
+--no-db вызывает только fetch_sheets, без handler и без Postgres.
+
+Запуск:
+    BENCH_DATABASE_URL=postgresql://postgres@localhost/bench python bench/parallel_sync.py --delays 0.3,0.6,0.9,1.2
+'''
+
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict
+
+import psycopg2
+
+from _common import BACKEND_DIR, BENCH_DSN, post_event, reset_database
+
+FIXTURES_DIR = Path(__file__).resolve().parent / 'fixtures' / 'sheets'
+SHEET_ID = 'bench-sheet'
+META_GID = 'meta'
+
+
+class DelayedSheets(BaseHTTPRequestHandler):
+    '''GET /<sheet>/export?format=csv&gid=<gid>: лист из fixtures после задержки для gid'''
+
+    delays: Dict[str, float] = {}
+
+    def do_GET(self) -> None:
+        gid = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query).get('gid', [''])[0]
+        if gid not in self.delays:
+            self.send_error(404)
+            return
+        time.sleep(self.delays[gid])
+        body = (FIXTURES_DIR / ('meta.csv' if gid == META_GID else 'day1.csv')).read_bytes()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/csv; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+def load_sync_module():
+    function_dir = BACKEND_DIR / 'sync-program-data'
+    if str(function_dir) not in sys.path:
+        sys.path.insert(0, str(function_dir))
+    spec = importlib.util.spec_from_file_location('bench_sync_program_data', function_dir / 'index.py')
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def seed_event() -> None:
+    reset_database()
+    conn = psycopg2.connect(BENCH_DSN)
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute(
+        'INSERT INTO t_p73504605_landing_exhibition_m.program_events (id, name, sheet_url) VALUES (%s, %s, %s)',
+        ('bench', 'Bench', f'https://docs.google.com/spreadsheets/d/{SHEET_ID}/edit')
+    )
+    conn.close()
+
+
+def run_sync(module, gids, use_db: bool):
+    started = time.perf_counter()
+    if use_db:
+        body = json.dumps({'eventId': 'bench', 'sheetGids': gids, 'metaGid': META_GID})
+        response = module.handler(post_event(body), None)
+        assert response['statusCode'] == 200, response['body']
+        result = json.loads(response['body'])
+        synced, errors = result['synced'], result['errors']
+    else:
+        fetched = module.program_sync.fetch_sheets(SHEET_ID, gids + [META_GID], {})
+        synced = [gid for gid in gids if not isinstance(fetched[gid], Exception)]
+        errors = [{'gid': gid, 'error': str(fetched[gid])} for gid in gids if gid not in synced]
+    return (time.perf_counter() - started) * 1000, synced, errors
+
+
+def report(mode: str, delays: Dict[str, float], elapsed_ms: float, synced, errors) -> None:
+    print(json.dumps({
+        'mode': mode,
+        'sheets': len(delays) - 1,
+        'sumMs': round(sum(delays.values()) * 1000),
+        'slowestMs': round(max(delays.values()) * 1000),
+        'totalMs': round(elapsed_ms),
+        'synced': len(synced),
+        'errors': [error['gid'] for error in errors],
+    }))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--delays', default='0.3,0.6,0.9,1.2', help='задержка ответа по каждому дневному листу, с')
+    parser.add_argument('--meta-delay', type=float, default=0.2)
+    parser.add_argument('--timeout', type=float, default=1.5, help='SHEET_TIMEOUT_SECONDS для прогона с таймаутом')
+    parser.add_argument('--no-db', action='store_true', help='только загрузка листов, без handler')
+    args = parser.parse_args()
+
+    day_delays = [float(x) for x in args.delays.split(',')]
+    gids = [str(index) for index in range(len(day_delays))]
+    DelayedSheets.delays = dict(zip(gids, day_delays), **{META_GID: args.meta_delay})
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), DelayedSheets)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ['SHEETS_EXPORT_URL'] = f'http://127.0.0.1:{server.server_port}'
+    os.environ['DATABASE_URL'] = BENCH_DSN
+
+    if not args.no_db:
+        seed_event()
+    module = load_sync_module()
+    parallel = module.program_sync.MAX_PARALLEL_FETCHES
+
+    module.program_sync.MAX_PARALLEL_FETCHES = 1
+    report('sequential', DelayedSheets.delays, *run_sync(module, gids, not args.no_db))
+
+    module.program_sync.MAX_PARALLEL_FETCHES = parallel
+    elapsed_ms, synced, errors = run_sync(module, gids, not args.no_db)
+    report(f'parallel-{parallel}', DelayedSheets.delays, elapsed_ms, synced, errors)
+    assert not errors, errors
+    if len(DelayedSheets.delays) <= parallel:
+        assert elapsed_ms < max(DelayedSheets.delays.values()) * 1000 * 1.5, \
+            'параллельная синхронизация должна занимать около времени самого медленного листа'
+
+    # Лист дольше таймаута: ошибка только по нему, остальные синхронизируются
+    module.program_sync.SHEET_TIMEOUT_SECONDS = args.timeout
+    DelayedSheets.delays['slow'] = args.timeout * 2
+    elapsed_ms, synced, errors = run_sync(module, gids + ['slow'], not args.no_db)
+    report(f'timeout-{args.timeout}s', DelayedSheets.delays, elapsed_ms, synced, errors)
+    assert [error['gid'] for error in errors] == ['slow'] and len(synced) == len(gids), errors
+
+    server.shutdown()
@@ -0,0 +1,103 @@
+'''
+Бенчмарк запросов program-events / get-program-data / sync-program-data: прежний текст SQL
+с подставленными через replace значениями против подготовленных запросов backend/*/queries.py.
+
+Горячие чтения (событие по id, кеш листа с настройками мероприятия) и запись кеша с CSV размера --csv-kb.
+Соединение одно на весь прогон, как в тёплом контейнере.
+
+Запуск:
+    BENCH_DATABASE_URL=postgresql://postgres@localhost/bench python bench/prepared_queries.py
+'''
+
+import argparse
+import json
+import sys
+import time
+
+import psycopg2
+from psycopg2.extras import Json
+
+from _common import BACKEND_DIR, BENCH_DSN, percentile, reset_database
+
+sys.path.insert(0, str(BACKEND_DIR / 'program-events'))
+import queries  # noqa: E402
+
+
+def literal_event_get(cur, event_id):
+    safe_id = event_id.replace("'", "''")
+    cur.execute(f"SELECT id, name, sheet_url, logo_url, cover_url, day_sheets, created_at FROM t_p73504605_landing_exhibition_m.program_events WHERE id = '{safe_id}'")
+
+
+def literal_cache_get(cur, event_id, gid):
+    safe_event_id = event_id.replace("'", "''")
+    safe_gid = gid.replace("'", "''")
+    cur.execute(f"""
+        SELECT data, last_updated
+        FROM t_p73504605_landing_exhibition_m.program_cache
+        WHERE event_id = '{safe_event_id}'
+          AND sheet_gid = '{safe_gid}'
+          AND last_updated > LOCALTIMESTAMP - INTERVAL '5 minutes'
+    """)
+
+
+def literal_cache_upsert(cur, event_id, gid, data):
+    safe_event_id = event_id.replace("'", "''")
+    safe_gid = gid.replace("'", "''")
+    data_json = json.dumps(data).replace("'", "''")
+    cur.execute(f"""
+        INSERT INTO t_p73504605_landing_exhibition_m.program_cache (event_id, sheet_gid, data, last_updated)
+        VALUES ('{safe_event_id}', '{safe_gid}', '{data_json}', CURRENT_TIMESTAMP)
+        ON CONFLICT (event_id, sheet_gid)
+        DO UPDATE SET data = '{data_json}', last_updated = CURRENT_TIMESTAMP
+    """)
+
+
+def measure(call, repeats):
+    timings = []
+    for attempt in range(repeats):
+        started = time.perf_counter()
+        call(attempt)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def run(repeats: int, csv_kb: int) -> None:
+    reset_database()
+    conn = psycopg2.connect(BENCH_DSN)
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute('''
+        INSERT INTO t_p73504605_landing_exhibition_m.program_events (id, name, sheet_url)
+        SELECT 'event-' || n, 'Event ' || n, 'https://docs.google.com/spreadsheets/d/sheet' || n || '/edit'
+        FROM generate_series(1, 1000) n
+    ''')
+    row = "28.10.2025,ЗАЛ 1,10:00,10:45,Доклад о выставках,Иван O'Brien\n"
+    csv = row * (csv_kb * 1024 // len(row.encode('utf-8')))
+    data = {'sheetId': 'sheet1', 'gid': '0', 'csvContent': csv, 'syncedAt': '2025-10-01T10:00:00'}
+    literal_cache_upsert(cur, 'event-1', '0', data)
+
+    cases = [
+        ('event by id', lambda i: literal_event_get(cur, f'event-{i % 1000 + 1}'),
+         lambda i: queries.execute(cur, 'event_get', (f'event-{i % 1000 + 1}',))),
+        ('cache of sheet', lambda i: literal_cache_get(cur, 'event-1', '0'),
+         lambda i: queries.execute(cur, 'cache_state', ('event-1', '0', 300, 3600))),
+        (f'upsert {csv_kb} KB', lambda i: literal_cache_upsert(cur, 'event-1', '0', data),
+         lambda i: queries.execute(cur, 'cache_sync_upsert', ('event-1', '0', Json(data), None, None, None, None))),
+    ]
+    for name, literal, prepared in cases:
+        for mode, call in (('literal', literal), ('prepared', prepared)):
+            timings = measure(lambda i: (call(i), cur.fetchall() if cur.description else None), repeats)
+            print(f'{name:>14} {mode:>9} {percentile(timings, 50):>9.3f} {percentile(timings, 99):>9.3f}')
+
+    cur.close()
+    conn.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeats', type=int, default=2000)
+    parser.add_argument('--csv-kb', type=int, default=256, help='размер CSV в кеше, КБ')
+    args = parser.parse_args()
+
+    print(f'{"query":>14} {"mode":>9} {"p50 ms":>9} {"p99 ms":>9}')
+    run(args.repeats, args.csv_kb)
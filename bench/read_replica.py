@@ -0,0 +1,135 @@
+'''
+Проверка чтения из реплики (DATABASE_READ_URL в backend/*/db.py) на двух локальных Postgres:
+основной базе BENCH_DATABASE_URL и её потоковой реплике BENCH_REPLICA_URL.
+
+1. Проигрывание WAL на реплике ставится на паузу, save-plan меняет план: get-plan без флага
+   отдаёт старый план (читает реплику), с readYourWrites=1 — новый (читает основную базу).
+2. Реплика обрывает соединения из пула (pg_terminate_backend): get-plan не падает, а повторяет
+   чтение в основной базе, и реплика не пробуется следующие REPLICA_RETRY_SECONDS.
+3. DATABASE_READ_URL указывает на порт, где никто не слушает: чтения уходят в основную базу,
+   а реплика не пробуется следующие REPLICA_RETRY_SECONDS.
+Для каждого случая печатаются p50/p99 get-plan.
+
+Подготовка реплики:
+    pg_basebackup -D /tmp/replica -R -X stream && pg_ctl -D /tmp/replica -o '-p 5433' start
+Запуск:
+    BENCH_DATABASE_URL=postgresql://postgres@localhost:5432/bench \
+    BENCH_REPLICA_URL=postgresql://postgres@localhost:5433/bench python bench/read_replica.py
+'''
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import psycopg2
+
+from _common import BENCH_DSN, load_handler, percentile, post_event, reset_database
+
+REPLICA_DSN = os.environ.get('BENCH_REPLICA_URL', 'postgresql://postgres@localhost:5433/postgres')
+
+
+def wait_for_replay(replica) -> None:
+    '''Ждёт, пока реплика проиграет WAL основной базы на текущий момент'''
+    primary = psycopg2.connect(BENCH_DSN)
+    primary.autocommit = True
+    cur = primary.cursor()
+    cur.execute('SELECT pg_current_wal_lsn()')
+    target = cur.fetchone()[0]
+    primary.close()
+    cur = replica.cursor()
+    while True:
+        cur.execute('SELECT pg_last_wal_replay_lsn() >= %s::pg_lsn', (target,))
+        if cur.fetchone()[0]:
+            return
+        time.sleep(0.01)
+
+
+def plan_of(get_plan, flag: bool):
+    params = {'eventId': 'bench', 'userId': 'user-0'}
+    if flag:
+        params['readYourWrites'] = '1'
+    response = get_plan({'httpMethod': 'GET', 'queryStringParameters': params}, None)
+    assert response['statusCode'] == 200, response['body']
+    return json.loads(response['body'])
+
+
+def timings(get_plan, requests: int, flag: bool):
+    values = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        plan_of(get_plan, flag)
+        values.append((time.perf_counter() - started) * 1000)
+    return values
+
+
+def report(name: str, values) -> None:
+    print(f'{name:>34} {percentile(values, 50):>9.2f} {percentile(values, 99):>9.2f}')
+
+
+def run(requests: int) -> None:
+    reset_database()
+    os.environ['DATABASE_URL'] = BENCH_DSN
+    os.environ['DATABASE_READ_URL'] = REPLICA_DSN
+    save_plan = load_handler('save-plan')
+    get_plan = load_handler('get-plan')
+    db = sys.modules['db']
+
+    replica = psycopg2.connect(REPLICA_DSN)
+    replica.autocommit = True
+    cur = replica.cursor()
+    cur.execute('SELECT pg_is_in_recovery()')
+    assert cur.fetchone()[0], 'BENCH_REPLICA_URL must point to a standby of BENCH_DATABASE_URL'
+
+    first = ['28.10.2025|ЗАЛ 1|10:00|10:45']
+    second = ['28.10.2025|ЗАЛ 2|11:00|11:45']
+    body = json.dumps({'eventId': 'bench', 'userId': 'user-0', 'sessionIds': first})
+    assert save_plan(post_event(body), None)['statusCode'] == 200
+    wait_for_replay(replica)
+
+    # 1. Реплика отстаёт: без флага виден старый план, с флагом — новый
+    cur.execute('SELECT pg_wal_replay_pause()')
+    try:
+        body = json.dumps({'eventId': 'bench', 'userId': 'user-0', 'sessionIds': second})
+        assert save_plan(post_event(body), None)['statusCode'] == 200
+        stale = plan_of(get_plan, False)
+        fresh = plan_of(get_plan, True)
+    finally:
+        cur.execute('SELECT pg_wal_replay_resume()')
+    print(f'replica read while replay paused:  {stale}')
+    print(f'readYourWrites=1 while paused:     {fresh}')
+    assert stale.get('sessionIds') == first, 'read did not go to the replica'
+    assert fresh.get('sessionIds') == second, 'readYourWrites did not go to the primary'
+    wait_for_replay(replica)
+
+    print(f'{"case":>34} {"p50 ms":>9} {"p99 ms":>9}')
+    report('replica', timings(get_plan, requests, False))
+    report('readYourWrites=1 (primary)', timings(get_plan, requests, True))
+
+    # 2. Реплика оборвала соединение посреди работы: чтение повторяется в основной базе
+    cur.execute('''
+        SELECT pg_terminate_backend(pid) FROM pg_stat_activity
+        WHERE backend_type = 'client backend' AND pid <> pg_backend_pid()
+    ''')
+    started = time.perf_counter()
+    assert plan_of(get_plan, False).get('sessionIds') == second
+    report('replica dropped, retry on primary', [(time.perf_counter() - started) * 1000])
+    assert time.monotonic() < db._replica_down_until, 'replica was not marked down after a failed read'
+
+    # 3. Реплика недоступна: первый запрос пробует подключиться, дальше сразу основная база
+    db.close_all()
+    os.environ['DATABASE_READ_URL'] = 'postgresql://postgres@127.0.0.1:1/postgres'
+    started = time.perf_counter()
+    assert plan_of(get_plan, False).get('sessionIds') == second
+    report('replica down, first request', [(time.perf_counter() - started) * 1000])
+    report('replica down, fallback', timings(get_plan, requests, False))
+    cur.close()
+    replica.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=500)
+    args = parser.parse_args()
+    run(args.requests)
@@ -0,0 +1,52 @@
+'''
+Бенчмарк save-plan: как число запросов к БД и задержка растут с размером плана.
+
+Для каждого размера N пользователь сначала сохраняет план из N докладов,
+затем заменяет его на N других (N добавлений + N удалений за одно сохранение).
+
+Запуск:
+    BENCH_DATABASE_URL=postgresql://postgres@localhost/bench python bench/save_plan_batch.py --rtt-ms 1
+'''
+
+import argparse
+import json
+import os
+import statistics
+import time
+
+from _common import BENCH_DSN, RoundTripCounter, load_handler, percentile, post_event, reset_database
+
+
+def run(sizes, repeats: int, rtt_ms: float) -> None:
+    reset_database()
+    os.environ['DATABASE_URL'] = BENCH_DSN
+    handler = load_handler('save-plan')
+
+    print(f'{"plan size":>10} {"round trips":>12} {"p50 ms":>9} {"p95 ms":>9}')
+    with RoundTripCounter(rtt_ms) as counter:
+        for size in sizes:
+            timings = []
+            trips = []
+            for attempt in range(repeats):
+                user_id = f'bench-{size}-{attempt}'
+                first = [f'day1|HALL {i % 5}|{i:04d}|a' for i in range(size)]
+                second = [f'day1|HALL {i % 5}|{i:04d}|b' for i in range(size)]
+                for plan in (first, second):
+                    body = json.dumps({'eventId': 'bench', 'userId': user_id, 'sessionIds': plan})
+                    counter.take()
+                    started = time.perf_counter()
+                    response = handler(post_event(body), None)
+                    timings.append((time.perf_counter() - started) * 1000)
+                    trips.append(counter.take())
+                    assert response['statusCode'] == 200, response['body']
+            print(f'{size:>10} {statistics.median(trips):>12.0f} '
+                  f'{percentile(timings, 50):>9.2f} {percentile(timings, 95):>9.2f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1,5,10,20,30,50', help='размеры плана через запятую')
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--rtt-ms', type=float, default=0.0, help='имитация сетевой задержки на каждый запрос')
+    args = parser.parse_args()
+    run([int(size) for size in args.sizes.split(',')], args.repeats, args.rtt_ms)
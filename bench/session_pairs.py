@@ -0,0 +1,92 @@
+'''
+Бенчмарк поддержки session_pairs в save-plan: задержка сохранения одной операции
+(добавить или убрать сессию через ops) в зависимости от размера плана.
+
+Пары считаются от дельты, поэтому операция трогает не больше --sizes строк session_pairs,
+а не пересчитывает все пары плана; для сравнения печатается время ручного пересчёта
+пар всех планов мероприятия одним unnest × unnest ... GROUP BY.
+
+Запуск:
+    BENCH_DATABASE_URL=postgresql://postgres@localhost/bench python bench/session_pairs.py --sizes 5,10,20,40,80
+'''
+
+import argparse
+import json
+import os
+import time
+
+import psycopg2
+
+from _common import BENCH_DSN, SCHEMA, load_handler, percentile, post_event, reset_database
+
+SESSIONS = [f'28.10.2025|ЗАЛ {hall}|{hour:02d}:{minute:02d}|{hour:02d}:{minute + 25:02d}'
+            for hall in range(10) for hour in range(9, 19) for minute in (0, 30)]
+
+RECOMPUTE_PAIRS = f'''
+    SELECT a.session_key, b.session_key, COUNT(DISTINCT p.id)
+    FROM {SCHEMA}.user_plans p
+    CROSS JOIN unnest(p.session_keys) AS a(session_key)
+    CROSS JOIN unnest(p.session_keys) AS b(session_key)
+    WHERE p.event_id = 'bench' AND a.session_key < b.session_key
+    GROUP BY 1, 2
+'''
+
+
+def run(size: int, users: int, repeats: int) -> None:
+    reset_database()
+    os.environ['DATABASE_URL'] = BENCH_DSN
+    os.environ['STATS_WRITE_MODE'] = 'direct'
+    save_plan = load_handler('save-plan')
+
+    for index in range(users):
+        plan = [SESSIONS[(index * 7 + offset) % len(SESSIONS)] for offset in range(size)]
+        body = json.dumps({'eventId': 'bench', 'userId': f'user-{index}', 'sessionIds': plan})
+        assert save_plan(post_event(body), None)['statusCode'] == 200
+
+    timings = []
+    for attempt in range(repeats):
+        index = attempt % users
+        extra = SESSIONS[(index * 7 + size) % len(SESSIONS)]
+        for op in ('add', 'remove'):
+            body = json.dumps({
+                'eventId': 'bench',
+                'userId': f'user-{index}',
+                'ops': [{'opId': f'{op}-{attempt}', 'op': op, 'sessionId': extra, 'clientTs': attempt}]
+            })
+            started = time.perf_counter()
+            response = save_plan(post_event(body), None)
+            timings.append((time.perf_counter() - started) * 1000)
+            assert response['statusCode'] == 200, response['body']
+
+    conn = psycopg2.connect(BENCH_DSN)
+    cur = conn.cursor()
+    started = time.perf_counter()
+    cur.execute(RECOMPUTE_PAIRS)
+    expected = {(row[0], row[1]): row[2] for row in cur.fetchall()}
+    recompute_ms = (time.perf_counter() - started) * 1000
+    cur.execute(f'''
+        SELECT session_a, session_b, SUM(pair_count)
+        FROM {SCHEMA}.session_pairs
+        WHERE event_id = 'bench'
+        GROUP BY 1, 2
+        HAVING SUM(pair_count) > 0
+    ''')
+    maintained = {(row[0], row[1]): row[2] for row in cur.fetchall()}
+    cur.close()
+    conn.close()
+
+    print(f'{size:>6} {percentile(timings, 50):>9.2f} {percentile(timings, 95):>9.2f} '
+          f'{size:>10} {recompute_ms:>13.1f}')
+    assert maintained == expected, 'session_pairs differs from recomputed pairs'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='5,10,20,40,80', help='размеры планов')
+    parser.add_argument('--users', type=int, default=500, help='число планов мероприятия')
+    parser.add_argument('--repeats', type=int, default=100, help='пар операций add/remove на размер')
+    args = parser.parse_args()
+
+    print(f'{"plan":>6} {"p50 ms":>9} {"p95 ms":>9} {"pair rows":>10} {"recompute ms":>13}')
+    for size in args.sizes.split(','):
+        run(int(size), args.users, args.repeats)
@@ -0,0 +1,94 @@
+'''
+Проверка серверного разбора листов программы (backend/sync-program-data/sheets_parser.py).
+
+1. Golden-файлы: fixtures/sheets/*.golden.json получены из fetchProgramData в
+   src/utils/googleSheetsParser.ts на CSV из той же папки (cases.json: лист, лист Meta, ожидаемый
+   результат, поле now выброшено). Python-порт обязан выдать то же самое, в первую очередь те же ID.
+2. Время разбора листа на --rows строк: столько раньше тратил каждый клиент при загрузке программы,
+   теперь — один раз sync-program-data.
+
+Запуск:
+    python bench/sheet_parsing.py --rows 300,1000
+
+После правки googleSheetsParser.ts golden-файлы пересобираются из TS-парсера на тех же CSV.
+'''
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Без _common: проверке не нужны ни psycopg2, ни локальный Postgres
+BENCH_DIR = Path(__file__).resolve().parent
+FIXTURES_DIR = BENCH_DIR / 'fixtures' / 'sheets'
+
+sys.path.insert(0, str(BENCH_DIR.parent / 'backend' / 'sync-program-data'))
+import sheets_parser  # noqa: E402
+
+
+def check_golden() -> bool:
+    ok = True
+    for case in json.loads((FIXTURES_DIR / 'cases.json').read_text(encoding='utf-8')):
+        csv_text = (FIXTURES_DIR / case['csv']).read_text(encoding='utf-8')
+        meta = sheets_parser.parse_meta((FIXTURES_DIR / case['meta']).read_text(encoding='utf-8')) \
+            if case['meta'] else {}
+        expected = json.loads((FIXTURES_DIR / case['golden']).read_text(encoding='utf-8'))
+        actual = sheets_parser.parse_program(csv_text, meta)
+
+        expected_ids = [s['id'] for s in expected['sessions']]
+        actual_ids = [s['id'] for s in actual['sessions']]
+        if actual_ids != expected_ids:
+            ok = False
+            print(f"{case['golden']}: ID не совпадают")
+            print('  TS:    ', expected_ids)
+            print('  Python:', actual_ids)
+        elif actual != expected:
+            ok = False
+            for key in ('title', 'halls', 'meta'):
+                if actual[key] != expected[key]:
+                    print(f"{case['golden']}: {key}: {actual[key]!r} != {expected[key]!r}")
+            for got, want in zip(actual['sessions'], expected['sessions']):
+                if got != want:
+                    print(f"{case['golden']}: {want['id']}:")
+                    print('  TS:    ', want)
+                    print('  Python:', got)
+        else:
+            print(f"{case['golden']}: ok, {len(actual_ids)} сессий")
+    return ok
+
+
+def synthetic_sheet(rows: int) -> str:
+    '''День из fixtures/sheets/day1.csv, у которого слоты повторяются до rows строк'''
+    lines = (FIXTURES_DIR / 'day1.csv').read_text(encoding='utf-8').split('\n')
+    head, body = lines[:5], lines[5:]
+    return '\n'.join(head + [body[i % len(body)] for i in range(rows)])
+
+
+def bench_parse(rows: int, repeats: int) -> None:
+    csv_text = synthetic_sheet(rows)
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        program = sheets_parser.parse_program(csv_text)
+        timings.append((time.perf_counter() - started) * 1000)
+    print(json.dumps({
+        'rows': rows,
+        'csvKb': round(len(csv_text.encode('utf-8')) / 1024, 1),
+        'sessions': len(program['sessions']),
+        'medianMs': round(statistics.median(timings), 2),
+        'maxMs': round(max(timings), 2),
+    }, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', default='300,1000', help='строк в синтетическом листе')
+    parser.add_argument('--repeats', type=int, default=20)
+    args = parser.parse_args()
+
+    if not check_golden():
+        sys.exit(1)
+    for rows in (int(x) for x in args.rows.split(',')):
+        bench_parse(rows, args.repeats)
@@ -0,0 +1,96 @@
+'''
+Бенчмарк конкуренции за счётчик одного доклада: сотни пользователей одновременно
+добавляют и убирают один и тот же keynote.
+
+Сравниваются режимы save-plan STATS_WRITE_MODE=direct и deferred, а также direct
+с шардированным счётчиком (sharded, program_events.stats_shards = --shards). После прогона
+get-stats должен вернуть точное число пользователей с keynote в плане — и до, и после
+compact-stats. Postgres должен допускать --savers соединений (max_connections).
+
+Запуск:
+    BENCH_DATABASE_URL=postgresql://postgres@localhost/bench python bench/stats_contention.py --savers 200
+'''
+
+import argparse
+import json
+import os
+import threading
+import time
+
+import psycopg2
+
+from _common import BENCH_DSN, load_handler, percentile, post_event, reset_database
+
+KEYNOTE = '28.10.2025|ГЛАВНЫЙ ЗАЛ|10:00|11:00'
+
+
+def get_keynote_count(get_stats) -> int:
+    response = get_stats({'httpMethod': 'GET', 'queryStringParameters': {'eventId': 'bench'}}, None)
+    sessions = json.loads(response['body'])['sessions']
+    return next((row['interest_count'] for row in sessions if row['session_id'] == KEYNOTE), 0)
+
+
+def run_mode(mode: str, savers: int, saves_per_user: int, shards: int) -> None:
+    reset_database()
+    os.environ['DATABASE_URL'] = BENCH_DSN
+    os.environ['STATS_WRITE_MODE'] = 'deferred' if mode == 'deferred' else 'direct'
+    conn = psycopg2.connect(BENCH_DSN)
+    with conn, conn.cursor() as cur:
+        cur.execute('''
+            INSERT INTO t_p73504605_landing_exhibition_m.program_events (id, name, sheet_url, stats_shards)
+            VALUES ('bench', 'Bench', 'https://docs.google.com/spreadsheets/d/bench', %s)
+        ''', (shards if mode == 'sharded' else 1,))
+    conn.close()
+    save_plan = load_handler('save-plan')
+    get_stats = load_handler('get-stats')
+    compact_stats = load_handler('compact-stats')
+
+    timings = []
+    errors = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(savers)
+
+    def saver(index: int) -> None:
+        own_session = f'28.10.2025|ЗАЛ {index % 7}|12:00|12:40'
+        barrier.wait()
+        for attempt in range(saves_per_user):
+            # Последнее сохранение всегда с keynote: итоговый счётчик должен быть равен savers
+            with_keynote = (saves_per_user - attempt) % 2 == 1
+            plan = [KEYNOTE, own_session] if with_keynote else [own_session]
+            body = json.dumps({'eventId': 'bench', 'userId': f'user-{index}', 'sessionIds': plan})
+            started = time.perf_counter()
+            response = save_plan(post_event(body), None)
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                timings.append(elapsed)
+                if response['statusCode'] != 200:
+                    errors.append(response['body'])
+
+    threads = [threading.Thread(target=saver, args=(index,)) for index in range(savers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    before_compaction = get_keynote_count(get_stats)
+    compact_stats({'httpMethod': 'POST', 'body': '{}'}, None)
+    after_compaction = get_keynote_count(get_stats)
+
+    print(f'{mode:>9} {len(timings) / wall:>10.0f} {percentile(timings, 50):>9.1f} '
+          f'{percentile(timings, 99):>9.1f} {before_compaction:>8} {after_compaction:>8} {len(errors):>7}')
+    assert before_compaction == savers and after_compaction == savers, 'keynote count is not exact'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--savers', type=int, default=200, help='число одновременных пользователей')
+    parser.add_argument('--saves', type=int, default=5, help='сохранений на пользователя (нечётное)')
+    parser.add_argument('--modes', default='direct,deferred,sharded')
+    parser.add_argument('--shards', type=int, default=16, help='число шардов для режима sharded')
+    args = parser.parse_args()
+
+    print(f'{"mode":>9} {"saves/s":>10} {"p50 ms":>9} {"p99 ms":>9} {"count":>8} {"compact":>8} {"errors":>7}')
+    for mode in args.modes.split(','):
+        run_mode(mode, args.savers, args.saves, args.shards)
@@ -0,0 +1,134 @@
+'''
+Бенчмарк кеша программы в get-program-data: stale-while-revalidate и склейка промахов.
+
+Вместо Google Sheets отвечает локальный сервер (SHEETS_EXPORT_URL) с задержкой --delay и считает
+выгрузки дневного листа. --clients одновременных запросов к одному листу в трёх фазах:
+1. холодный кеш — один MISS, остальные COALESCED, лист выгружен один раз;
+2. кеш старше TTL, но в пределах max-stale — лист выгружает один запрос (MISS), остальные
+   сразу получают STALE, не дожидаясь таблицы (или HIT/COALESCED, если пришли уже после обновления);
+3. кеш старше TTL + max-stale — снова один MISS и COALESCED у остальных.
+По каждой фазе печатаются ответы X-Cache, задержки p50/p95 и сколько раз выгружался лист.
+
+Запуск:
+    BENCH_DATABASE_URL=postgresql://postgres@localhost/bench python bench/swr_program_cache.py --clients 20
+'''
+
+import argparse
+import json
+import os
+import threading
+import time
+import urllib.parse
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+import psycopg2
+
+from _common import BENCH_DSN, load_handler, percentile
+from parallel_sync import FIXTURES_DIR, seed_event
+
+GID = '0'
+META_GID = '1494690392'
+TTL_SECONDS = 1
+
+
+class CountingSheets(BaseHTTPRequestHandler):
+    '''GET /<sheet>/export?format=csv&gid=<gid>: лист из fixtures после задержки, с подсчётом выгрузок'''
+
+    delay = 0.5
+    fetches: Counter = Counter()
+    lock = threading.Lock()
+
+    def do_GET(self) -> None:
+        gid = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query).get('gid', [''])[0]
+        with self.lock:
+            CountingSheets.fetches[gid] += 1
+        time.sleep(self.delay)
+        body = (FIXTURES_DIR / ('meta.csv' if gid == META_GID else 'day1.csv')).read_bytes()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/csv; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+def get_event() -> Dict:
+    return {'httpMethod': 'GET', 'headers': {}, 'queryStringParameters': {'eventId': 'bench', 'sheetGid': GID}}
+
+
+def fetch_once(handler) -> tuple:
+    started = time.perf_counter()
+    response = handler(get_event(), None)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    assert response['statusCode'] == 200, response['body']
+    return response['headers']['X-Cache'], elapsed_ms
+
+
+def phase(handler, clients: int, name: str) -> Counter:
+    fetches_before = CountingSheets.fetches[GID]
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        results = list(pool.map(lambda _: fetch_once(handler), range(clients)))
+    statuses = Counter(status for status, _ in results)
+    latencies: Dict[str, List[float]] = {}
+    for status, elapsed_ms in results:
+        latencies.setdefault(status, []).append(elapsed_ms)
+    print(json.dumps({
+        'phase': name,
+        'xCache': dict(statuses),
+        'ms': {
+            status: {'p50': round(percentile(values, 50), 1), 'p95': round(percentile(values, 95), 1)}
+            for status, values in latencies.items()
+        },
+        'sheetFetches': CountingSheets.fetches[GID] - fetches_before,
+    }))
+    return statuses
+
+
+def set_cache_settings(ttl: int, max_stale: int) -> None:
+    conn = psycopg2.connect(BENCH_DSN)
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute(
+        "UPDATE t_p73504605_landing_exhibition_m.program_events SET cache_ttl_seconds = %s, cache_max_stale_seconds = %s WHERE id = 'bench'",
+        (ttl, max_stale)
+    )
+    conn.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=20, help='одновременных запросов к листу')
+    parser.add_argument('--delay', type=float, default=0.5, help='задержка ответа таблицы, с')
+    args = parser.parse_args()
+
+    CountingSheets.delay = args.delay
+    server = ThreadingHTTPServer(('127.0.0.1', 0), CountingSheets)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ['SHEETS_EXPORT_URL'] = f'http://127.0.0.1:{server.server_port}'
+    os.environ['DATABASE_URL'] = BENCH_DSN
+
+    seed_event()
+    set_cache_settings(TTL_SECONDS, 60)
+    handler = load_handler('get-program-data')
+
+    statuses = phase(handler, args.clients, 'cold')
+    assert statuses['MISS'] == 1 and statuses['COALESCED'] == args.clients - 1, statuses
+    assert CountingSheets.fetches[GID] == 1, 'холодный кеш: лист выгружается один раз'
+
+    time.sleep(TTL_SECONDS + 0.2)
+    statuses = phase(handler, args.clients, 'stale')
+    assert statuses['MISS'] == 1 and set(statuses) <= {'MISS', 'STALE', 'HIT', 'COALESCED'}, statuses
+    assert CountingSheets.fetches[GID] == 2, 'устаревший кеш: лист выгружается один раз'
+
+    set_cache_settings(TTL_SECONDS, 0)
+    time.sleep(TTL_SECONDS + 0.2)
+    statuses = phase(handler, args.clients, 'expired')
+    assert statuses['MISS'] == 1 and statuses['COALESCED'] == args.clients - 1, statuses
+    assert CountingSheets.fetches[GID] == 3, 'истёкший кеш: лист выгружается один раз'
+
+    server.shutdown()
@@ -0,0 +1,96 @@
+'''
+Бенчмарк итога участников в get-stats: COUNT(DISTINCT user_id) по всем планам мероприятия
+против чтения одной строки event_totals, которую поддерживает save-plan.
+
+Для каждого размера база пересоздаётся, планы генерируются одним INSERT ... generate_series,
+event_totals пересобирается как после миграции. Затем оба запроса выполняются --repeats раз
+(после прогрева) и сравниваются медианы; итог обязан совпадать с полным подсчётом.
+
+Запуск:
+    BENCH_DATABASE_URL=postgresql://postgres@localhost/bench python bench/total_users.py --sizes 10000,100000,1000000
+'''
+
+import argparse
+import time
+
+import psycopg2
+
+from _common import BENCH_DSN, SCHEMA, percentile, reset_database
+
+COUNT_DISTINCT = f'''
+    SELECT COUNT(DISTINCT user_id)
+    FROM {SCHEMA}.user_plans
+    WHERE event_id = %s
+'''
+
+MAINTAINED_TOTAL = f'''
+    SELECT total_users
+    FROM {SCHEMA}.event_totals
+    WHERE event_id = %s
+'''
+
+
+def seed(cur, plans: int) -> None:
+    '''Планы мероприятия bench из 1–8 сессий, плюс столько же планов соседнего мероприятия'''
+    cur.execute(f'''
+        INSERT INTO {SCHEMA}.event_sessions (event_id, session_id)
+        SELECT 'bench', '28.10.2025|ЗАЛ ' || (n % 10) || '|' || (n / 10) || ':00|' || (n / 10) || ':40'
+        FROM generate_series(0, 199) AS n
+    ''')
+    cur.execute(f'''
+        INSERT INTO {SCHEMA}.user_plans (event_id, user_id, session_keys)
+        SELECT
+            e.event_id,
+            'user-' || n,
+            ARRAY(SELECT 1 + (n * 31 + k * 17) %% 200 FROM generate_series(1, 1 + n %% 8) AS k)
+        FROM generate_series(1, %s) AS n
+        CROSS JOIN (VALUES ('bench'), ('other')) AS e(event_id)
+    ''', (plans,))
+    cur.execute(f'''
+        INSERT INTO {SCHEMA}.event_totals (event_id, total_users)
+        SELECT event_id, COUNT(*)
+        FROM {SCHEMA}.user_plans
+        WHERE cardinality(session_keys) > 0
+        GROUP BY event_id
+    ''')
+    cur.execute(f'ANALYZE {SCHEMA}.user_plans')
+    cur.execute(f'ANALYZE {SCHEMA}.event_totals')
+
+
+def measure(cur, query: str, repeats: int):
+    cur.execute(query, ('bench',))
+    value = cur.fetchone()[0]
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        cur.execute(query, ('bench',))
+        cur.fetchone()
+        timings.append((time.perf_counter() - started) * 1000)
+    return value, percentile(timings, 50)
+
+
+def run(plans: int, repeats: int) -> None:
+    reset_database()
+    conn = psycopg2.connect(BENCH_DSN)
+    conn.autocommit = True
+    cur = conn.cursor()
+    seed(cur, plans)
+    
+    counted, count_p50 = measure(cur, COUNT_DISTINCT, repeats)
+    maintained, total_p50 = measure(cur, MAINTAINED_TOTAL, repeats)
+    cur.close()
+    conn.close()
+    
+    print(f'{plans:>9} {count_p50:>14.2f} {total_p50:>14.3f} {count_p50 / total_p50:>9.0f}x')
+    assert counted == maintained == plans, 'event_totals differs from COUNT(DISTINCT user_id)'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='10000,100000,1000000', help='число планов мероприятия')
+    parser.add_argument('--repeats', type=int, default=20)
+    args = parser.parse_args()
+    
+    print(f'{"plans":>9} {"distinct ms":>14} {"totals ms":>14} {"speedup":>10}')
+    for size in args.sizes.split(','):
+        run(int(size), args.repeats)
@@ -0,0 +1,16 @@
+-- Оставляем по одному плану на пару (user_id, event_id): самый свежий. updated_at может быть NULL
+-- (колонка без NOT NULL) — тогда свежесть по created_at, а без обеих меток план считается самым старым;
+-- иначе сравнение строк дало бы NULL и дубликат пережил бы очистку
+DELETE FROM t_p73504605_landing_exhibition_m.user_plans p
+USING t_p73504605_landing_exhibition_m.user_plans newer
+WHERE p.user_id = newer.user_id
+  AND p.event_id = newer.event_id
+  AND (COALESCE(p.updated_at, p.created_at, '-infinity'::timestamp), p.id)
+    < (COALESCE(newer.updated_at, newer.created_at, '-infinity'::timestamp), newer.id);
+
+-- Уникальность пары позволяет сохранять план одним INSERT ... ON CONFLICT
+ALTER TABLE t_p73504605_landing_exhibition_m.user_plans
+    ADD CONSTRAINT user_plans_user_event_key UNIQUE (user_id, event_id);
+
+-- Обычный индекс по той же паре больше не нужен: его заменяет индекс ограничения
+DROP INDEX IF EXISTS t_p73504605_landing_exhibition_m.idx_user_plans_user_event;
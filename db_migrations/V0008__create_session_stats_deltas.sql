@@ -0,0 +1,17 @@
+-- Журнал изменений интереса к докладам для отложенной записи счётчиков.
+-- save-plan в режиме STATS_WRITE_MODE=deferred только дописывает сюда +1/-1,
+-- а compact-stats пачками сворачивает строки в session_stats.
+-- Таблица журналируемая: UNLOGGED потерял бы несвёрнутые изменения при падении БД.
+CREATE TABLE IF NOT EXISTS t_p73504605_landing_exhibition_m.session_stats_deltas (
+    id BIGSERIAL PRIMARY KEY,
+    event_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    delta SMALLINT NOT NULL,
+    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- get-stats досчитывает несвёрнутые изменения по event_id
+CREATE INDEX IF NOT EXISTS idx_session_stats_deltas_event_id
+    ON t_p73504605_landing_exhibition_m.session_stats_deltas(event_id);
+
+COMMENT ON TABLE t_p73504605_landing_exhibition_m.session_stats_deltas IS 'Несвёрнутые изменения счётчиков session_stats';
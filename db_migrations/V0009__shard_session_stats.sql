@@ -0,0 +1,11 @@
+-- Число строк-шардов на счётчик доклада. 1 — обычный счётчик (одна строка на доклад);
+-- крупным конференциям можно поднять, чтобы популярные доклады не упирались в блокировку строки.
+-- save-plan выбирает шард по хэшу user_id. После смены stats_shards -1 может попасть не в тот шард, что +1,
+-- поэтому шард бывает отрицательным: к нулю приводится сумма шардов при чтении, а не отдельный шард.
+ALTER TABLE t_p73504605_landing_exhibition_m.program_events ADD COLUMN IF NOT EXISTS stats_shards INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE t_p73504605_landing_exhibition_m.program_events ADD CONSTRAINT program_events_stats_shards_check CHECK (stats_shards BETWEEN 1 AND 256);
+
+-- Существующие счётчики становятся шардом 0; get-stats суммирует шарды через GROUP BY
+ALTER TABLE t_p73504605_landing_exhibition_m.session_stats ADD COLUMN shard SMALLINT NOT NULL DEFAULT 0;
+ALTER TABLE t_p73504605_landing_exhibition_m.session_stats DROP CONSTRAINT session_stats_pkey;
+ALTER TABLE t_p73504605_landing_exhibition_m.session_stats ADD PRIMARY KEY (event_id, session_id, shard);
@@ -0,0 +1,15 @@
+-- Применённые операции add/remove из офлайн-очереди клиентов.
+-- Повторная отправка той же операции (ретрай по плохому Wi-Fi) находит op_id здесь
+-- и не меняет ни план, ни interest_count.
+CREATE TABLE IF NOT EXISTS t_p73504605_landing_exhibition_m.plan_ops (
+    event_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    op_id TEXT NOT NULL,
+    op TEXT NOT NULL CHECK (op IN ('add', 'remove')),
+    session_id TEXT NOT NULL,
+    client_ts BIGINT,
+    applied_at TIMESTAMP WITHOUT TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (event_id, user_id, op_id)
+);
+
+COMMENT ON TABLE t_p73504605_landing_exhibition_m.plan_ops IS 'Журнал применённых операций с планами для идемпотентной синхронизации';
@@ -0,0 +1,61 @@
+-- Словарь сессий мероприятия: длинный ID вида "ДАТА|ЗАЛ|НАЧАЛО|КОНЕЦ" хранится один раз,
+-- а планы, счётчики и журнал изменений ссылаются на него целым номером.
+-- API по-прежнему принимает и отдаёт строковые ID: перевод делают save-plan, get-plan и get-stats.
+CREATE TABLE IF NOT EXISTS t_p73504605_landing_exhibition_m.event_sessions (
+    id SERIAL PRIMARY KEY,
+    event_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (event_id, session_id)
+);
+
+COMMENT ON TABLE t_p73504605_landing_exhibition_m.event_sessions IS 'Словарь ID сессий мероприятия: строка → целый номер';
+
+INSERT INTO t_p73504605_landing_exhibition_m.event_sessions (event_id, session_id)
+SELECT event_id, session_id FROM (
+    SELECT p.event_id, s.session_id
+    FROM t_p73504605_landing_exhibition_m.user_plans p, unnest(p.session_ids) AS s(session_id)
+    UNION
+    SELECT event_id, session_id FROM t_p73504605_landing_exhibition_m.session_stats
+    UNION
+    SELECT event_id, session_id FROM t_p73504605_landing_exhibition_m.session_stats_deltas
+) ids
+ORDER BY event_id, session_id
+ON CONFLICT (event_id, session_id) DO NOTHING;
+
+-- Планы: TEXT[] → INTEGER[] с сохранением порядка сессий
+ALTER TABLE t_p73504605_landing_exhibition_m.user_plans ADD COLUMN session_keys INTEGER[] NOT NULL DEFAULT '{}';
+
+UPDATE t_p73504605_landing_exhibition_m.user_plans p
+SET session_keys = COALESCE((
+    SELECT array_agg(d.id ORDER BY s.pos)
+    FROM unnest(p.session_ids) WITH ORDINALITY AS s(session_id, pos)
+    JOIN t_p73504605_landing_exhibition_m.event_sessions d
+      ON d.event_id = p.event_id AND d.session_id = s.session_id
+), '{}');
+
+ALTER TABLE t_p73504605_landing_exhibition_m.user_plans DROP COLUMN session_ids;
+
+-- Счётчики: ключ (event_id, session_key, shard)
+ALTER TABLE t_p73504605_landing_exhibition_m.session_stats ADD COLUMN session_key INTEGER;
+
+UPDATE t_p73504605_landing_exhibition_m.session_stats st
+SET session_key = d.id
+FROM t_p73504605_landing_exhibition_m.event_sessions d
+WHERE d.event_id = st.event_id AND d.session_id = st.session_id;
+
+ALTER TABLE t_p73504605_landing_exhibition_m.session_stats ALTER COLUMN session_key SET NOT NULL;
+ALTER TABLE t_p73504605_landing_exhibition_m.session_stats DROP CONSTRAINT session_stats_pkey;
+ALTER TABLE t_p73504605_landing_exhibition_m.session_stats DROP COLUMN session_id;
+ALTER TABLE t_p73504605_landing_exhibition_m.session_stats ADD PRIMARY KEY (event_id, session_key, shard);
+
+-- Журнал отложенных изменений
+ALTER TABLE t_p73504605_landing_exhibition_m.session_stats_deltas ADD COLUMN session_key INTEGER;
+
+UPDATE t_p73504605_landing_exhibition_m.session_stats_deltas dl
+SET session_key = d.id
+FROM t_p73504605_landing_exhibition_m.event_sessions d
+WHERE d.event_id = dl.event_id AND d.session_id = dl.session_id;
+
+ALTER TABLE t_p73504605_landing_exhibition_m.session_stats_deltas ALTER COLUMN session_key SET NOT NULL;
+ALTER TABLE t_p73504605_landing_exhibition_m.session_stats_deltas DROP COLUMN session_id;
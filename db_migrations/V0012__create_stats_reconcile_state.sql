@@ -0,0 +1,14 @@
+-- Водяной знак сверки session_stats с user_plans: reconcile-stats пересчитывает
+-- только сессии из планов и счётчиков, изменённых после него
+CREATE TABLE IF NOT EXISTS t_p73504605_landing_exhibition_m.stats_reconcile_state (
+    event_id TEXT PRIMARY KEY,
+    watermark TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    last_fixed INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITHOUT TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Поиск планов мероприятия, изменённых после водяного знака
+CREATE INDEX IF NOT EXISTS idx_user_plans_event_updated
+    ON t_p73504605_landing_exhibition_m.user_plans(event_id, updated_at);
+
+COMMENT ON TABLE t_p73504605_landing_exhibition_m.stats_reconcile_state IS 'Состояние инкрементальной сверки счётчиков';
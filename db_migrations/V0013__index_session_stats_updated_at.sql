@@ -0,0 +1,4 @@
+-- get-stats берёт версию статистики из max(updated_at) планов и счётчиков мероприятия:
+-- оба максимума читаются обратным проходом по индексу (event_id, updated_at)
+CREATE INDEX IF NOT EXISTS idx_session_stats_event_updated
+    ON t_p73504605_landing_exhibition_m.session_stats(event_id, updated_at);
@@ -0,0 +1,17 @@
+-- Число участников с непустым планом по мероприятию. save-plan меняет его в той же транзакции,
+-- когда план становится непустым или опустошается, а get-stats читает одну строку
+-- вместо COUNT(DISTINCT user_id) по всем планам.
+CREATE TABLE IF NOT EXISTS t_p73504605_landing_exhibition_m.event_totals (
+    event_id TEXT PRIMARY KEY,
+    total_users INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITHOUT TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO t_p73504605_landing_exhibition_m.event_totals (event_id, total_users)
+SELECT event_id, COUNT(*)
+FROM t_p73504605_landing_exhibition_m.user_plans
+WHERE cardinality(session_keys) > 0
+GROUP BY event_id
+ON CONFLICT (event_id) DO UPDATE SET total_users = EXCLUDED.total_users;
+
+COMMENT ON TABLE t_p73504605_landing_exhibition_m.event_totals IS 'Поддерживаемые итоги по мероприятию для get-stats';
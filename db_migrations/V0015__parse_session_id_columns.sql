@@ -0,0 +1,54 @@
+-- Разобранные части ID сессии для фильтров и группировок get-stats без разбора строки на клиенте.
+-- Колонки вычисляемые: их заполняет сама база при вставке в словарь event_sessions,
+-- кто бы её ни делал (save-plan, tools/plans_bulk.py), и одинаково для старых строк.
+-- Поддерживаются форматы "ДАТА|ЗАЛ|НАЧАЛО|КОНЕЦ" и старые "ЗАЛ|НАЧАЛО|КОНЕЦ[|НАЗВАНИЕ]";
+-- у нераспознанных ID колонки пустые (NULL).
+-- Дата — подпись дня из таблицы как есть (бывает диапазоном "28.10.2025-29.10.2025").
+
+CREATE OR REPLACE FUNCTION t_p73504605_landing_exhibition_m.session_id_time(part TEXT)
+RETURNS TIME
+LANGUAGE sql
+IMMUTABLE
+AS $$
+    SELECT CASE
+        WHEN btrim(part) ~ '^([01]?[0-9]|2[0-3])[:.][0-5][0-9]$'
+        THEN make_time(
+            split_part(translate(btrim(part), '.', ':'), ':', 1)::int,
+            split_part(translate(btrim(part), '.', ':'), ':', 2)::int,
+            0
+        )
+    END
+$$;
+
+ALTER TABLE t_p73504605_landing_exhibition_m.event_sessions
+    ADD COLUMN session_date TEXT GENERATED ALWAYS AS (
+        CASE WHEN split_part(session_id, '|', 3) = '' THEN NULL
+             WHEN t_p73504605_landing_exhibition_m.session_id_time(split_part(session_id, '|', 2)) IS NULL
+             THEN NULLIF(btrim(split_part(session_id, '|', 1)), '')
+        END
+    ) STORED,
+    ADD COLUMN hall TEXT GENERATED ALWAYS AS (
+        NULLIF(btrim(CASE WHEN split_part(session_id, '|', 3) = '' THEN NULL
+                          WHEN t_p73504605_landing_exhibition_m.session_id_time(split_part(session_id, '|', 2)) IS NULL
+                          THEN split_part(session_id, '|', 2)
+                          ELSE split_part(session_id, '|', 1)
+                     END), '')
+    ) STORED,
+    ADD COLUMN starts_at TIME GENERATED ALWAYS AS (
+        CASE WHEN t_p73504605_landing_exhibition_m.session_id_time(split_part(session_id, '|', 2)) IS NULL
+             THEN t_p73504605_landing_exhibition_m.session_id_time(split_part(session_id, '|', 3))
+             ELSE t_p73504605_landing_exhibition_m.session_id_time(split_part(session_id, '|', 2))
+        END
+    ) STORED,
+    ADD COLUMN ends_at TIME GENERATED ALWAYS AS (
+        CASE WHEN t_p73504605_landing_exhibition_m.session_id_time(split_part(session_id, '|', 2)) IS NULL
+             THEN t_p73504605_landing_exhibition_m.session_id_time(split_part(session_id, '|', 4))
+             ELSE t_p73504605_landing_exhibition_m.session_id_time(split_part(session_id, '|', 3))
+        END
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_event_sessions_event_hall
+ON t_p73504605_landing_exhibition_m.event_sessions (event_id, hall, starts_at);
+
+CREATE INDEX IF NOT EXISTS idx_event_sessions_event_date
+ON t_p73504605_landing_exhibition_m.event_sessions (event_id, session_date, starts_at);
@@ -0,0 +1,37 @@
+-- История интереса к докладам: сколько раз сессию добавили и убрали из планов за минуту и за час.
+-- Минутные корзины пишет save-plan вместе со счётчиком (в режиме deferred — compact-stats
+-- при сворачивании журнала), шард тот же, что у session_stats. Корзины старше горизонта
+-- (STATS_MINUTE_HORIZON_HOURS у compact-stats) переносятся в часовую таблицу и удаляются.
+CREATE TABLE IF NOT EXISTS t_p73504605_landing_exhibition_m.session_interest_minutes (
+    event_id TEXT NOT NULL,
+    session_key INTEGER NOT NULL,
+    bucket TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    shard SMALLINT NOT NULL DEFAULT 0,
+    added INTEGER NOT NULL DEFAULT 0,
+    removed INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (event_id, session_key, bucket, shard)
+);
+
+CREATE TABLE IF NOT EXISTS t_p73504605_landing_exhibition_m.session_interest_hours (
+    event_id TEXT NOT NULL,
+    session_key INTEGER NOT NULL,
+    bucket TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    added INTEGER NOT NULL DEFAULT 0,
+    removed INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (event_id, session_key, bucket)
+);
+
+-- Ряд по всему мероприятию читается одним проходом по (event_id, bucket),
+-- ряд по сессии — по первичному ключу
+CREATE INDEX IF NOT EXISTS idx_session_interest_minutes_event_bucket
+    ON t_p73504605_landing_exhibition_m.session_interest_minutes (event_id, bucket);
+
+CREATE INDEX IF NOT EXISTS idx_session_interest_hours_event_bucket
+    ON t_p73504605_landing_exhibition_m.session_interest_hours (event_id, bucket);
+
+-- compact-stats выбирает устаревшие минутные корзины по времени
+CREATE INDEX IF NOT EXISTS idx_session_interest_minutes_bucket
+    ON t_p73504605_landing_exhibition_m.session_interest_minutes (bucket);
+
+COMMENT ON TABLE t_p73504605_landing_exhibition_m.session_interest_minutes IS 'Добавления и удаления сессий из планов по минутам (в пределах горизонта)';
+COMMENT ON TABLE t_p73504605_landing_exhibition_m.session_interest_hours IS 'Добавления и удаления сессий из планов по часам (после горизонта)';
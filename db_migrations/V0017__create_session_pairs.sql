@@ -0,0 +1,44 @@
+-- Сколько участников запланировали обе сессии пары: основа для переноса докладов между залами.
+-- Пара хранится один раз (session_a < session_b). save-plan поддерживает счётчики по дельтам плана:
+-- в режиме direct — upsert в шард hash(user_id) % stats_shards, как session_stats,
+-- в режиме deferred — +1/-1 в журнал session_pair_deltas, который сворачивает compact-stats.
+CREATE TABLE IF NOT EXISTS t_p73504605_landing_exhibition_m.session_pairs (
+    event_id TEXT NOT NULL,
+    session_a INTEGER NOT NULL,
+    session_b INTEGER NOT NULL,
+    shard SMALLINT NOT NULL DEFAULT 0,
+    pair_count INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITHOUT TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (event_id, session_a, session_b, shard),
+    CHECK (session_a < session_b)
+);
+
+CREATE TABLE IF NOT EXISTS t_p73504605_landing_exhibition_m.session_pair_deltas (
+    id BIGSERIAL PRIMARY KEY,
+    event_id TEXT NOT NULL,
+    session_a INTEGER NOT NULL,
+    session_b INTEGER NOT NULL,
+    delta SMALLINT NOT NULL,
+    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_session_pair_deltas_event_id
+    ON t_p73504605_landing_exhibition_m.session_pair_deltas(event_id);
+
+-- Начальные значения по существующим планам
+INSERT INTO t_p73504605_landing_exhibition_m.session_pairs (event_id, session_a, session_b, shard, pair_count)
+SELECT
+    p.event_id,
+    a.session_key,
+    b.session_key,
+    abs(hashtext(p.user_id)::bigint) % COALESCE(e.stats_shards, 1),
+    COUNT(DISTINCT p.id)
+FROM t_p73504605_landing_exhibition_m.user_plans p
+LEFT JOIN t_p73504605_landing_exhibition_m.program_events e ON e.id = p.event_id
+CROSS JOIN unnest(p.session_keys) AS a(session_key)
+CROSS JOIN unnest(p.session_keys) AS b(session_key)
+WHERE a.session_key < b.session_key
+GROUP BY 1, 2, 3, 4;
+
+COMMENT ON TABLE t_p73504605_landing_exhibition_m.session_pairs IS 'Число участников, запланировавших обе сессии пары';
+COMMENT ON TABLE t_p73504605_landing_exhibition_m.session_pair_deltas IS 'Несвёрнутые изменения счётчиков session_pairs';
@@ -0,0 +1,12 @@
+-- Что синхронизировано в каждой строке program_cache: sync-program-data пропускает запись,
+-- если лист не изменился, вместо того чтобы переписывать JSONB (TOAST, WAL) при каждом запуске.
+-- content_hash — sha256 CSV дневного листа, inputs_hash — всего остального, от чего зависит разбор
+-- (лист Meta и версия парсера).
+-- etag и source_last_modified — валидаторы из ответа выгрузки для If-None-Match / If-Modified-Since,
+-- если выгрузка их прислала. version растёт при каждой записи новых данных.
+ALTER TABLE t_p73504605_landing_exhibition_m.program_cache
+    ADD COLUMN IF NOT EXISTS content_hash TEXT,
+    ADD COLUMN IF NOT EXISTS inputs_hash TEXT,
+    ADD COLUMN IF NOT EXISTS etag TEXT,
+    ADD COLUMN IF NOT EXISTS source_last_modified TEXT,
+    ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
@@ -0,0 +1,12 @@
+-- Кеш программы в get-program-data: stale-while-revalidate.
+-- cache_ttl_seconds — сколько строка program_cache считается свежей, cache_max_stale_seconds — сколько
+-- после этого её ещё можно отдавать устаревшей, пока в фоне идёт одно обновление из Google Sheets.
+-- NULL — значения по умолчанию из get-program-data.
+ALTER TABLE t_p73504605_landing_exhibition_m.program_events
+    ADD COLUMN IF NOT EXISTS cache_ttl_seconds INTEGER,
+    ADD COLUMN IF NOT EXISTS cache_max_stale_seconds INTEGER;
+
+-- Когда лист последний раз сверяли с таблицей. Синхронизация без изменений обновляет только эту
+-- колонку: data и её TOAST не переписываются. Свежесть — от COALESCE(checked_at, last_updated).
+ALTER TABLE t_p73504605_landing_exhibition_m.program_cache
+    ADD COLUMN IF NOT EXISTS checked_at TIMESTAMP;
@@ -0,0 +1,13 @@
+-- Версия статистики мероприятия для ETag в get-stats. Каждая транзакция, которая меняет отдаваемое
+-- get-stats (счётчики, журнал изменений, корзины истории, event_totals), в той же транзакции
+-- увеличивает version одной из строк мероприятия; ETag строится из суммы по строкам.
+-- Сумма растёт с каждым таким коммитом, поэтому одинаковая сумма — одинаковые данные, без окна ожидания.
+-- Строк на мероприятие несколько (shard): сохранения разных участников не ждут одну строку.
+CREATE TABLE IF NOT EXISTS t_p73504605_landing_exhibition_m.stats_versions (
+    event_id TEXT NOT NULL,
+    shard SMALLINT NOT NULL,
+    version BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (event_id, shard)
+);
+
+COMMENT ON TABLE t_p73504605_landing_exhibition_m.stats_versions IS 'Счётчик изменений статистики мероприятия по шардам: ETag get-stats';
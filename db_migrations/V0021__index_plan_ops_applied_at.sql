@@ -0,0 +1,3 @@
+-- compact-stats удаляет записи plan_ops старше PLAN_OPS_RETENTION_DAYS пачками от самых старых
+CREATE INDEX IF NOT EXISTS idx_plan_ops_applied_at
+    ON t_p73504605_landing_exhibition_m.plan_ops(applied_at);
@@ -0,0 +1,6 @@
+-- Лист Meta мероприятия (gid). Его берут и sync-program-data, и обновление устаревшего кеша в
+-- get-program-data: иначе они разбирали бы листы по разным Meta, и inputs_hash строки кеша
+-- переключался бы туда и обратно. NULL — лист по умолчанию (sheets_parser.META_SHEET_GID),
+-- пустая строка — у таблицы нет листа Meta.
+ALTER TABLE t_p73504605_landing_exhibition_m.program_events
+    ADD COLUMN IF NOT EXISTS meta_gid TEXT;
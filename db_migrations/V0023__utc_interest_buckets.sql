@@ -0,0 +1,34 @@
+-- Корзины истории интереса хранятся в UTC: get-stats принимает since/until в UTC и отдаёт корзины с Z.
+-- save-plan пишет корзину от timezone('UTC', now()), compact-stats — от created_at журнала, поэтому
+-- журналы получают ту же метку. Раньше всё это бралось во временной зоне сессии (она общая
+-- для базы), так что уже записанные корзины и несвёрнутые изменения переводятся из неё в UTC;
+-- при зоне UTC обновления ничего не меняют.
+ALTER TABLE t_p73504605_landing_exhibition_m.session_stats_deltas
+    ALTER COLUMN created_at SET DEFAULT timezone('UTC', now());
+ALTER TABLE t_p73504605_landing_exhibition_m.session_pair_deltas
+    ALTER COLUMN created_at SET DEFAULT timezone('UTC', now());
+
+UPDATE t_p73504605_landing_exhibition_m.session_stats_deltas
+SET created_at = timezone('UTC', created_at::timestamptz);
+UPDATE t_p73504605_landing_exhibition_m.session_pair_deltas
+SET created_at = timezone('UTC', created_at::timestamptz);
+
+-- Корзины — часть первичного ключа: сдвиг UPDATE мог бы упереться в ещё не сдвинутую соседнюю строку,
+-- поэтому строки переносятся одним оператором через DELETE ... RETURNING
+WITH moved AS (
+    DELETE FROM t_p73504605_landing_exhibition_m.session_interest_minutes
+    RETURNING event_id, session_key, bucket, shard, added, removed
+)
+INSERT INTO t_p73504605_landing_exhibition_m.session_interest_minutes
+(event_id, session_key, bucket, shard, added, removed)
+SELECT event_id, session_key, timezone('UTC', bucket::timestamptz), shard, added, removed
+FROM moved;
+
+WITH moved AS (
+    DELETE FROM t_p73504605_landing_exhibition_m.session_interest_hours
+    RETURNING event_id, session_key, bucket, added, removed
+)
+INSERT INTO t_p73504605_landing_exhibition_m.session_interest_hours
+(event_id, session_key, bucket, added, removed)
+SELECT event_id, session_key, timezone('UTC', bucket::timestamptz), added, removed
+FROM moved;
@@ -12,6 +12,25 @@ import MobileSessionModal from '@/components/mobile/MobileSessionModal';
 import MobileMenu from '@/components/mobile/MobileMenu';
 import MobileHallFilter from '@/components/mobile/MobileHallFilter';
 
+type PlanOp = {
+  opId: string;
+  op: 'add' | 'remove';
+  sessionId: string;
+  clientTs: number;
+};
+
+// Не больше операций за запрос, чем принимает save-plan (MAX_OPS_PER_REQUEST)
+const MAX_PLAN_OPS_PER_REQUEST = 500;
+// Сколько отклонённых операций хранить для отладки
+const MAX_REJECTED_PLAN_OPS = 100;
+
+// Те же проверки, что valid_ops в save-plan: одна битая операция иначе отклонила бы весь батч
+const isValidPlanOp = (op: PlanOp): boolean =>
+  !!op && (op.op === 'add' || op.op === 'remove') &&
+  typeof op.opId === 'string' && op.opId !== '' &&
+  typeof op.sessionId === 'string' && op.sessionId !== '' &&
+  (op.clientTs === undefined || op.clientTs === null || typeof op.clientTs === 'number');
+
 export default function MobileProgram() {
   const [searchParams] = useSearchParams();
   const eventIdFromUrl = searchParams.get('eventId');
@@ -249,44 +268,107 @@ export default function MobileProgram() {
 
 
 
-  const savePlanToBackend = async (newPlan: Set<string>) => {
-    if (!eventIdFromUrl) return;
-    
+  // Изменения плана копятся в офлайн-очереди и уходят на backend батчами до MAX_PLAN_OPS_PER_REQUEST операций.
+  // У каждой операции свой opId, поэтому повторная отправка после обрыва Wi-Fi не задвоит статистику.
+  // Батч, который backend отклонил (4xx), повторять бесполезно: он уходит в карантин, иначе очередь встала бы навсегда.
+  const planOpsKey = `mobile-program-plan-ops:${eventIdFromUrl}`;
+  const rejectedPlanOpsKey = `${planOpsKey}:rejected`;
+  const flushingOpsRef = useRef(false);
+
+  const readPlanOps = (): PlanOp[] => JSON.parse(localStorage.getItem(planOpsKey) || '[]');
+
+  const removePlanOps = (ops: PlanOp[]) => {
+    const ids = new Set(ops.map(op => op?.opId));
+    localStorage.setItem(planOpsKey, JSON.stringify(readPlanOps().filter(op => !ids.has(op?.opId))));
+  };
+
+  const quarantinePlanOps = (ops: PlanOp[], reason: string) => {
+    if (ops.length === 0) return;
+    console.error('Plan ops rejected, dropped from queue:', reason, ops);
+    const rejected: PlanOp[] = JSON.parse(localStorage.getItem(rejectedPlanOpsKey) || '[]');
+    localStorage.setItem(rejectedPlanOpsKey, JSON.stringify([...rejected, ...ops].slice(-MAX_REJECTED_PLAN_OPS)));
+    removePlanOps(ops);
+  };
+
+  const flushPlanOps = async () => {
+    if (!eventIdFromUrl || flushingOpsRef.current) return;
+    const queued = readPlanOps();
+    if (queued.length === 0) return;
+
+    flushingOpsRef.current = true;
+    let sent = false;
     try {
+      const invalid = queued.filter(op => !isValidPlanOp(op));
+      quarantinePlanOps(invalid, 'invalid op');
+      const batch = queued.filter(isValidPlanOp).slice(0, MAX_PLAN_OPS_PER_REQUEST);
+      if (batch.length === 0) return;
+
       const userId = localStorage.getItem('userId') || `user-${Date.now()}-${Math.random().toString(36).substr(2, 9)}`;
       localStorage.setItem('userId', userId);
-      
-      await fetch('https://functions.poehali.dev/6ce5a94c-00ee-49fc-b106-0af8a1b0380f', {
+
+      const response = await fetch('https://functions.poehali.dev/6ce5a94c-00ee-49fc-b106-0af8a1b0380f', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
           eventId: eventIdFromUrl,
           userId: userId,
-          sessionIds: Array.from(newPlan)
+          ops: batch
         })
       });
+      if (response.ok) {
+        removePlanOps(batch);
+        sent = true;
+      } else if (response.status >= 400 && response.status < 500 && response.status !== 408 && response.status !== 429) {
+        quarantinePlanOps(batch, `HTTP ${response.status}`);
+        sent = true;
+      }
     } catch (error) {
-      console.error('Failed to save plan:', error);
+      console.error('Failed to sync plan, will retry:', error);
+    } finally {
+      flushingOpsRef.current = false;
     }
+    // Остаток очереди и операции, добавленные пока шёл запрос, отправляем следующим батчем
+    if (sent && readPlanOps().length > 0) flushPlanOps();
+  };
+
+  const queuePlanOps = (op: PlanOp['op'], sessionIds: string[]) => {
+    if (!eventIdFromUrl || sessionIds.length === 0) return;
+    const clientTs = Date.now();
+    const ops = sessionIds.map(sessionId => ({
+      opId: `${clientTs}-${Math.random().toString(36).substr(2, 9)}`,
+      op,
+      sessionId,
+      clientTs
+    }));
+    localStorage.setItem(planOpsKey, JSON.stringify([...readPlanOps(), ...ops]));
+    flushPlanOps();
   };
 
+  useEffect(() => {
+    flushPlanOps();
+    window.addEventListener('online', flushPlanOps);
+    return () => window.removeEventListener('online', flushPlanOps);
+  }, [eventIdFromUrl]);
+
   const addToPlan = (id: string) => {
     const session = data?.sessions.find(s => s.id === id);
     console.log('➕ Добавляем в план:', { id, date: session?.date, time: session?.start, title: session?.title?.substring(0, 30) });
-    setPlan(prev => {
-      const newPlan = new Set([...prev, id]);
-      savePlanToBackend(newPlan);
-      return newPlan;
-    });
+    setPlan(prev => new Set([...prev, id]));
+    queuePlanOps('add', [id]);
   };
 
   const removeFromPlan = (id: string) => {
     setPlan(prev => {
       const next = new Set(prev);
       next.delete(id);
-      savePlanToBackend(next);
       return next;
     });
+    queuePlanOps('remove', [id]);
+  };
+
+  const clearPlan = () => {
+    queuePlanOps('remove', [...plan]);
+    setPlan(new Set<string>());
   };
 
   const durationText = (s: Session) => {
@@ -798,7 +880,7 @@ export default function MobileProgram() {
                       <Icon name={exportingPdf ? 'Loader2' : 'FileDown'} size={18} className={exportingPdf ? 'animate-spin' : ''} />
                       {exportingPdf ? 'Создание PDF...' : 'Скачать PDF'}
                     </button>
-                    <button onClick={() => { const emptyPlan = new Set<string>(); savePlanToBackend(emptyPlan); setPlan(emptyPlan); }} className="plan-clear">
+                    <button onClick={clearPlan} className="plan-clear">
                       Очистить план
                     </button>
                   </div>
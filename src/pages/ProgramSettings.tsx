@@ -5,6 +5,7 @@ import { Input } from '@/components/ui/input';
 import { Card } from '@/components/ui/card';
 import { Textarea } from '@/components/ui/textarea';
 import Icon from '@/components/ui/icon';
+import func2url from '../../backend/func2url.json';
 
 interface ProgramEvent {
   id: string;
@@ -19,6 +20,10 @@ interface ProgramEvent {
 interface SessionStat {
   session_id: string;
   interest_count: number;
+  date?: string | null;
+  hall?: string | null;
+  start?: string | null;
+  end?: string | null;
 }
 
 interface EventStats {
@@ -27,6 +32,8 @@ interface EventStats {
 }
 
 const API_URL = 'https://functions.poehali.dev/1cac6452-8133-4b28-bd68-feb243859e2c';
+// Адрес export-stats платформа записывает в func2url.json при деплое функции
+const EXPORT_STATS_URL: string | undefined = (func2url as Record<string, string>)['export-stats'];
 
 export default function ProgramSettings() {
   const navigate = useNavigate();
@@ -153,113 +160,29 @@ export default function ProgramSettings() {
   };
 
   const downloadStatsCSV = async (eventId: string) => {
-    const statsData = stats[eventId];
-    if (!statsData) {
-      alert('Сначала загрузите статистику');
+    if (!EXPORT_STATS_URL) {
+      alert('Функция выгрузки статистики ещё не развёрнута');
       return;
     }
     
-    console.log('📊 Всего записей в статистике:', statsData.sessions.length);
-    
-    // Группируем по уникальным докладам (зал + время + дата)
-    interface GroupedSession {
-      hall: string;
-      time: string;
-      day: string;
-      title: string;
-      totalInterest: number;
-      sources: string[]; // Список всех ID источников
-    }
-    
-    const grouped = new Map<string, GroupedSession>();
-    
-    statsData.sessions.forEach(s => {
-      // Парсим ID: "ДАТА|ЗАЛ|НАЧАЛО|КОНЕЦ" или "ЗАЛ|НАЧАЛО|КОНЕЦ|НАЗВАНИЕ"
-      const parts = s.session_id.split('|');
-      
-      let hall = '';
-      let timeStart = '';
-      let timeEnd = '';
-      let title = '';
-      let day = '';
-      
-      if (parts.length === 4) {
-        if (parts[0].match(/^\d{1,2}\.\d{1,2}\.\d{4}$/)) {
-          // ДАТА|ЗАЛ|НАЧАЛО|КОНЕЦ
-          day = parts[0];
-          hall = parts[1];
-          timeStart = parts[2];
-          timeEnd = parts[3];
-        } else {
-          // ЗАЛ|НАЧАЛО|КОНЕЦ|НАЗВАНИЕ
-          hall = parts[0];
-          timeStart = parts[1];
-          timeEnd = parts[2];
-          title = parts[3];
-        }
-      } else if (parts.length === 3) {
-        hall = parts[0];
-        timeStart = parts[1];
-        timeEnd = parts[2];
-      }
-      
-      const time = `${timeStart}-${timeEnd}`;
-      
-      // Нормализуем зал (убираем префикс "ЗАЛ ", "комната в " и т.д.)
-      const normalizedHall = hall.replace(/^ЗАЛ\s+/i, '').replace(/^комната в\s+/i, '').trim();
-      
-      // Ключ для группировки: дата + нормализованный зал + время
-      const groupKey = `${day}|${normalizedHall}|${time}`;
-      
-      if (!grouped.has(groupKey)) {
-        grouped.set(groupKey, {
-          hall,
-          time,
-          day,
-          title,
-          totalInterest: 0,
-          sources: []
-        });
+    // Счётчики с программой соединяет export-stats по точному ID сессии, браузер только скачивает файл
+    try {
+      const response = await fetch(`${EXPORT_STATS_URL}?eventId=${encodeURIComponent(eventId)}&format=csv`);
+      if (!response.ok) {
+        const data = await response.json().catch(() => null);
+        alert(data?.error || `Не удалось выгрузить статистику (HTTP ${response.status})`);
+        return;
       }
       
-      const group = grouped.get(groupKey)!;
-      group.totalInterest += s.interest_count;
-      group.sources.push(s.session_id);
-      
-      // Если нашли название - обновляем
-      if (title && !group.title) {
-        group.title = title;
-      }
-    });
-    
-    console.log('📊 Уникальных докладов после группировки:', grouped.size);
-    console.log('📊 Найдено дублей:', statsData.sessions.length - grouped.size);
-    
-    // Формируем CSV
-    let csv = 'Зал,Время,День,Название,Интерес,Источники (ID)\n';
-    
-    Array.from(grouped.values())
-      .sort((a, b) => {
-        // Сортируем: сначала по дню, потом по времени
-        if (a.day !== b.day) return a.day.localeCompare(b.day);
-        return a.time.localeCompare(b.time);
-      })
-      .forEach(item => {
-        const sourcesStr = item.sources.length > 1 
-          ? `${item.sources.length} источников` 
-          : item.sources[0];
-        
-        csv += `"${item.hall}","${item.time}","${item.day}","${item.title}",${item.totalInterest},"${sourcesStr}"\n`;
-      });
-    
-    // Скачивание CSV
-    const blob = new Blob([csv], { type: 'text/csv;charset=utf-8;' });
-    const link = document.createElement('a');
-    link.href = URL.createObjectURL(blob);
-    link.download = `stats_${eventId}_${new Date().toISOString().slice(0, 10)}.csv`;
-    link.click();
-    
-    console.log('✅ CSV готов!');
+      const blob = await response.blob();
+      const link = document.createElement('a');
+      link.href = URL.createObjectURL(blob);
+      link.download = `stats_${eventId}_${new Date().toISOString().slice(0, 10)}.csv`;
+      link.click();
+    } catch (err) {
+      console.error('Failed to export stats:', err);
+      alert('Не удалось выгрузить статистику');
+    }
   };
 
   const uploadImage = async (file: File, type: 'logo' | 'cover', eventId?: string) => {
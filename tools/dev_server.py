@@ -0,0 +1,228 @@
+'''
+Локальный сервер со всеми backend-функциями: находит backend/*/index.py и отдаёт handler каждой
+функции по пути /<имя функции> (и по id из backend/func2url.json — /<uuid>, как в облаке).
+HTTP-запрос превращается в event облачной функции (httpMethod, path, headers,
+queryStringParameters, body, isBase64Encoded, requestContext), ответ handler — обратно в HTTP.
+
+Запросы обрабатываются параллельно в потоках; --processes N запускает N процессов на одном
+порту (pre-fork), чтобы нагружать и профилировать backend без упора в GIL. Функции изолированы
+друг от друга: у каждой свои копии локальных модулей (db.py, queries.py), как в отдельных
+контейнерах, и свои тёплые соединения с базой.
+
+Примеры:
+    DATABASE_URL=postgresql://postgres@localhost/lem python tools/dev_server.py --port 8000
+    curl 'http://localhost:8000/get-stats?eventId=conf-2025'
+    DATABASE_URL=... python tools/dev_server.py --processes 4 --only get-stats,save-plan,get-plan
+'''
+
+import argparse
+import base64
+import importlib.util
+import json
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+ROOT = Path(__file__).resolve().parent.parent
+BACKEND_DIR = ROOT / 'backend'
+
+Handler = Callable[[Dict[str, Any], Any], Dict[str, Any]]
+
+
+def load_function(function_dir: Path) -> Handler:
+    '''
+    Импортирует index.py функции. Локальные модули функции (db.py и т.п.) после импорта
+    убираются из sys.modules под своими именами, чтобы следующая функция получила свои копии.
+    '''
+    before = set(sys.modules)
+    sys.path.insert(0, str(function_dir))
+    try:
+        module_name = 'dev_' + function_dir.name.replace('-', '_')
+        spec = importlib.util.spec_from_file_location(module_name, function_dir / 'index.py')
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        sys.path.remove(str(function_dir))
+        for name in set(sys.modules) - before:
+            path = getattr(sys.modules[name], '__file__', None) or ''
+            if Path(path).resolve().parent == function_dir.resolve():
+                sys.modules[f'{module_name}.{name}'] = sys.modules.pop(name)
+    return module.handler
+
+
+def discover(only: Optional[List[str]], report: bool = True) -> Dict[str, Handler]:
+    '''
+    Все функции backend/*/index.py (или только перечисленные); пути — имя и id из func2url.json.
+    report=False — не печатать пропущенные функции (их уже напечатал родительский процесс).
+    '''
+    func2url_path = BACKEND_DIR / 'func2url.json'
+    func2url = json.loads(func2url_path.read_text()) if func2url_path.exists() else {}
+    routes: Dict[str, Handler] = {}
+    for index_path in sorted(BACKEND_DIR.glob('*/index.py')):
+        name = index_path.parent.name
+        if only and name not in only:
+            continue
+        try:
+            handler = load_function(index_path.parent)
+        except Exception as e:
+            if report:
+                print(f'skip {name}: {e}', file=sys.stderr)
+            continue
+        routes[name] = handler
+        if name in func2url:
+            routes[urlsplit(func2url[name]).path.strip('/')] = handler
+    return routes
+
+
+def build_event(method: str, raw_path: str, headers: Dict[str, str], body: bytes,
+                client_ip: str) -> Tuple[str, Dict[str, Any]]:
+    '''Событие облачной функции из HTTP-запроса; возвращает (имя функции, event)'''
+    url = urlsplit(raw_path)
+    parts = url.path.lstrip('/').split('/', 1)
+    function_name = parts[0]
+    query = parse_qs(url.query, keep_blank_values=True)
+
+    try:
+        text_body = body.decode('utf-8')
+        is_base64 = False
+    except UnicodeDecodeError:
+        text_body = base64.b64encode(body).decode('ascii')
+        is_base64 = True
+
+    request_id = str(uuid.uuid4())
+    event = {
+        'httpMethod': method,
+        'path': '/' + (parts[1] if len(parts) > 1 else ''),
+        'headers': headers,
+        'queryStringParameters': {key: values[-1] for key, values in query.items()},
+        'multiValueQueryStringParameters': query,
+        'body': text_body,
+        'isBase64Encoded': is_base64,
+        'requestContext': {
+            'requestId': request_id,
+            'httpMethod': method,
+            'identity': {'sourceIp': client_ip},
+            'requestTimeEpoch': int(time.time() * 1000)
+        }
+    }
+    return function_name, event
+
+
+def make_request_handler(routes: Dict[str, Handler], quiet: bool):
+    class FunctionRequestHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def handle_any(self) -> None:
+            length = int(self.headers.get('Content-Length') or 0)
+            body = self.rfile.read(length) if length else b''
+            function_name, event = build_event(
+                self.command, self.path, dict(self.headers.items()), body, self.client_address[0]
+            )
+            handler = routes.get(function_name)
+            if handler is None:
+                self.send_payload(404, {'Content-Type': 'application/json'},
+                                  json.dumps({'error': f'Unknown function {function_name}'}).encode('utf-8'))
+                return
+
+            context = SimpleNamespace(
+                request_id=event['requestContext']['requestId'],
+                function_name=function_name,
+                memory_limit_in_mb=None
+            )
+            try:
+                response = handler(event, context)
+            except Exception:
+                traceback.print_exc()
+                self.send_payload(502, {'Content-Type': 'application/json'},
+                                  json.dumps({'error': 'Handler raised an exception'}).encode('utf-8'))
+                return
+
+            payload = response.get('body') or ''
+            if response.get('isBase64Encoded'):
+                data = base64.b64decode(payload)
+            else:
+                data = payload.encode('utf-8') if isinstance(payload, str) else json.dumps(payload).encode('utf-8')
+            headers = {key: str(value) for key, value in (response.get('headers') or {}).items()}
+            self.send_payload(int(response.get('statusCode', 200)), headers, data)
+
+        def send_payload(self, status: int, headers: Dict[str, str], data: bytes) -> None:
+            self.send_response(status)
+            for key, value in headers.items():
+                if key.lower() != 'content-length':
+                    self.send_header(key, value)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            if self.command != 'HEAD':
+                self.wfile.write(data)
+
+        def log_message(self, format: str, *args: Any) -> None:
+            if not quiet:
+                super().log_message(format, *args)
+
+        do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = do_OPTIONS = do_HEAD = handle_any
+
+    return FunctionRequestHandler
+
+
+def serve(host: str, port: int, processes: int, only: Optional[List[str]], quiet: bool) -> None:
+    server = ThreadingHTTPServer((host, port), BaseHTTPRequestHandler, bind_and_activate=False)
+    server.daemon_threads = True
+    server.request_queue_size = 1024
+    server.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.server_bind()
+    server.server_activate()
+
+    # SIGTERM (timeout, systemd) завершает serve_forever так же, как Ctrl+C, — с остановкой дочерних процессов
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    # Pre-fork: дочерние процессы принимают соединения с того же сокета. Функции импортируются
+    # уже после fork, в каждом процессе заново: состояние модулей (пул соединений db.py, pipe
+    # и соединение LISTEN в watch-stats) у каждого процесса своё, как у отдельных контейнеров.
+    children = []
+    is_parent = True
+    for _ in range(processes - 1):
+        pid = os.fork()
+        if pid == 0:
+            children = []
+            is_parent = False
+            break
+        children.append(pid)
+
+    routes = discover(only, report=is_parent)
+    server.RequestHandlerClass = make_request_handler(routes, quiet)
+    if is_parent:
+        names = sorted(name for name in routes if (BACKEND_DIR / name).is_dir())
+        print(f'serving {len(names)} functions on http://{host}:{server.server_port} '
+              f'({processes} process{"es" if processes > 1 else ""}): {", ".join(names)}', flush=True)
+
+    try:
+        server.serve_forever()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        server.server_close()
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--processes', type=int, default=1, help='процессов на одном порту')
+    parser.add_argument('--only', help='функции через запятую (по умолчанию все)')
+    parser.add_argument('--quiet', action='store_true', help='без строки лога на каждый запрос')
+    args = parser.parse_args()
+    serve(args.host, args.port, args.processes, args.only.split(',') if args.only else None, args.quiet)
@@ -0,0 +1,214 @@
+'''
+Массовая выгрузка и загрузка планов пользователей через COPY (перенос мероприятия
+между окружениями, восстановление после инцидента).
+
+Планы выгружаются со строковыми ID сессий: целые номера event_sessions у каждой базы свои.
+После загрузки session_stats и session_pairs мероприятий из файла пересобираются агрегирующими
+запросами, а несвёрнутые журналы изменений по ним очищаются — запускать в окно обслуживания.
+
+Примеры:
+    DATABASE_URL=... python tools/plans_bulk.py export --event conf-2025 -o plans.csv
+    DATABASE_URL=... python tools/plans_bulk.py import plans.csv --as-event conf-2025-stage --replace
+    DATABASE_URL=... python tools/plans_bulk.py export --format binary -o plans.bin
+'''
+
+import argparse
+import os
+import sys
+import time
+from typing import BinaryIO, Optional
+
+import psycopg2
+
+SCHEMA = 't_p73504605_landing_exhibition_m'
+
+
+def copy_options(fmt: str) -> str:
+    return '(FORMAT binary)' if fmt == 'binary' else '(FORMAT csv, HEADER true)'
+
+
+def export_plans(conn, out: BinaryIO, event_id: Optional[str], fmt: str) -> None:
+    cur = conn.cursor()
+    query = cur.mogrify(f'''
+        SELECT
+            p.event_id,
+            p.user_id,
+            ARRAY(
+                SELECT s.session_id
+                FROM unnest(p.session_keys) WITH ORDINALITY AS k(session_key, pos)
+                JOIN {SCHEMA}.event_sessions s ON s.id = k.session_key
+                ORDER BY k.pos
+            )::text[] AS session_ids,
+            p.created_at,
+            p.updated_at
+        FROM {SCHEMA}.user_plans p
+        WHERE %(event_id)s::text IS NULL OR p.event_id = %(event_id)s
+        ORDER BY p.event_id, p.user_id
+    ''', {'event_id': event_id}).decode()
+    cur.copy_expert(f'COPY ({query}) TO STDOUT WITH {copy_options(fmt)}', out)
+    cur.close()
+
+
+def import_plans(conn, src: BinaryIO, fmt: str, as_event: Optional[str], replace: bool) -> None:
+    cur = conn.cursor()
+    cur.execute('''
+        CREATE TEMP TABLE plans_import (
+            event_id TEXT,
+            user_id TEXT,
+            session_ids TEXT[],
+            created_at TIMESTAMP WITHOUT TIME ZONE,
+            updated_at TIMESTAMP WITHOUT TIME ZONE
+        ) ON COMMIT DROP
+    ''')
+    cur.copy_expert(f'COPY plans_import FROM STDIN WITH {copy_options(fmt)}', src)
+    loaded = cur.rowcount
+
+    if as_event:
+        cur.execute('UPDATE plans_import SET event_id = %s', (as_event,))
+    cur.execute('SELECT DISTINCT event_id FROM plans_import')
+    event_ids = [row[0] for row in cur.fetchall()]
+
+    if replace:
+        cur.execute(f'DELETE FROM {SCHEMA}.user_plans WHERE event_id = ANY(%s)', (event_ids,))
+
+    cur.execute(f'''
+        INSERT INTO {SCHEMA}.event_sessions (event_id, session_id)
+        SELECT DISTINCT i.event_id, s.session_id
+        FROM plans_import i, unnest(i.session_ids) AS s(session_id)
+        ORDER BY 1, 2
+        ON CONFLICT (event_id, session_id) DO NOTHING
+    ''')
+
+    # Если пользователь встречается в файле несколько раз, побеждает самый свежий план
+    cur.execute(f'''
+        INSERT INTO {SCHEMA}.user_plans (event_id, user_id, session_keys, created_at, updated_at)
+        SELECT
+            i.event_id,
+            i.user_id,
+            ARRAY(
+                SELECT d.id
+                FROM unnest(i.session_ids) WITH ORDINALITY AS s(session_id, pos)
+                JOIN {SCHEMA}.event_sessions d ON d.event_id = i.event_id AND d.session_id = s.session_id
+                ORDER BY s.pos
+            ),
+            COALESCE(i.created_at, CURRENT_TIMESTAMP),
+            COALESCE(i.updated_at, CURRENT_TIMESTAMP)
+        FROM (
+            SELECT DISTINCT ON (event_id, user_id) *
+            FROM plans_import
+            ORDER BY event_id, user_id, updated_at DESC NULLS LAST
+        ) i
+        ON CONFLICT (user_id, event_id)
+        DO UPDATE SET session_keys = EXCLUDED.session_keys, updated_at = EXCLUDED.updated_at
+    ''')
+    saved = cur.rowcount
+
+    rebuilt = rebuild_stats(cur, event_ids)
+    cur.close()
+    print(f'loaded {loaded} rows, saved {saved} plans, rebuilt {rebuilt} counters '
+          f'for {len(event_ids)} event(s)', file=sys.stderr)
+
+
+def rebuild_stats(cur, event_ids) -> int:
+    '''
+    Пересобирает session_stats, session_pairs и event_totals мероприятий агрегирующими запросами
+    по планам вместо построчных upsert.
+    Счётчики раскладываются по шардам так же, как их пишет save-plan.
+    '''
+    cur.execute(f'DELETE FROM {SCHEMA}.session_stats_deltas WHERE event_id = ANY(%s)', (event_ids,))
+    cur.execute(f'DELETE FROM {SCHEMA}.session_stats WHERE event_id = ANY(%s)', (event_ids,))
+    cur.execute(f'''
+        INSERT INTO {SCHEMA}.session_stats (event_id, session_key, shard, interest_count)
+        SELECT
+            p.event_id,
+            k.session_key,
+            abs(hashtext(p.user_id)::bigint) %% COALESCE(e.stats_shards, 1),
+            COUNT(DISTINCT p.id)
+        FROM {SCHEMA}.user_plans p
+        LEFT JOIN {SCHEMA}.program_events e ON e.id = p.event_id
+        CROSS JOIN unnest(p.session_keys) AS k(session_key)
+        WHERE p.event_id = ANY(%s)
+        GROUP BY 1, 2, 3
+    ''', (event_ids,))
+    rebuilt = cur.rowcount
+
+    cur.execute(f'DELETE FROM {SCHEMA}.session_pair_deltas WHERE event_id = ANY(%s)', (event_ids,))
+    cur.execute(f'DELETE FROM {SCHEMA}.session_pairs WHERE event_id = ANY(%s)', (event_ids,))
+    cur.execute(f'''
+        INSERT INTO {SCHEMA}.session_pairs (event_id, session_a, session_b, shard, pair_count)
+        SELECT
+            p.event_id,
+            a.session_key,
+            b.session_key,
+            abs(hashtext(p.user_id)::bigint) %% COALESCE(e.stats_shards, 1),
+            COUNT(DISTINCT p.id)
+        FROM {SCHEMA}.user_plans p
+        LEFT JOIN {SCHEMA}.program_events e ON e.id = p.event_id
+        CROSS JOIN unnest(p.session_keys) AS a(session_key)
+        CROSS JOIN unnest(p.session_keys) AS b(session_key)
+        WHERE p.event_id = ANY(%s) AND a.session_key < b.session_key
+        GROUP BY 1, 2, 3, 4
+    ''', (event_ids,))
+
+    cur.execute(f'''
+        INSERT INTO {SCHEMA}.event_totals (event_id, total_users)
+        SELECT event_id, COUNT(*) FILTER (WHERE cardinality(session_keys) > 0)
+        FROM {SCHEMA}.user_plans
+        WHERE event_id = ANY(%s)
+        GROUP BY event_id
+        ON CONFLICT (event_id)
+        DO UPDATE SET total_users = EXCLUDED.total_users, updated_at = CURRENT_TIMESTAMP
+    ''', (event_ids,))
+
+    # Счётчики пересобраны: ETag get-stats по этим мероприятиям должен смениться
+    cur.execute(f'''
+        INSERT INTO {SCHEMA}.stats_versions (event_id, shard, version)
+        SELECT unnest(%s::text[]), 0, 1
+        ON CONFLICT (event_id, shard)
+        DO UPDATE SET version = {SCHEMA}.stats_versions.version + 1
+    ''', (event_ids,))
+    return rebuilt
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default=os.environ.get('DATABASE_URL'))
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    export_cmd = commands.add_parser('export', help='выгрузить планы')
+    export_cmd.add_argument('--event', help='только это мероприятие')
+    export_cmd.add_argument('-o', '--output', default='-', help='файл (по умолчанию stdout)')
+    export_cmd.add_argument('--format', choices=['csv', 'binary'], default='csv')
+
+    import_cmd = commands.add_parser('import', help='загрузить планы и пересобрать статистику')
+    import_cmd.add_argument('input', help='файл выгрузки или - для stdin')
+    import_cmd.add_argument('--format', choices=['csv', 'binary'], default='csv')
+    import_cmd.add_argument('--as-event', help='загрузить все планы под этим eventId')
+    import_cmd.add_argument('--replace', action='store_true', help='удалить существующие планы мероприятий из файла')
+
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error('DATABASE_URL is not set')
+
+    conn = psycopg2.connect(args.database_url)
+    started = time.perf_counter()
+    try:
+        if args.command == 'export':
+            out = sys.stdout.buffer if args.output == '-' else open(args.output, 'wb')
+            with out:
+                export_plans(conn, out, args.event, args.format)
+        else:
+            src = sys.stdin.buffer if args.input == '-' else open(args.input, 'rb')
+            with src:
+                import_plans(conn, src, args.format, args.as_event, args.replace)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    print(f'{args.command} finished in {time.perf_counter() - started:.1f}s', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()